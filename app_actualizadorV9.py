@@ -1,11 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import openpyxl
-from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
-import shutil
 import os
 import threading
-import difflib
+import multiprocessing
+from collections import OrderedDict
+from itertools import islice
+from motor_actualizador import ejecutar_actualizacion, escribir_reportes, limpiar_sku_seguro, RUTA_CATALOGO
+from detector_encabezados import detectar_encabezado, nombres_columnas
 
 # --- CONFIGURACIÓN: HISTORIAL DE CAMBIOS ---
 CHANGELOG_TEXT = """
@@ -35,27 +37,96 @@ COLOR_PRIMARY = "#00a650"
 COLOR_TEXT_HEADER = "#2d3436"
 COLOR_ACCENT = "#3498db"
 
-# --- UTILIDADES DE ESTILO EXCEL ---
-def estilizar_hoja_excel(ws):
-    """Aplica formato profesional a una hoja de Excel generada"""
-    header_fill = PatternFill(start_color="3498db", end_color="3498db", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), 
-                         top=Side(style='thin'), bottom=Side(style='thin'))
-    
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = thin_border
-
-    for column_cells in ws.columns:
-        length = max(len(str(cell.value)) if cell.value else 0 for cell in column_cells)
-        ws.column_dimensions[column_cells[0].column_letter].width = min(length + 4, 60)
-
-    for row in ws.iter_rows(min_row=2):
-        for cell in row:
-            cell.border = thin_border
+# Filas que se agregan a una vista previa cada vez que el usuario llega al final del scroll
+TAMANO_VENTANA = 200
+
+
+class CacheLibros:
+    """
+    Libros abiertos en modo solo lectura, compartidos por todas las vistas previas.
+    Se reabren solo si cambia la fecha de modificación del archivo, así que cambiar de hoja
+    o abrir el diálogo de columnas no vuelve a parsear el libro (ni sus textos compartidos).
+    Cada hoja recuerda dónde quedó su último recorrido para seguir leyendo desde ahí.
+    """
+    def __init__(self, maximo=4):
+        self.maximo = maximo
+        self._libros = OrderedDict()   # ruta -> (mtime, workbook)
+        self._cursores = {}            # (ruta, hoja) -> [próxima fila, iterador]
+
+    def libro(self, ruta):
+        mtime = os.path.getmtime(ruta)
+        abierto = self._libros.get(ruta)
+        if abierto and abierto[0] == mtime:
+            self._libros.move_to_end(ruta)
+            return abierto[1]
+
+        self.cerrar(ruta)
+        wb = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        self._libros[ruta] = (mtime, wb)
+        while len(self._libros) > self.maximo:
+            self.cerrar(next(iter(self._libros)))
+        return wb
+
+    def hojas(self, ruta):
+        return self.libro(ruta).sheetnames
+
+    def filas(self, ruta, hoja, desde, cantidad):
+        """Filas [desde, desde + cantidad) de la hoja (0 = primera) como listas"""
+        wb = self.libro(ruta)
+        cursor = self._cursores.get((ruta, hoja))
+        if cursor is None or cursor[0] != desde:
+            cursor = [desde, wb[hoja].iter_rows(min_row=desde + 1, values_only=True)]
+            self._cursores[(ruta, hoja)] = cursor
+        filas = [list(fila) for fila in islice(cursor[1], cantidad)]
+        cursor[0] += len(filas)
+        return filas
+
+    def cerrar(self, ruta=None):
+        """Cierra un libro (o todos): antes de procesar, para no dejar archivos tomados"""
+        rutas = [ruta] if ruta else list(self._libros)
+        for r in rutas:
+            abierto = self._libros.pop(r, None)
+            if abierto:
+                abierto[1].close()
+            for clave in [c for c in self._cursores if c[0] == r]:
+                del self._cursores[clave]
+
+
+LIBROS = CacheLibros()
+
+
+class VistaPorVentanas:
+    """
+    Mixin para las vistas previas: el Treeview arranca con pocas filas y, al acercarse
+    el scroll al final, se leen TAMANO_VENTANA filas más desde donde quedó la lectura.
+    La clase que lo usa define insertar_fila_vista(fila).
+    """
+    _ventana = None
+
+    def iniciar_ventanas(self, scroll_y, ruta, hoja, proxima_fila, agotado):
+        self._scroll_y = scroll_y
+        self._ventana = {"ruta": ruta, "hoja": hoja, "proxima": proxima_fila, "agotado": agotado, "cargando": False}
+
+    def al_desplazar(self, primero, ultimo):
+        self._scroll_y.set(primero, ultimo)
+        v = self._ventana
+        if v and not v["agotado"] and not v["cargando"] and float(ultimo) >= 0.95:
+            v["cargando"] = True
+            self.after_idle(self.cargar_ventana)
+
+    def cargar_ventana(self):
+        v = self._ventana
+        try:
+            filas = LIBROS.filas(v["ruta"], v["hoja"], v["proxima"], TAMANO_VENTANA)
+        except Exception as e:
+            print(f"Error preview: {e}")
+            filas = []
+        v["proxima"] += len(filas)
+        v["agotado"] = len(filas) < TAMANO_VENTANA
+        for fila in filas:
+            self.insertar_fila_vista(fila)
+        v["cargando"] = False
+
 
 class ReportePreviewDialog(tk.Toplevel):
     """Ventana para previsualizar datos antes de generar reporte"""
@@ -99,7 +170,7 @@ class ReportePreviewDialog(tk.Toplevel):
         self.confirmado = True
         self.destroy()
 
-class ExcelPreviewFrame(ttk.Frame):
+class ExcelPreviewFrame(VistaPorVentanas, ttk.Frame):
     """Componente para visualizar y configurar Excel"""
     def __init__(self, parent, title, is_multisheet=False, on_sheet_change=None):
         super().__init__(parent, style="Card.TFrame", padding=15)
@@ -152,9 +223,10 @@ class ExcelPreviewFrame(ttk.Frame):
             
             scroll_y = ttk.Scrollbar(f_table, orient="vertical")
             scroll_x = ttk.Scrollbar(f_table, orient="horizontal")
+            self.scroll_y = scroll_y
             
             self.tree = ttk.Treeview(f_table, columns=[], show="headings", height=6, 
-                                     yscrollcommand=scroll_y.set, xscrollcommand=scroll_x.set,
+                                     yscrollcommand=self.al_desplazar, xscrollcommand=scroll_x.set,
                                      style="Modern.Treeview")
             
             scroll_y.config(command=self.tree.yview)
@@ -181,9 +253,7 @@ class ExcelPreviewFrame(ttk.Frame):
             self.file_path = filename
             self.lbl_file.config(text=os.path.basename(filename), foreground=COLOR_PRIMARY)
             try:
-                wb = openpyxl.load_workbook(filename, read_only=True, data_only=True)
-                sheets = wb.sheetnames
-                wb.close()
+                sheets = LIBROS.hojas(filename)
 
                 if self.is_multisheet:
                     self.listbox_sheets.delete(0, tk.END)
@@ -210,20 +280,11 @@ class ExcelPreviewFrame(ttk.Frame):
     def cargar_preview_hoja(self, hoja_nombre):
         if not self.file_path or self.is_multisheet: return
         try:
-            wb = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
-            ws = wb[hoja_nombre]
-            raw_rows = []
-            for i, row in enumerate(ws.iter_rows(values_only=True)):
-                if i >= 20: break
-                raw_rows.append(list(row))
-            wb.close()
+            # Solo las primeras filas (encabezado); el resto se lee al hacer scroll
+            raw_rows = LIBROS.filas(self.file_path, hoja_nombre, 0, 20)
             
-            header_row_idx = 0
-            for i, row in enumerate(raw_rows):
-                row_str = " ".join([str(x).upper() if x is not None else "" for x in row])
-                if "SKU" in row_str or "CODIGO" in row_str or "PRICE" in row_str or "PRECIO" in row_str:
-                    header_row_idx = i
-                    break
+            self.deteccion = detectar_encabezado(raw_rows, ("sku", "precio", "titulo"))
+            header_row_idx = self.deteccion["fila"]
             
             if raw_rows:
                 self.headers = raw_rows[header_row_idx]
@@ -232,15 +293,11 @@ class ExcelPreviewFrame(ttk.Frame):
                 self.headers = []
                 self.sheet_data = []
 
+            self.iniciar_ventanas(self.scroll_y, self.file_path, hoja_nombre, len(raw_rows), len(raw_rows) < 20)
             self.actualizar_tabla()
             
             if self.on_sheet_change_callback:
-                cols_procesadas = []
-                for i, h in enumerate(self.headers):
-                    val = str(h).strip() if h is not None else ""
-                    if val == "": val = f"Columna {i+1}"
-                    cols_procesadas.append(val)
-                self.on_sheet_change_callback(cols_procesadas)
+                self.on_sheet_change_callback(nombres_columnas(self.headers), self.deteccion["columnas"])
                 
         except Exception as e:
             print(f"Error preview: {e}")
@@ -262,15 +319,20 @@ class ExcelPreviewFrame(ttk.Frame):
             self.tree.heading(col_id, text=display_cols[i])
             self.tree.column(col_id, width=120, minwidth=50) 
             
-        for index, row in enumerate(self.sheet_data):
-            clean_row = []
-            for i in range(len(col_ids)):
-                val = ""
-                if i < len(row):
-                    val = str(row[i]) if row[i] is not None else ""
-                clean_row.append(val)
-            tag = 'even' if index % 2 == 0 else 'odd'
-            self.tree.insert("", "end", values=clean_row, tags=(tag,))
+        self.filas_mostradas = 0
+        for row in self.sheet_data:
+            self.insertar_fila_vista(row)
+
+    def insertar_fila_vista(self, row):
+        clean_row = []
+        for i in range(len(self.headers)):
+            val = ""
+            if i < len(row):
+                val = str(row[i]) if row[i] is not None else ""
+            clean_row.append(val)
+        tag = 'even' if self.filas_mostradas % 2 == 0 else 'odd'
+        self.tree.insert("", "end", values=clean_row, tags=(tag,))
+        self.filas_mostradas += 1
             
     def get_selected_sheets(self):
         if self.is_multisheet:
@@ -280,7 +342,7 @@ class ExcelPreviewFrame(ttk.Frame):
             return [self.combo_sheet.get()]
 
 
-class ConfigHojaDialog(tk.Toplevel):
+class ConfigHojaDialog(VistaPorVentanas, tk.Toplevel):
     def __init__(self, parent, file_path, sheet_name):
         super().__init__(parent)
         self.title(f"Configurar: {sheet_name}")
@@ -301,9 +363,10 @@ class ConfigHojaDialog(tk.Toplevel):
         
         scroll_y = ttk.Scrollbar(f_table, orient="vertical")
         scroll_x = ttk.Scrollbar(f_table, orient="horizontal")
+        self.scroll_y = scroll_y
         
         self.tree = ttk.Treeview(f_table, columns=[], show="headings", height=10, 
-                                 yscrollcommand=scroll_y.set, xscrollcommand=scroll_x.set)
+                                 yscrollcommand=self.al_desplazar, xscrollcommand=scroll_x.set)
         
         scroll_y.config(command=self.tree.yview)
         scroll_x.config(command=self.tree.xview)
@@ -335,31 +398,19 @@ class ConfigHojaDialog(tk.Toplevel):
 
     def cargar_datos(self):
         try:
-            wb = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
-            ws = wb[self.sheet_name]
-            raw_rows = []
-            for i, row in enumerate(ws.iter_rows(values_only=True)):
-                if i >= 15: break
-                raw_rows.append(list(row))
-            wb.close()
+            # El libro ya está abierto en LIBROS desde que se cargó en la pantalla principal
+            raw_rows = LIBROS.filas(self.file_path, self.sheet_name, 0, 15)
+            self.iniciar_ventanas(self.scroll_y, self.file_path, self.sheet_name, len(raw_rows), len(raw_rows) < 15)
             
-            header_row_idx = 0
-            for i, row in enumerate(raw_rows):
-                row_str = " ".join([str(x).upper() if x is not None else "" for x in row])
-                if "SKU" in row_str or "CODIGO" in row_str or "PRICE" in row_str or "PRECIO" in row_str:
-                    header_row_idx = i
-                    break
+            deteccion = detectar_encabezado(raw_rows, ("sku", "precio", "nombre"))
+            header_row_idx = deteccion["fila"]
             
             self.headers = []
             if raw_rows:
                 raw_headers = raw_rows[header_row_idx]
                 sheet_data = raw_rows[header_row_idx+1:]
                 
-                self.headers = []
-                for i, h in enumerate(raw_headers):
-                    val = str(h).strip() if h is not None else ""
-                    clean_val = val if val else f"Columna {i+1}"
-                    self.headers.append(clean_val)
+                self.headers = nombres_columnas(raw_headers)
                 
                 self.tree["columns"] = self.headers
                 for col in self.headers:
@@ -367,24 +418,26 @@ class ConfigHojaDialog(tk.Toplevel):
                     self.tree.column(col, width=100)
                 
                 for row in sheet_data:
-                    clean_row = [str(x) if x is not None else "" for x in row]
-                    while len(clean_row) < len(self.headers): clean_row.append("")
-                    self.tree.insert("", "end", values=clean_row[:len(self.headers)])
+                    self.insertar_fila_vista(row)
                 
                 self.cb_sku.config(values=self.headers)
                 self.cb_price.config(values=self.headers)
                 self.cb_name.config(values=self.headers)
                 
-                for h in self.headers:
-                    hu = h.upper()
-                    if any(k in hu for k in ["SKU", "CODIGO", "ZMART"]) and not self.var_sku.get(): self.var_sku.set(h)
-                    if any(k in hu for k in ["PRECIO", "COSTO", "ML"]) and not self.var_price.get(): self.var_price.set(h)
-                    if any(k in hu for k in ["PRODUCTO", "NOMBRE"]) and not self.var_name.get(): self.var_name.set(h)
+                columnas = deteccion["columnas"]
+                if "sku" in columnas: self.var_sku.set(self.headers[columnas["sku"]])
+                if "precio" in columnas: self.var_price.set(self.headers[columnas["precio"]])
+                if "nombre" in columnas: self.var_name.set(self.headers[columnas["nombre"]])
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.destroy()
 
+    def insertar_fila_vista(self, row):
+        clean_row = [str(x) if x is not None else "" for x in row]
+        while len(clean_row) < len(self.headers): clean_row.append("")
+        self.tree.insert("", "end", values=clean_row[:len(self.headers)])
+
     def confirmar(self):
         if not self.var_sku.get() or not self.var_price.get():
             messagebox.showwarning("Faltan datos", "Debes seleccionar al menos SKU y Precio.")
@@ -495,13 +548,11 @@ class ActualizadorApp:
         txt.insert(tk.END, CHANGELOG_TEXT)
         txt.config(state="disabled")
 
-    def cols_destino_cargadas(self, columnas):
+    def cols_destino_cargadas(self, columnas, detectadas):
         self.cb_sku_dest.config(values=columnas, state="readonly")
         self.cb_title_dest.config(values=columnas, state="readonly")
-        for c in columnas:
-            val = str(c).strip()
-            if val in ["SELLER_SKU", "SKU", "CODIGO", "INTERNAL_ID"]: self.cb_sku_dest.set(c)
-            if val == "TITLE": self.cb_title_dest.set(c)
+        if "sku" in detectadas: self.cb_sku_dest.set(columnas[detectadas["sku"]])
+        if "titulo" in detectadas: self.cb_title_dest.set(columnas[detectadas["titulo"]])
         self.check_ready()
 
     def check_ready(self):
@@ -545,195 +596,42 @@ class ActualizadorApp:
 
         if not save_path: return
         
+        # El proceso abre los archivos por su cuenta (y puede reemplazar el de destino)
+        LIBROS.cerrar()
         self.btn_run.config(text="⏳ PROCESANDO...", state="disabled")
         self.progress_var.set(0)
         self.lbl_progress.config(text="Iniciando...")
         threading.Thread(target=self.ejecutar_logica, args=(save_path, config_map)).start()
 
     def limpiar_sku_seguro(self, valor):
-        if valor is None: return None
-        s = str(valor).strip()
-        if s.startswith("'"): s = s[1:]
-        return s.strip().upper()
+        return limpiar_sku_seguro(valor)
 
     def ejecutar_logica(self, save_path, config_map):
         try:
             self.log("--- INICIANDO ---")
-            
-            # 1. CONSOLIDAR
-            self.log(f"Consolidando {len(config_map)} hojas...")
-            mapa_precios = {}       
-            mapa_nombres = {} # Para el reporte simple: SKU -> Nombre
-            lista_nombres_master = {} 
-            
-            total_hojas = len(config_map)
-            
-            for i, (nombre_hoja, columnas) in enumerate(config_map.items()):
-                self.lbl_progress.config(text=f"Leyendo: {nombre_hoja}")
-                
-                wb_temp = openpyxl.load_workbook(self.frame_origen.file_path, read_only=True, data_only=True)
-                ws = wb_temp[nombre_hoja]
-                
-                sel_sku = columnas["sku"]
-                sel_price = columnas["price"]
-                sel_name = columnas["name"]
-                
-                idx_sku = -1
-                idx_price = -1
-                idx_name = -1
-                header_idx = -1
-                
-                rows_iter = ws.iter_rows(values_only=True)
-                for r_i, row in enumerate(rows_iter):
-                    row_cols = []
-                    for c_i, val in enumerate(row):
-                        v_str = str(val).strip() if val else ""
-                        if v_str == "": v_str = f"Columna {c_i+1}"
-                        row_cols.append(v_str)
-                    
-                    if sel_sku in row_cols and sel_price in row_cols:
-                        header_idx = r_i
-                        idx_sku = row_cols.index(sel_sku)
-                        idx_price = row_cols.index(sel_price)
-                        if sel_name and sel_name in row_cols:
-                            idx_name = row_cols.index(sel_name)
-                        break
-                
-                if idx_sku == -1:
-                    wb_temp.close()
-                    continue
-
-                wb_temp.close()
-                wb_temp = openpyxl.load_workbook(self.frame_origen.file_path, read_only=True, data_only=True)
-                ws = wb_temp[nombre_hoja]
-                
-                for r_i, row in enumerate(ws.iter_rows(values_only=True)):
-                    if r_i <= header_idx: continue
-                    try:
-                        val_sku = row[idx_sku]
-                        val_price = row[idx_price]
-                        val_name = row[idx_name] if idx_name != -1 else ""
-                        
-                        sku_clean = self.limpiar_sku_seguro(val_sku)
-                        if sku_clean:
-                            if val_name:
-                                nombre_limpio = str(val_name).strip()
-                                lista_nombres_master[nombre_limpio] = sku_clean
-                                mapa_nombres[sku_clean] = nombre_limpio # Guardamos nombre para reporte
-                            
-                            try:
-                                price_clean = float(val_price)
-                                # Guardamos tupla: (Precio, HojaOrigen)
-                                mapa_precios[sku_clean] = (price_clean, nombre_hoja)
-                            except: pass
-                    except IndexError: pass
-                
-                wb_temp.close()
-                self.progress_var.set(((i+1)/total_hojas)*30)
 
-            self.log(f"Datos consolidados: {len(mapa_precios)} productos.")
+            def al_progreso(porcentaje, texto):
+                self.progress_var.set(porcentaje)
+                self.lbl_progress.config(text=texto)
 
-            # 2. DESTINO (ESCRITURA QUIRÚRGICA)
-            self.log("Actualizando Mercado Libre...")
-            shutil.copy(self.frame_destino.file_path, save_path)
-            
-            wb_dest = openpyxl.load_workbook(save_path) 
-            ws_dest = wb_dest[self.frame_destino.combo_sheet.get()]
-            
-            sel_sku_dest = self.cb_sku_dest.get()
-            sel_title_dest = self.cb_title_dest.get()
-            
-            idx_sku_dest = -1
-            idx_price_dest = -1
-            idx_title_dest = -1
-            start_row = -1
-            
-            for r in range(1, 20):
-                row_cells = ws_dest[r]
-                for c_i, cell in enumerate(row_cells):
-                    val = str(cell.value).strip() if cell.value else ""
-                    if val == "": val = f"Columna {c_i+1}"
-                    if val == sel_sku_dest: idx_sku_dest = cell.column
-                    if val == "PRICE": idx_price_dest = cell.column
-                    if val == sel_title_dest: idx_title_dest = cell.column
-                
-                if idx_sku_dest != -1 and idx_price_dest != -1:
-                    start_row = r + 1
-                    break
-            
-            if idx_sku_dest == -1: raise Exception("Error columnas destino.")
-
-            cambios = 0
-            amarillo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-            skus_ml_found = set()
-            no_sku_list = []
-            
-            total = ws_dest.max_row
-            
-            for i, row in enumerate(range(start_row, total + 1)):
-                if i % 50 == 0:
-                    self.progress_var.set(30 + (i/(total-start_row)*40))
-                    self.lbl_progress.config(text=f"Procesando {i}...")
-                
-                c_sku = ws_dest.cell(row=row, column=idx_sku_dest)
-                val_sku = self.limpiar_sku_seguro(c_sku.value)
-                
-                if val_sku:
-                    if val_sku in mapa_precios:
-                        # Mapa precios ahora tiene (precio, hoja)
-                        precio_nuevo, _ = mapa_precios[val_sku]
-                        cell_price = ws_dest.cell(row=row, column=idx_price_dest)
-                        cell_price.value = precio_nuevo
-                        for c in ws_dest[row]: c.fill = amarillo
-                        cambios += 1
-                        skus_ml_found.add(val_sku)
-                else:
-                    if idx_title_dest != -1:
-                        c_title = ws_dest.cell(row=row, column=idx_title_dest)
-                        t = str(c_title.value).strip() if c_title.value else ""
-                        if t: no_sku_list.append(t)
+            # Todo el proceso vive en motor_actualizador (también se puede correr sin interfaz)
+            resultado = ejecutar_actualizacion(
+                self.frame_origen.file_path, config_map,
+                self.frame_destino.file_path, self.frame_destino.combo_sheet.get(),
+                self.cb_sku_dest.get(), self.cb_title_dest.get(), save_path,
+                al_progreso=al_progreso, al_log=self.log, ruta_catalogo=RUTA_CATALOGO
+            )
 
-            wb_dest.save(save_path)
-            self.progress_var.set(75)
-
-            # 3. PREPARAR DATOS REPORTES
-            self.log("Preparando vista previa...")
-            
-            # Datos Faltantes Limpios
-            skus_missing = [s for s in mapa_precios if s not in skus_ml_found]
-            data_faltantes = []
-            for s in skus_missing:
-                precio, hoja = mapa_precios[s]
-                nombre = mapa_nombres.get(s, "")
-                data_faltantes.append([s, nombre, precio, hoja])
-                
-            # Datos IA Limpios
-            data_ia = []
-            if no_sku_list and lista_nombres_master:
-                self.log("Ejecutando IA preliminar...")
-                keys = list(lista_nombres_master.keys())
-                for t in no_sku_list:
-                    match = difflib.get_close_matches(t, keys, n=1, cutoff=0.4)
-                    if match:
-                        best = match[0]
-                        sku_s = lista_nombres_master[best]
-                        score = int(difflib.SequenceMatcher(None, t, best).ratio() * 100)
-                        
-                        hoja_org = "-"
-                        if sku_s in mapa_precios:
-                            _, hoja_org = mapa_precios[sku_s]
-                            
-                        data_ia.append([t, best, sku_s, f"{score}%", hoja_org])
-
-            # 4. MOSTRAR PREVIEW (En hilo principal)
-            self.root.after(0, lambda: self.mostrar_preview_y_guardar(save_path, data_faltantes, data_ia, cambios, len(skus_ml_found), total_hojas))
+            # MOSTRAR PREVIEW (En hilo principal)
+            self.root.after(0, lambda: self.mostrar_preview_y_guardar(save_path, resultado))
 
         except Exception as e:
             self.log(f"❌ Error: {e}")
             messagebox.showerror("Error", str(e))
             self.root.after(0, lambda: self.btn_run.config(text="🚀  CONFIGURAR Y PROCESAR", state="!disabled"))
 
-    def mostrar_preview_y_guardar(self, save_path, data_faltantes, data_ia, cambios, unicos, total_hojas):
+    def mostrar_preview_y_guardar(self, save_path, resultado):
+        data_faltantes, data_ia = resultado["data_faltantes"], resultado["data_ia"]
         # Si hay faltantes, mostrar preview
         if data_faltantes:
             cols = ["SKU", "NOMBRE", "PRECIO", "HOJA ORIGEN"]
@@ -748,32 +646,14 @@ class ActualizadorApp:
 
         # Generar Reportes Reales
         try:
-            if data_faltantes:
-                ruta_rep = os.path.join(os.path.dirname(save_path), "Reporte_Faltantes.xlsx")
-                wb_r = openpyxl.Workbook()
-                ws_r = wb_r.active
-                ws_r.title = "Faltantes"
-                ws_r.append(["SKU", "NOMBRE PRODUCTO", "PRECIO LISTA", "HOJA ORIGEN"])
-                
-                for row in data_faltantes:
-                    ws_r.append(row)
-                    ws_r.cell(row=ws_r.max_row, column=3).number_format = '"$"#,##0.00'
-                
-                estilizar_hoja_excel(ws_r)
-                wb_r.save(ruta_rep)
-
-            if data_ia:
-                ruta_ia = os.path.join(os.path.dirname(save_path), "AYUDA_VINCULACION.xlsx")
-                wb_ia = openpyxl.Workbook()
-                ws_ia = wb_ia.active
-                ws_ia.append(["TITULO ML", "COINCIDENCIA", "SKU SUGERIDO", "SIMILITUD", "HOJA ORIGEN"])
-                for row in data_ia:
-                    ws_ia.append(row)
-                estilizar_hoja_excel(ws_ia)
-                wb_ia.save(ruta_ia)
-                
-            dups = cambios - unicos
-            msg = f"Proceso Finalizado.\n\nCambios: {cambios}\nUnicos: {unicos}\nDuplicados: {dups}\nHojas: {total_hojas}"
+            # Los reportes enormes (más filas que una hoja de Excel) salen en CSV
+            rutas_reportes = escribir_reportes(save_path, data_faltantes, data_ia)
+
+            dups = resultado["coincidencias"] - resultado["unicos"]
+            msg = (f"Proceso Finalizado.\n\nPrecios cambiados: {resultado['cambios']}\nSin cambio: {resultado['sin_cambio']}"
+                   f"\nUnicos: {resultado['unicos']}\nDuplicados: {dups}"
+                   f"\nHojas: {resultado['total_hojas']} (releídas: {len(resultado['hojas_releidas'])})"
+                   + "".join(f"\nReporte: {os.path.basename(r)}" for r in rutas_reportes.values()))
             messagebox.showinfo("Éxito", msg)
             
         except Exception as e:
@@ -787,6 +667,8 @@ class ActualizadorApp:
         self.lbl_progress.config(text="Listo.")
 
 if __name__ == "__main__":
+    # Necesario en Windows para el pool de procesos de la consolidación (también empaquetado como .exe)
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ActualizadorApp(root)
     # Estilos zebra para treeviews
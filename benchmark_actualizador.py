@@ -0,0 +1,305 @@
+"""
+Benchmark del motor del actualizador de precios con libros generados.
+Uso: python benchmark_actualizador.py [--hojas 20] [--filas 100000] [--nombres 20000] [--titulos 300]
+                                       [--filas-ml 50000] [--columnas-ml 80] [--filas-ml-por-celda 5000]
+                                       [--faltantes 50000]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+import difflib
+import openpyxl
+from buscador_similares import IndiceSimilitud
+from indice_precios import IndicePrecios
+from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
+from detector_encabezados import nombres_columnas
+from motor_actualizador import (consolidar_origen, cargar_o_consolidar, actualizar_destino,
+                                limpiar_sku_seguro, escribir_reportes, ENCABEZADOS_FALTANTES)
+
+COLUMNAS = {"sku": "CODIGO", "price": "PRECIO", "name": "DESCRIPCION"}
+
+
+def generar_libro_origen(ruta: str, hojas: int, filas_totales: int, semilla: int = 7):
+    """Libro de proveedor con unas filas de título antes del encabezado, como los reales"""
+    aleatorio = random.Random(semilla)
+    wb = openpyxl.Workbook(write_only=True)
+    por_hoja = filas_totales // hojas
+    for h in range(hojas):
+        ws = wb.create_sheet(f"Proveedor {h + 1}")
+        ws.append([f"LISTA DE PRECIOS PROVEEDOR {h + 1}"])
+        ws.append([])
+        ws.append(["CODIGO", "DESCRIPCION", "MARCA", "PRECIO", "STOCK"])
+        for f in range(por_hoja):
+            # ~5% de SKUs repetidos entre hojas para ejercitar "gana la última"
+            n = aleatorio.randrange(filas_totales) if aleatorio.random() < 0.05 else h * por_hoja + f
+            ws.append([f"SKU-{n:07d}", f"Producto {n} modelo {aleatorio.randrange(1000)}", "MARCA",
+                       round(aleatorio.uniform(1, 5000), 2), aleatorio.randrange(100)])
+    wb.save(ruta)
+
+
+def consolidar_lectura_doble(ruta_origen: str, config_map: dict) -> dict:
+    """Referencia: lo que hacía ejecutar_logica antes (abre el libro dos veces por hoja)"""
+    mapa_precios = {}
+    for nombre_hoja, columnas in config_map.items():
+        wb = openpyxl.load_workbook(ruta_origen, read_only=True, data_only=True)
+        idx_sku = idx_price = header_idx = -1
+        for r_i, row in enumerate(wb[nombre_hoja].iter_rows(values_only=True)):
+            row_cols = nombres_columnas(row)
+            if columnas["sku"] in row_cols and columnas["price"] in row_cols:
+                header_idx = r_i
+                idx_sku = row_cols.index(columnas["sku"])
+                idx_price = row_cols.index(columnas["price"])
+                break
+        wb.close()
+        if idx_sku == -1:
+            continue
+
+        wb = openpyxl.load_workbook(ruta_origen, read_only=True, data_only=True)
+        for r_i, row in enumerate(wb[nombre_hoja].iter_rows(values_only=True)):
+            if r_i <= header_idx: continue
+            try:
+                sku_clean = limpiar_sku_seguro(row[idx_sku])
+                if sku_clean:
+                    try:
+                        mapa_precios[sku_clean] = (float(row[idx_price]), nombre_hoja)
+                    except: pass
+            except IndexError: pass
+        wb.close()
+    return {"mapa_precios": mapa_precios}
+
+
+def generar_export_ml(ruta: str, filas: int, columnas: int, semilla: int = 5):
+    """Export de publicaciones de ML: encabezado en la fila 3 y muchas columnas de atributos"""
+    aleatorio = random.Random(semilla)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Publicaciones")
+    ws.append(["Publicaciones de Mercado Libre"])
+    ws.append([])
+    extras = [f"ATRIBUTO_{i}" for i in range(columnas - 4)]
+    ws.append(["ITEM_ID", "SELLER_SKU", "TITLE", "PRICE"] + extras)
+    for f in range(filas):
+        ws.append([f"MLA{f:09d}", f"SKU-{f:07d}", f"Producto {f}", round(aleatorio.uniform(1, 5000), 2)]
+                  + [f"valor {aleatorio.randrange(50)}" for _ in extras])
+    wb.save(ruta)
+
+
+def actualizar_destino_por_celda(ruta_destino: str, save_path: str, mapa_precios: dict) -> int:
+    """Referencia: lo que hacía ejecutar_logica antes (libro completo en memoria y relleno celda por celda)"""
+    shutil.copy(ruta_destino, save_path)
+    wb = openpyxl.load_workbook(save_path)
+    ws = wb["Publicaciones"]
+    amarillo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+    cambios = 0
+    for row in range(4, ws.max_row + 1):
+        val_sku = limpiar_sku_seguro(ws.cell(row=row, column=2).value)
+        if val_sku in mapa_precios:
+            ws.cell(row=row, column=4).value = mapa_precios[val_sku][0]
+            for c in ws[row]: c.fill = amarillo
+            cambios += 1
+    wb.save(save_path)
+    return cambios
+
+
+def reporte_clasico(ruta: str, data_faltantes: list):
+    """Referencia: lo que hacía mostrar_preview_y_guardar antes (libro normal + estilizar_hoja_excel)"""
+    wb_r = openpyxl.Workbook()
+    ws_r = wb_r.active
+    ws_r.title = "Faltantes"
+    ws_r.append(ENCABEZADOS_FALTANTES)
+    for row in data_faltantes:
+        ws_r.append(row)
+        ws_r.cell(row=ws_r.max_row, column=3).number_format = '"$"#,##0.00'
+
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                         top=Side(style='thin'), bottom=Side(style='thin'))
+    for cell in ws_r[1]:
+        cell.fill = PatternFill(start_color="3498db", end_color="3498db", fill_type="solid")
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        cell.border = thin_border
+    for column_cells in ws_r.columns:
+        length = max(len(str(cell.value)) if cell.value else 0 for cell in column_cells)
+        ws_r.column_dimensions[column_cells[0].column_letter].width = min(length + 4, 60)
+    for row in ws_r.iter_rows(min_row=2):
+        for cell in row:
+            cell.border = thin_border
+    wb_r.save(ruta)
+
+
+def generar_catalogo_nombres(cantidad: int, titulos: int, semilla: int = 11):
+    """Nombres de proveedor y títulos de ML 'sucios' (minúsculas, palabras movidas, una letra menos)"""
+    aleatorio = random.Random(semilla)
+    tipos = ["Antena", "Router", "Access Point", "Switch", "Cable UTP", "Conector RJ45", "Repetidor", "Bridge"]
+    marcas = ["TP-Link", "Ubiquiti", "Mikrotik", "Tenda", "Mercusys", "Cambium", "Grandstream"]
+    variantes = ["2.4GHz", "5GHz", "Dual Band", "Gigabit", "PoE"]
+    nombres = list(dict.fromkeys(
+        f"{aleatorio.choice(tipos)} {aleatorio.choice(marcas)} {aleatorio.choice(variantes)} Modelo {aleatorio.randrange(10000)}"
+        for _ in range(cantidad)
+    ))
+
+    def ensuciar(texto):
+        palabras = texto.split()
+        if aleatorio.random() < 0.3:
+            aleatorio.shuffle(palabras)
+        texto = " ".join(palabras).lower()
+        i = aleatorio.randrange(len(texto))
+        return texto[:i] + texto[i + 1:]
+
+    originales = aleatorio.sample(range(len(nombres)), min(titulos, len(nombres)))
+    return nombres, [(ensuciar(nombres[i]), nombres[i]) for i in originales]
+
+
+def vincular_difflib(titulos: list, nombres: list) -> list:
+    """Referencia: lo que hacía AYUDA_VINCULACION antes"""
+    return [(difflib.get_close_matches(t, nombres, n=1, cutoff=0.4) or [None])[0] for t in titulos]
+
+
+def vincular_indice(titulos: list, nombres: list) -> list:
+    indice = IndiceSimilitud(nombres)
+    return [nombres[r[0][0]] if (r := indice.buscar(t, k=1)) else None for t in titulos]
+
+
+def catalogo_en_dicts(catalogo: IndicePrecios) -> dict:
+    """Referencia: los tres dicts que se usaban antes para el catálogo consolidado"""
+    mapa_precios, mapa_nombres, lista_nombres_master = {}, {}, {}
+    for sku, precio, hoja, nombre in catalogo.productos():
+        mapa_precios[sku] = (precio, hoja)
+        if nombre:
+            mapa_nombres[sku] = nombre
+            lista_nombres_master[nombre] = sku
+    return {"mapa_precios": mapa_precios, "mapa_nombres": mapa_nombres, "lista_nombres_master": lista_nombres_master}
+
+
+def memoria_mb(construir) -> float:
+    """Memoria que queda ocupada por lo que devuelve construir()"""
+    tracemalloc.start()
+    objeto = construir()
+    usada = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objeto
+    return usada / 1e6
+
+
+def medir(nombre: str, funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<28} {segundos:8.2f} s")
+    return resultado, segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hojas", type=int, default=20)
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--nombres", type=int, default=20000)
+    parser.add_argument("--titulos", type=int, default=300)
+    parser.add_argument("--filas-ml", type=int, default=50000)
+    parser.add_argument("--columnas-ml", type=int, default=80)
+    parser.add_argument("--filas-ml-por-celda", type=int, default=5000)
+    parser.add_argument("--faltantes", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "origen.xlsx")
+        print(f"Generando {args.hojas} hojas / {args.filas} filas...")
+        generar_libro_origen(ruta, args.hojas, args.filas)
+        config_map = {f"Proveedor {h + 1}": COLUMNAS for h in range(args.hojas)}
+
+        print("\n== Consolidación ==")
+        antes, t_antes = medir("lectura doble por hoja", consolidar_lectura_doble, ruta, config_map)
+        despues, t_despues = medir("lectura única", consolidar_origen, ruta, config_map, None, 1)
+        paralelo, t_paralelo = medir(f"procesos ({os.cpu_count()})", consolidar_origen, ruta, config_map)
+
+        assert antes["mapa_precios"] == despues.a_dict(), "Los resultados no coinciden"
+        assert despues.a_dict() == paralelo.a_dict(), "La consolidación en paralelo no coincide con la serie"
+        print(f"Mejora lectura única: x{t_antes / t_despues:.1f} / con procesos: x{t_antes / t_paralelo:.1f} "
+              f"({len(despues)} SKUs, resultados idénticos)")
+
+        print("\n== Catálogo consolidado ==")
+        # Los textos ya existen en los dos casos: se compara solo lo que ocupa la estructura
+        columnas = ("Proveedor", despues.skus, despues.precios, despues.nombres)
+
+        def armar_indice():
+            indice = IndicePrecios()
+            indice.agregar_hoja(*columnas)
+            return indice
+
+        print(f"{'tres dicts + tuplas':<28} {memoria_mb(lambda: catalogo_en_dicts(armar_indice())):8.1f} MB (aprox.)")
+        print(f"{'IndicePrecios':<28} {memoria_mb(armar_indice):8.1f} MB")
+        ruta_catalogo = os.path.join(carpeta, "catalogo.pkl")
+        medir("guardar catálogo", despues.guardar, ruta_catalogo)
+        cargado, _ = medir("cargar catálogo", IndicePrecios.cargar, ruta_catalogo)
+        assert cargado.a_dict() == despues.a_dict(), "El catálogo cargado no coincide"
+        print(f"Archivo: {os.path.getsize(ruta_catalogo) / 1e6:.1f} MB")
+
+        ruta_incremental = os.path.join(carpeta, "incremental.pkl")
+        medir("incremental (primera vez)", cargar_o_consolidar, ruta, config_map, ruta_incremental)
+        (_, releidas), _ = medir("incremental (sin cambios)", cargar_o_consolidar, ruta, config_map, ruta_incremental)
+        print(f"Hojas releídas en la segunda corrida: {len(releidas)}")
+
+        print(f"\n== Archivo de Mercado Libre ({args.filas_ml} filas x {args.columnas_ml} columnas) ==")
+        # El relleno por celda crece con filas x celdas de la hoja (ws[fila] recalcula max_column cada vez):
+        # con el tamaño completo no termina en un tiempo razonable, así que se mide sobre menos filas
+        filas_por_celda = min(args.filas_ml_por_celda, args.filas_ml)
+        for filas in sorted({filas_por_celda, args.filas_ml}):
+            ruta_ml = os.path.join(carpeta, f"ml_{filas}.xlsx")
+            generar_export_ml(ruta_ml, filas, args.columnas_ml)
+            # La mitad de las publicaciones tiene precio nuevo
+            mapa_ml = {f"SKU-{f:07d}": (float(f % 997) + 0.5, "Proveedor") for f in range(0, filas, 2)}
+
+            ruta_despues = os.path.join(carpeta, f"ml_parche_{filas}.xlsx")
+            resultado, t_parche = medir(f"parche ({filas} filas)", actualizar_destino,
+                                        ruta_ml, ruta_despues, "Publicaciones", "SELLER_SKU", "TITLE", mapa_ml)
+            medidas = [("parche", t_parche, ruta_despues)]
+            if filas == filas_por_celda:
+                ruta_antes = os.path.join(carpeta, f"ml_por_celda_{filas}.xlsx")
+                cambios_antes, t_celda = medir(f"relleno por celda ({filas} filas)", actualizar_destino_por_celda,
+                                               ruta_ml, ruta_antes, mapa_ml)
+                assert cambios_antes == resultado["coincidencias"], "Cantidad de coincidencias distinta"
+                medidas.insert(0, ("relleno por celda", t_celda, ruta_antes))
+
+            for nombre, segundos, ruta_salida in medidas:
+                print(f"{nombre:<28} {segundos / filas * 1e6:8.1f} µs/fila  {os.path.getsize(ruta_salida) / 1e6:6.1f} MB")
+            if len(medidas) == 2:
+                print(f"Mejora con {filas} filas: x{t_celda / t_parche:.1f} ({resultado['cambios']} filas cambiadas)")
+
+        # Segunda corrida sobre el archivo ya actualizado: los precios son iguales y no se toca ninguna fila
+        ruta_otra_vez = os.path.join(carpeta, "ml_otra_vez.xlsx")
+        repetido, _ = medir("parche sobre lo actualizado", actualizar_destino,
+                            ruta_despues, ruta_otra_vez, "Publicaciones", "SELLER_SKU", "TITLE", mapa_ml)
+        print(f"Filas tocadas: {repetido['cambios']} / sin cambio: {repetido['coincidencias'] - repetido['cambios']}")
+
+        print(f"\n== Reporte de faltantes ({args.faltantes} filas) ==")
+        aleatorio = random.Random(3)
+        faltantes = [[f"SKU-{i:07d}", f"Producto {i} modelo {aleatorio.randrange(1000)}", round(aleatorio.uniform(1, 5000), 2),
+                      f"Proveedor {i % 20 + 1}"] for i in range(args.faltantes)]
+        carpeta_clasico = os.path.join(carpeta, "clasico")
+        os.makedirs(carpeta_clasico)
+        _, t_clasico = medir("Workbook + estilizar", reporte_clasico, os.path.join(carpeta_clasico, "Reporte_Faltantes.xlsx"), faltantes)
+        _, t_write_only = medir("write_only + estilos", escribir_reportes, ruta_ml, faltantes, [])
+        _, t_csv = medir("csv", escribir_reportes, ruta_ml, faltantes, [], "csv")
+        print(f"Mejora: x{t_clasico / t_write_only:.1f} (csv: x{t_clasico / t_csv:.1f})")
+
+    print(f"\n== Ayuda de vinculación ({args.nombres} nombres, {args.titulos} títulos) ==")
+    nombres, pares = generar_catalogo_nombres(args.nombres, args.titulos)
+    titulos = [t for t, _ in pares]
+    correctos = [n for _, n in pares]
+    con_difflib, t_difflib = medir("difflib", vincular_difflib, titulos, nombres)
+    con_indice, t_indice = medir("índice de trigramas", vincular_indice, titulos, nombres)
+
+    def aciertos(sugeridos):
+        return sum(1 for s, c in zip(sugeridos, correctos) if s == c) / len(correctos)
+
+    coinciden = sum(1 for a, b in zip(con_difflib, con_indice) if a == b) / len(titulos)
+    print(f"Mejora: x{t_difflib / t_indice:.1f}")
+    print(f"Aciertos difflib: {aciertos(con_difflib):.1%} / índice: {aciertos(con_indice):.1%} "
+          f"/ misma sugerencia que difflib: {coinciden:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+
+# Los trigramas que aparecen en más de esta fracción de los nombres casi no discriminan
+# y son los que más cuestan (listas enormes): no se usan para elegir candidatos,
+# pero sí suman su peso al puntaje de cada candidato
+MAX_FRACCION_DOCUMENTOS = 0.5
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes y sin signos: 'Antena WiFi 2.4GHz' -> 'antena wifi 2 4ghz'"""
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(re.findall(r"[a-z0-9]+", texto))
+
+
+def trigramas(texto: str) -> dict:
+    """Trigramas de caracteres con su cantidad (con bordes, para que cuenten inicio y fin de palabra)"""
+    texto = f"  {normalizar(texto)} "
+    conteo = {}
+    for i in range(len(texto) - 2):
+        gram = texto[i:i + 3]
+        conteo[gram] = conteo.get(gram, 0) + 1
+    return conteo
+
+
+class IndiceSimilitud:
+    """
+    Índice invertido de trigramas con pesos TF-IDF normalizados.
+    La similitud es el coseno entre vectores de trigramas: tolera errores de tipeo,
+    palabras en otro orden y abreviaturas. Solo se comparan los nombres que comparten
+    algún trigrama con el texto buscado, en lugar de todos contra todos.
+    """
+
+    def __init__(self, textos: list):
+        self.textos = list(textos)
+        vectores = [trigramas(t) for t in self.textos]
+
+        frecuencia = {}
+        for vector in vectores:
+            for gram in vector:
+                frecuencia[gram] = frecuencia.get(gram, 0) + 1
+
+        total = len(self.textos)
+        self._idf = {g: math.log((1 + total) / (1 + df)) + 1 for g, df in frecuencia.items()}
+        self._max_df = max(1, int(total * MAX_FRACCION_DOCUMENTOS))
+        self._frecuencia = frecuencia
+
+        # gram -> (ids de documento, pesos) en arrays compactos
+        postings = {}
+        for doc, vector in enumerate(vectores):
+            pesos = {g: tf * self._idf[g] for g, tf in vector.items()}
+            norma = math.sqrt(sum(p * p for p in pesos.values())) or 1.0
+            for g, p in pesos.items():
+                lista = postings.get(g)
+                if lista is None:
+                    lista = postings[g] = (array("i"), array("d"))
+                lista[0].append(doc)
+                lista[1].append(p / norma)
+        self._postings = postings
+
+        # Los trigramas comunes están en más de la mitad de los nombres: se guardan densos (peso por documento)
+        # para sumar su parte al puntaje de un candidato sin buscar en la lista
+        self._densos = {}
+        for g, df in frecuencia.items():
+            if df > self._max_df:
+                docs, pesos_doc = postings.pop(g)
+                denso = self._densos[g] = array("d", bytes(8 * total))
+                for doc, peso_doc in zip(docs, pesos_doc):
+                    denso[doc] = peso_doc
+
+    def buscar(self, texto: str, k: int = 3, minimo: float = 0.4) -> list:
+        """Hasta k resultados [(indice, similitud 0-1)] ordenados de mayor a menor, con similitud >= minimo"""
+        vector = trigramas(texto)
+        pesos = {g: tf * self._idf[g] for g, tf in vector.items() if g in self._idf}
+        # La norma incluye los trigramas desconocidos: un texto con mucho "ruido" puntúa más bajo
+        norma = math.sqrt(sum(p * p for p in pesos.values()) + sum(tf * tf for g, tf in vector.items() if g not in self._idf)) or 1.0
+
+        acumulado = {}
+        comunes = []
+        for g, p in pesos.items():
+            if self._frecuencia[g] > self._max_df:
+                comunes.append((g, p / norma))
+                continue
+            self._sumar(acumulado, g, p / norma)
+
+        if not acumulado:
+            # Ningún trigrama poco común coincide (catálogo chico o muy parejo): candidatos son todos los que
+            # comparten alguno común
+            for g, _ in comunes:
+                acumulado.update((doc, 0.0) for doc, peso_doc in enumerate(self._densos[g]) if peso_doc)
+
+        # Los comunes completan el coseno de cada candidato
+        for g, peso_consulta in comunes:
+            denso = self._densos[g]
+            for doc in acumulado:
+                acumulado[doc] += peso_consulta * denso[doc]
+
+        mejores = heapq.nlargest(k, acumulado.items(), key=lambda par: par[1])
+        return [(doc, min(puntaje, 1.0)) for doc, puntaje in mejores if puntaje >= minimo]
+
+    def _sumar(self, acumulado: dict, gram: str, peso_consulta: float):
+        docs, pesos_doc = self._postings[gram]
+        for doc, peso_doc in zip(docs, pesos_doc):
+            acumulado[doc] = acumulado.get(doc, 0.0) + peso_consulta * peso_doc
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Carpeta donde viven las bases SQLite de caché (se crea sola)
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+
+# Cada cuántos guardados se vuelven a contar entradas y bytes en la base (por si otro proceso usa el mismo archivo)
+RESINCRONIZAR_CADA = 1000
+
+
+def normalizar_texto(texto) -> str:
+    """Quita espacios sobrantes para que 'Hola  mundo ' y 'Hola mundo' den la misma clave"""
+    if texto is None:
+        return ""
+    return " ".join(str(texto).split())
+
+
+def generar_clave(*partes) -> str:
+    """Clave de contenido: hash SHA-256 de las partes serializadas de forma estable"""
+    serializado = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+
+class CacheSQLite:
+    """
+    Caché persistente clave -> valor JSON en un archivo SQLite.
+    - TTL: las entradas más viejas que ttl_segundos se consideran vencidas.
+    - LRU: si se supera max_entradas o max_bytes se expulsan las menos usadas.
+    - Contadores de aciertos/fallos desde que arrancó el proceso.
+    """
+
+    def __init__(self, nombre: str, ttl_segundos: float, max_entradas: int = 10000, max_bytes: int = 100 * 1024 * 1024):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.nombre = nombre
+        self.ruta = os.path.join(CACHE_DIR, f"{nombre}.sqlite")
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.guardados = 0
+        self.expulsados = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                clave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                creado REAL NOT NULL,
+                ultimo_acceso REAL NOT NULL,
+                tamano INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_acceso ON cache (ultimo_acceso)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_creado ON cache (creado)")
+        self._conn.commit()
+
+        # Entradas y bytes se llevan en memoria: guardar no recorre la tabla para saber si hay que expulsar
+        self._resincronizar()
+
+    def _resincronizar(self):
+        self._entradas, self._bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM cache").fetchone()
+
+    def obtener(self, clave: str):
+        """Devuelve el valor guardado o None si no existe o ya venció"""
+        ahora = time.time()
+        with self._lock:
+            fila = self._conn.execute("SELECT valor, creado FROM cache WHERE clave = ?", (clave,)).fetchone()
+
+            if fila is None:
+                self.fallos += 1
+                return None
+
+            valor, creado = fila
+            if ahora - creado > self.ttl_segundos:
+                self._conn.execute("DELETE FROM cache WHERE clave = ?", (clave,))
+                self._conn.commit()
+                self._entradas -= 1
+                self._bytes -= len(valor)
+                self.fallos += 1
+                return None
+
+            self._conn.execute("UPDATE cache SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave))
+            self._conn.commit()
+            self.aciertos += 1
+
+        return json.loads(valor)
+
+    def guardar(self, clave: str, valor):
+        serializado = json.dumps(valor, ensure_ascii=False)
+        ahora = time.time()
+        with self._lock:
+            anterior = self._conn.execute("SELECT tamano FROM cache WHERE clave = ?", (clave,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (clave, valor, creado, ultimo_acceso, tamano) VALUES (?, ?, ?, ?, ?)",
+                (clave, serializado, ahora, ahora, len(serializado))
+            )
+            if anterior is None:
+                self._entradas += 1
+            else:
+                self._bytes -= anterior[0]
+            self._bytes += len(serializado)
+
+            self.guardados += 1
+            if self.guardados % RESINCRONIZAR_CADA == 0:
+                self._resincronizar()
+            self._expulsar()
+            self._conn.commit()
+
+    def _expulsar(self):
+        """Borra vencidas y, si aún sobra, las menos usadas recientemente (LRU); todo por índice, sin recorrer la tabla"""
+        limite = time.time() - self.ttl_segundos
+        vencidas, bytes_vencidos = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM cache WHERE creado < ?", (limite,)
+        ).fetchone()
+        if vencidas:
+            self._conn.execute("DELETE FROM cache WHERE creado < ?", (limite,))
+            self.expulsados += vencidas
+            self._entradas -= vencidas
+            self._bytes -= bytes_vencidos
+
+        if self._entradas <= self.max_entradas and self._bytes <= self.max_bytes:
+            return
+
+        # Se leen solo las menos usadas, en orden, hasta cubrir lo que sobra (en entradas y en bytes)
+        sobrantes = max(self._entradas - self.max_entradas, 0)
+        exceso_bytes = self._bytes - self.max_bytes
+        cantidad = liberados = 0
+        cursor = self._conn.execute("SELECT tamano FROM cache ORDER BY ultimo_acceso, rowid")
+        for (tamano,) in cursor:
+            if cantidad >= sobrantes and liberados >= exceso_bytes:
+                break
+            cantidad += 1
+            liberados += tamano
+        cursor.close()
+
+        self._conn.execute(
+            "DELETE FROM cache WHERE clave IN (SELECT clave FROM cache ORDER BY ultimo_acceso, rowid LIMIT ?)", (cantidad,)
+        )
+        self.expulsados += cantidad
+        self._entradas -= cantidad
+        self._bytes -= liberados
+
+    def limpiar(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+            self._entradas = self._bytes = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            entradas, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM cache").fetchone()
+
+        consultas = self.aciertos + self.fallos
+        return {
+            "nombre": self.nombre,
+            "entradas": entradas,
+            "bytes": total_bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+            "guardados": self.guardados,
+            "expulsados": self.expulsados,
+            "ttl_segundos": self.ttl_segundos,
+            "max_entradas": self.max_entradas,
+            "max_bytes": self.max_bytes
+        }
@@ -0,0 +1,200 @@
+"""
+Detección de la fila de encabezados y mapeo automático de columnas (SKU, precio, título...).
+Lo usan la app de escritorio, el motor del actualizador y el Add-in (vía /api/encabezados/detectar).
+"""
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Límites del escaneo: los encabezados siempre están arriba y no ocupan cientos de columnas
+MAX_FILAS = 30
+MAX_COLUMNAS = 150
+MAX_LARGO_CELDA = 120
+
+# Palabras clave por rol (sin tildes y en mayúsculas). En "exactos" el orden es la preferencia
+# cuando hay varias candidatas (SELLER_SKU antes que SKU); "contiene" puntúa menos.
+ROLES = {
+    "sku": {"exactos": ["SELLER_SKU", "SELLER SKU", "SKU", "CODIGO", "INTERNAL_ID", "ZMART", "COD", "REFERENCIA"],
+            "contiene": ["SKU", "CODIGO", "ZMART"]},
+    "precio": {"exactos": ["PRICE", "PRECIO", "COSTO", "PVP", "ML"],
+               "contiene": ["PRECIO", "PRICE", "COSTO"]},
+    "nombre": {"exactos": ["NOMBRE", "PRODUCTO", "DESCRIPCION", "TITULO", "TITLE"],
+               "contiene": ["NOMBRE", "PRODUCTO"]},
+    "titulo": {"exactos": ["TITLE", "TITULO"],
+               "contiene": ["TITULO", "TITLE"]},
+    "descripcion": {"exactos": ["DESCRIPCION", "DESCRIPTION"],
+                    "contiene": []},
+}
+ROLES_POR_DEFECTO = ("sku", "precio", "titulo")
+
+PUNTOS_EXACTO = 3
+PUNTOS_CONTIENE = 1
+
+# Decisiones ya tomadas: bloque escaneado completo (valores crudos) + roles -> fila y columnas.
+# La clave es el bloque entero: con la misma entrada la respuesta es la misma, haya caché o no.
+MAX_DECISIONES = 256
+_decisiones = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalizar_celda(valor) -> str:
+    """'  Título ' -> 'TITULO' (solo textos; números y vacíos devuelven "")"""
+    if not isinstance(valor, str):
+        return ""
+    texto = valor.strip()[:MAX_LARGO_CELDA]
+    if not texto:
+        return ""
+    if not texto.isascii():
+        texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return texto.upper()
+
+
+def nombres_columnas(fila) -> list:
+    """Igual que en las vistas previas: las celdas vacías se llaman 'Columna N'"""
+    columnas = []
+    for c_i, val in enumerate(fila):
+        v_str = str(val).strip() if val else ""
+        if v_str == "": v_str = f"Columna {c_i+1}"
+        columnas.append(v_str)
+    return columnas
+
+
+def indices_columnas(fila, nombres) -> dict:
+    """
+    Posición (base 0) de cada nombre de columna elegido en la fila, con el criterio de nombres_columnas.
+    Corta apenas encuentra todos: no arma los nombres de la fila completa.
+    """
+    buscados = {n for n in nombres if n}
+    con_genericos = any(n.startswith("Columna ") for n in buscados)
+    encontrados = {}
+    for c_i, val in enumerate(fila):
+        v_str = str(val).strip() if val else ""
+        if v_str == "":
+            if not con_genericos:
+                continue
+            v_str = f"Columna {c_i+1}"
+        if v_str in buscados and v_str not in encontrados:
+            encontrados[v_str] = c_i
+            if len(encontrados) == len(buscados):
+                break
+    return encontrados
+
+
+def ubicar_encabezado(filas, requeridos, opcionales=(), max_filas: int = MAX_FILAS):
+    """
+    Recorre como mucho max_filas del iterador (todas si es None) buscando la fila que tiene todas
+    las columnas requeridas (las opcionales se informan si están en esa misma fila).
+    Devuelve (número de fila base 0, {nombre: índice}) o (-1, {}) si no aparece.
+    Las filas siguientes quedan sin consumir en el iterador.
+    """
+    requeridos = {n for n in requeridos if n}
+    buscados = requeridos | {n for n in opcionales if n}
+    for r_i, fila in enumerate(filas):
+        encontrados = indices_columnas(fila, buscados)
+        if requeridos <= encontrados.keys():
+            return r_i, encontrados
+        if max_filas is not None and r_i + 1 >= max_filas:
+            break
+    return -1, {}
+
+
+def _recortar(fila) -> tuple:
+    fila = tuple(fila[:MAX_COLUMNAS])
+    fin = len(fila)
+    while fin and (fila[fin - 1] is None or fila[fin - 1] == ""):
+        fin -= 1
+    return fila[:fin]
+
+
+def _candidatos(textos: list, rol: str) -> list:
+    """[(puntos, preferencia, columna)] de las celdas que sirven para el rol"""
+    claves = ROLES[rol]
+    candidatos = []
+    for c_i, texto in enumerate(textos):
+        if not texto:
+            continue
+        if texto in claves["exactos"]:
+            candidatos.append((PUNTOS_EXACTO, -claves["exactos"].index(texto), -c_i))
+        else:
+            for pos, clave in enumerate(claves["contiene"]):
+                if clave in texto:
+                    candidatos.append((PUNTOS_CONTIENE, -pos, -c_i))
+                    break
+    return candidatos
+
+
+def _asignar_columnas(textos: list, roles) -> tuple:
+    """Mejor columna para cada rol (una columna no se usa para dos roles); devuelve (columnas, puntaje)"""
+    opciones = []
+    for rol in roles:
+        for puntos, preferencia, menos_col in _candidatos(textos, rol):
+            opciones.append((puntos, preferencia, menos_col, rol))
+
+    columnas = {}
+    usadas = set()
+    puntaje = 0
+    for puntos, _, menos_col, rol in sorted(opciones, reverse=True):
+        if rol in columnas or -menos_col in usadas:
+            continue
+        columnas[rol] = -menos_col
+        usadas.add(-menos_col)
+        puntaje += puntos
+    return columnas, puntaje
+
+
+def detectar_encabezado(filas, roles=ROLES_POR_DEFECTO) -> dict:
+    """
+    Elige la fila de encabezados entre las primeras MAX_FILAS por puntaje (palabras clave de cada rol,
+    más textos y menos números que una fila de datos) y mapea cada rol a su columna.
+    Si ya se puntuó exactamente el mismo bloque de filas, se reutiliza la decisión sin puntuar.
+    Devuelve {"fila", "encabezados", "columnas": {rol: índice}, "puntaje", "encontrado", "desde_cache"}.
+    Sin candidatos, "fila" es 0 (la primera), como hacían las vistas previas.
+    """
+    roles = tuple(r for r in roles if r in ROLES) or ROLES_POR_DEFECTO
+    filas = [_recortar(f) for f, _ in zip(filas, range(MAX_FILAS))]
+
+    # Un solo hash del bloque (no uno por fila); valores no hasheables (listas en celdas) van sin caché
+    clave = (tuple(filas), roles)
+    with _lock:
+        try:
+            guardada = _decisiones.get(clave)
+        except TypeError:
+            guardada = clave = None
+        if guardada is not None:
+            _decisiones.move_to_end(clave)
+            return _resultado(filas, guardada["fila"], dict(guardada["columnas"]), guardada["puntaje"], True)
+
+    mejor = (0, 0)
+    mejor_fila, mejor_columnas = 0, {}
+    maximo = PUNTOS_EXACTO * len(roles)
+    for r_i, fila in enumerate(filas):
+        textos = [normalizar_celda(v) for v in fila]
+        columnas, puntaje = _asignar_columnas(textos, roles)
+        if puntaje == 0:
+            continue
+        numeros = sum(1 for v in fila if isinstance(v, (int, float)) and not isinstance(v, bool))
+        desempate = sum(1 for t in textos if t) - numeros
+        if (puntaje, desempate) > mejor:
+            mejor = (puntaje, desempate)
+            mejor_fila, mejor_columnas = r_i, columnas
+            if puntaje == maximo:
+                break
+
+    if clave is not None and mejor[0] > 0:
+        with _lock:
+            _decisiones[clave] = {"fila": mejor_fila, "columnas": dict(mejor_columnas), "puntaje": mejor[0]}
+            while len(_decisiones) > MAX_DECISIONES:
+                _decisiones.popitem(last=False)
+    return _resultado(filas, mejor_fila, mejor_columnas, mejor[0], False)
+
+
+def _resultado(filas: list, fila: int, columnas: dict, puntaje: int, desde_cache: bool) -> dict:
+    encabezados = nombres_columnas(filas[fila]) if filas else []
+    return {
+        "fila": fila,
+        "encabezados": encabezados,
+        "columnas": columnas,
+        "puntaje": puntaje,
+        "encontrado": puntaje > 0,
+        "desde_cache": desde_cache
+    }
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tamaño de cada pool de hilos (configurable desde el .env)
+# Gemini: llamadas de red largas, limitadas por la cuota de la API
+# Imágenes: descarga + PIL
+# Búsqueda: DuckDuckGo (conviene pocas en paralelo para evitar bloqueos 403)
+TAMANOS_POOL = {
+    "gemini": int(os.getenv("POOL_GEMINI_SIZE", "8")),
+    "imagenes": int(os.getenv("POOL_IMAGENES_SIZE", "8")),
+    "busqueda": int(os.getenv("POOL_BUSQUEDA_SIZE", "4")),
+}
+
+_pools = {}
+
+
+def obtener_pool(nombre: str) -> ThreadPoolExecutor:
+    """Devuelve (creándolo la primera vez) el pool de hilos acotado para ese tipo de trabajo"""
+    if nombre not in TAMANOS_POOL:
+        raise ValueError(f"Pool desconocido: {nombre}")
+
+    if nombre not in _pools:
+        _pools[nombre] = ThreadPoolExecutor(
+            max_workers=TAMANOS_POOL[nombre],
+            thread_name_prefix=f"pool-{nombre}"
+        )
+    return _pools[nombre]
+
+
+async def ejecutar_en_pool(nombre: str, funcion, *args, **kwargs):
+    """
+    Ejecuta una función bloqueante en su pool sin congelar el event loop de FastAPI.
+    Así una búsqueda de imágenes lenta no bloquea /api/status ni el resto de rutas.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(obtener_pool(nombre), partial(funcion, *args, **kwargs))
+
+
+def cerrar_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
+
+
+class VueloUnico:
+    """
+    Single-flight: si varios hilos piden lo mismo a la vez, solo uno ejecuta
+    el trabajo y los demás esperan y reciben el mismo resultado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+
+    def ejecutar(self, clave, funcion, *args, **kwargs):
+        with self._lock:
+            futuro = self._en_vuelo.get(clave)
+            lider = futuro is None
+            if lider:
+                futuro = Future()
+                self._en_vuelo[clave] = futuro
+
+        if not lider:
+            return futuro.result()
+
+        try:
+            futuro.set_result(funcion(*args, **kwargs))
+        except Exception as e:
+            futuro.set_exception(e)
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+
+        return futuro.result()
+
+
+class LimitadorTasa:
+    """
+    Token bucket compartido entre hilos: permite ráfagas de hasta 'capacidad'
+    consultas y luego 'tasa_por_seg' consultas por segundo. Reemplaza las pausas a ciegas.
+    """
+
+    def __init__(self, tasa_por_seg: float, capacidad: int):
+        self.tasa_por_seg = tasa_por_seg
+        self.capacidad = capacidad
+        self._tokens = float(capacidad)
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloquea hasta que haya un token disponible y lo consume"""
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa_por_seg)
+                self._ultimo = ahora
+
+                if ahora < self._pausa_hasta:
+                    espera = self._pausa_hasta - ahora
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    espera = (1 - self._tokens) / self.tasa_por_seg
+            time.sleep(espera)
+
+    def penalizar(self, segundos: float):
+        """Pausa global (por ejemplo tras un 403) y vacía el cubo para no salir en ráfaga después"""
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+            self._tokens = 0.0
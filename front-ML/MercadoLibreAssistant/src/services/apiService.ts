@@ -65,4 +65,93 @@ export async function fetchSmartEditBulk(filas: any[], comandoUsuario: string) {
   }
 
   return await response.json();
-}
\ No newline at end of file
+}
+// VERSIÓN EN STREAMING: el servidor manda una línea JSON por evento (NDJSON)
+// y llamamos a onEvento en cuanto llega cada una, sin esperar al lote completo
+export async function fetchSmartEditBulkStream(filas: any[], comandoUsuario: string, onEvento: (evento: any) => void | Promise<void>) {
+  const response = await fetch("https://localhost:8000/api/smart-edit-bulk/stream", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      filas: filas,
+      comando_usuario: comandoUsuario
+    }),
+  });
+
+  if (!response.ok || !response.body) {
+    const errorData = await response.json().catch(() => ({ detail: "Error de red" }));
+    throw new Error(errorData.detail || "Error desconocido");
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder("utf-8");
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    const lineas = buffer.split("\n");
+    buffer = lineas.pop() || ""; // La última puede venir incompleta
+
+    for (const linea of lineas) {
+      if (linea.trim() !== "") await onEvento(JSON.parse(linea));
+    }
+  }
+
+  if (buffer.trim() !== "") await onEvento(JSON.parse(buffer));
+}
+
+// TRABAJOS EN SEGUNDO PLANO: el servidor guarda el estado, así que si el panel se recarga
+// basta con volver a consultar el id (se puede guardar en localStorage)
+async function leerRespuestaTrabajo(response: Response) {
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: "Error de red" }));
+    throw new Error(errorData.detail || "Error desconocido");
+  }
+  return await response.json();
+}
+
+export async function enviarTrabajo(tipo: "lote_inteligente" | "lote_imagenes" | "busqueda_imagenes", parametros: any) {
+  const response = await fetch("https://localhost:8000/api/trabajos", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ tipo: tipo, parametros: parametros }),
+  });
+  return await leerRespuestaTrabajo(response);
+}
+
+export async function consultarTrabajo(idTrabajo: string) {
+  return await leerRespuestaTrabajo(await fetch(`https://localhost:8000/api/trabajos/${idTrabajo}`));
+}
+
+export async function obtenerResultadosTrabajo(idTrabajo: string, desde: number = 0, limite: number = 500) {
+  return await leerRespuestaTrabajo(
+    await fetch(`https://localhost:8000/api/trabajos/${idTrabajo}/resultados?desde=${desde}&limite=${limite}`)
+  );
+}
+
+export async function cancelarTrabajo(idTrabajo: string) {
+  return await leerRespuestaTrabajo(
+    await fetch(`https://localhost:8000/api/trabajos/${idTrabajo}/cancelar`, { method: "POST" })
+  );
+}
+
+// DETECCIÓN DE ENCABEZADOS: la misma lógica que usa la app de escritorio (el servidor recuerda
+// los encabezados ya vistos, así que las plantillas repetidas se resuelven sin volver a puntuar)
+export async function detectarEncabezados(filas: any[][], roles: string[] = ["sku", "precio", "titulo"]) {
+  const response = await fetch("https://localhost:8000/api/encabezados/detectar", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ filas: filas, roles: roles }),
+  });
+  return await leerRespuestaTrabajo(response) as {
+    fila: number;
+    encabezados: string[];
+    columnas: Record<string, number>;
+    puntaje: number;
+    encontrado: boolean;
+    desde_cache: boolean;
+  };
+}
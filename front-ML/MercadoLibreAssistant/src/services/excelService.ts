@@ -1,4 +1,5 @@
 /* global Excel */
+import { detectarEncabezados } from "./apiService";
 
 
 
@@ -18,21 +19,10 @@ export async function getSelectedRowData() {
     headerRange.load("values");
     await context.sync();
 
-    let titleColIndex = -1;
-    let descColIndex = -1;
-
-    // 3. Escaneamos para encontrar en qué columna está el Título y la Descripción
-    for (let r = 0; r < 5; r++) {
-      const row = headerRange.values[r];
-      const tempTitleIdx = row.findIndex(c => typeof c === 'string' && c.toLowerCase().includes('título'));
-      const tempDescIdx = row.findIndex(c => typeof c === 'string' && c.trim().toLowerCase() === 'descripción');
-      
-      if (tempTitleIdx !== -1 && tempDescIdx !== -1) {
-        titleColIndex = tempTitleIdx;
-        descColIndex = tempDescIdx;
-        break; // Encontramos los encabezados, dejamos de buscar
-      }
-    }
+    // 3. El servidor detecta en qué columna está el Título y la Descripción
+    const deteccion = await detectarEncabezados(headerRange.values, ["titulo", "descripcion"]);
+    const titleColIndex = deteccion.columnas.titulo ?? -1;
+    const descColIndex = deteccion.columnas.descripcion ?? -1;
 
     if (titleColIndex === -1 || descColIndex === -1) {
       throw new Error("No se encontraron las columnas 'Título' y 'Descripción' en los encabezados de esta hoja.");
@@ -105,22 +95,9 @@ export async function getSmartRowData() {
     const allHeaderRows = headerRange.values;
     const rowData = dataRange.values[0];
 
-    let headers: any[] = [];
-
-    // 4. Buscar cuál es la verdadera fila de encabezados
-    // (Buscamos la fila que contenga la palabra "Título", "SKU" o "Características")
-    for (let r = 0; r < allHeaderRows.length; r++) {
-      const row = allHeaderRows[r];
-      if (row.some(c => typeof c === 'string' && (c.toLowerCase().includes('título') || c.toLowerCase().includes('sku')))) {
-        headers = row;
-        break; // Encontramos la fila correcta, detenemos la búsqueda
-      }
-    }
-
-    // Si por alguna razón no encuentra nada, usa la primera fila como respaldo
-    if (headers.length === 0) {
-      headers = allHeaderRows[0];
-    }
+    // 4. Buscar cuál es la verdadera fila de encabezados (si no encuentra nada, el servidor devuelve la primera)
+    const deteccion = await detectarEncabezados(allHeaderRows, ["sku", "titulo"]);
+    const headers: any[] = allHeaderRows[deteccion.fila];
 
     const datos_fila: Record<string, any> = {};
     const headerColMap: Record<string, number> = {};
@@ -194,14 +171,8 @@ export async function getMultipleSmartRowsData() {
     const allHeaderRows = headerRange.values;
     const allRowsData = dataRange.values;
 
-    let headers: any[] = [];
-    for (let r = 0; r < allHeaderRows.length; r++) {
-      const row = allHeaderRows[r];
-      if (row.some(c => typeof c === 'string' && (c.toLowerCase().includes('título') || c.toLowerCase().includes('sku')))) {
-        headers = row; break;
-      }
-    }
-    if (headers.length === 0) headers = allHeaderRows[0];
+    const deteccion = await detectarEncabezados(allHeaderRows, ["sku", "titulo"]);
+    const headers: any[] = allHeaderRows[deteccion.fila];
 
     const headerColMap: Record<string, number> = {};
     for (let i = 0; i < headers.length; i++) {
@@ -231,19 +202,27 @@ export async function getMultipleSmartRowsData() {
 
 
 // ESCRIBIR SOLO LO APROBADO (CON LIMPIEZA EXTREMA)
+// Se puede llamar varias veces con pocos cambios (por ejemplo, por cada chunk que llega en streaming)
 export async function writeApprovedSmartData(approvedChanges: any[], headerColMap: Record<string, number>) {
+  if (approvedChanges.length === 0) return;
+
   return Excel.run(async (context) => {
     const sheet = context.workbook.worksheets.getActiveWorksheet();
     const normalize = (str: string) => String(str).trim().toLowerCase().replace(/[\r\n]+/g, '');
 
+    // Normalizamos los encabezados una sola vez en lugar de buscarlos por cada celda
+    const normalizedColMap: Record<string, number> = {};
+    for (const [header, colIndex] of Object.entries(headerColMap)) {
+      normalizedColMap[normalize(header)] = colIndex;
+    }
+
     for (const change of approvedChanges) {
       const { rowIndex, datos_actualizados } = change;
       
       for (const [colName, newValue] of Object.entries(datos_actualizados)) {
-        const targetKey = Object.keys(headerColMap).find(k => normalize(k) === normalize(colName));
+        const colIndex = normalizedColMap[normalize(colName)];
         
-        if (targetKey !== undefined) {
-          const colIndex = headerColMap[targetKey];
+        if (colIndex !== undefined) {
           const cell = sheet.getCell(rowIndex, colIndex);
           cell.values = [[newValue]];
           cell.format.fill.color = "#FFFF99"; 
@@ -261,7 +240,8 @@ export async function writeApprovedSmartData(approvedChanges: any[], headerColMa
 // ==========================================
 // NUEVAS FUNCIONES DE GALERÍA DE IMÁGENES
 // ==========================================
-export async function fetchImageOptionsFromExcel(specificRow?: any) {
+// forzarBusqueda = true ignora la caché del servidor (botón "Reintentar")
+export async function fetchImageOptionsFromExcel(specificRow?: any, forzarBusqueda: boolean = false) {
   return await Excel.run(async (context) => {
     const sheet = context.workbook.worksheets.getActiveWorksheet();
     sheet.load("name");
@@ -297,7 +277,7 @@ export async function fetchImageOptionsFromExcel(specificRow?: any) {
       const response = await fetch("https://localhost:8000/api/fetch-images", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload)
+        body: JSON.stringify({ ...payload, usar_cache: !forzarBusqueda })
       });
 
       // Si el servidor responde 404 o error, devolvemos lista vacía en lugar de romper
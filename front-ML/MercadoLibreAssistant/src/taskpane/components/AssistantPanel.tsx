@@ -5,7 +5,7 @@ import {
   fetchImageOptionsFromExcel, 
   downloadSelectedImageFinal 
 } from "../../services/excelService";
-import { fetchOptimization, fetchSmartEditBulk } from "../../services/apiService";
+import { fetchOptimization, fetchSmartEditBulkStream } from "../../services/apiService";
 import "./AssistantPanel.css"; 
 
 const delay = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
@@ -18,6 +18,8 @@ export const AssistantPanel: React.FC = () => {
   const [bulkResults, setBulkResults] = useState<any[]>([]);
   const [selectedResultIds, setSelectedResultIds] = useState<Set<number>>(new Set());
   const [headerMapRef, setHeaderMapRef] = useState<Record<string, number>>({});
+  const [autoApply, setAutoApply] = useState<boolean>(false);
+  const [streaming, setStreaming] = useState<boolean>(false);
 
   // === ESTADOS PARA LA COLA DE IMÁGENES MASIVA ===
   const [imageOptions, setImageOptions] = useState<string[]>([]);
@@ -99,7 +101,7 @@ export const AssistantPanel: React.FC = () => {
       setStatus("Buscando nuevas opciones...");
       setImageOptions([]);
       const currentRow = imageQueue[currentQueueIndex];
-      const result = await fetchImageOptionsFromExcel(currentRow);
+      const result = await fetchImageOptionsFromExcel(currentRow, true);
       
       if (!result.opciones || result.opciones.length === 0) {
         setStatus("Sigue sin haber resultados.");
@@ -195,24 +197,45 @@ export const AssistantPanel: React.FC = () => {
       if (rowsData.length === 0) { setStatus("No hay datos."); setLoading(false); return; }
       
       setHeaderMapRef(headerColMap);
+      setBulkResults([]);
+      setSelectedResultIds(new Set());
       const loteParaIA = rowsData.map((row, index) => ({ id_fila: index, datos: row.datos_fila }));
       
       setStatus(`Enviando ${rowsData.length} filas a Gemini...`);
-      const response = await fetchSmartEditBulk(loteParaIA, chatCommand);
-      
-      const results: any[] = [];
-      if (response.resultados) {
-        response.resultados.forEach((res: any) => {
-           const originalRow = rowsData[res.id_fila];
-           if (originalRow && res.datos_actualizados) {
-             results.push({ id: res.id_fila, rowIndex: originalRow.rowIndex, datos_actualizados: res.datos_actualizados });
-           }
-        });
-      }
-      setBulkResults(results);
-      setSelectedResultIds(new Set(results.map(r => r.id)));
-      setStatus(`¡Procesamiento masivo completado!`);
-    } catch (error: any) { setStatus(`Error: ${error.message}`); } finally { setLoading(false); }
+      setStreaming(true);
+      let aplicadas = 0;
+      let pendientes: any[] = [];
+
+      // Los resultados llegan fila por fila; se muestran (o se escriben) en cuanto llegan
+      await fetchSmartEditBulkStream(loteParaIA, chatCommand, async (evento: any) => {
+        if (evento.tipo === "resultado") {
+          const originalRow = rowsData[evento.id_fila];
+          if (originalRow && evento.datos_actualizados) {
+            pendientes.push({ id: evento.id_fila, rowIndex: originalRow.rowIndex, datos_actualizados: evento.datos_actualizados });
+          }
+        } else if (evento.tipo === "error_fila") {
+          console.warn(`Fila ${evento.id_fila} con error:`, evento.mensaje);
+        } else if (evento.tipo === "progreso") {
+          const nuevos = pendientes;
+          pendientes = [];
+          if (autoApply) {
+            await writeApprovedSmartData(nuevos, headerColMap);
+            aplicadas += nuevos.length;
+          } else {
+            setBulkResults(prev => prev.concat(nuevos));
+            setSelectedResultIds(prev => {
+              const next = new Set(prev);
+              nuevos.forEach(r => next.add(r.id));
+              return next;
+            });
+          }
+          setStatus(`Analizando lote... ${evento.filas_procesadas} de ${evento.total_filas} filas`);
+        } else if (evento.tipo === "resumen") {
+          const base = autoApply ? `¡${aplicadas} filas escritas en Excel!` : `¡Procesamiento masivo completado!`;
+          setStatus(evento.errores > 0 ? `${base} (${evento.errores} filas con error)` : base);
+        }
+      });
+    } catch (error: any) { setStatus(`Error: ${error.message}`); } finally { setStreaming(false); setLoading(false); }
   };
 
   const handleApplyApproved = async () => {
@@ -221,7 +244,13 @@ export const AssistantPanel: React.FC = () => {
       const approvedChanges = bulkResults.filter(res => selectedResultIds.has(res.id));
       await writeApprovedSmartData(approvedChanges, headerMapRef);
       setStatus(`¡${approvedChanges.length} filas actualizadas!`);
-      setBulkResults([]); 
+      if (streaming) {
+        // El lote sigue llegando: solo quitamos lo que ya se escribió
+        const aplicadas = new Set(approvedChanges.map(r => r.id));
+        setBulkResults(prev => prev.filter(r => !aplicadas.has(r.id)));
+      } else {
+        setBulkResults([]);
+      }
     } catch (error) { setStatus("Error al escribir los cambios."); }
   };
 
@@ -287,6 +316,10 @@ export const AssistantPanel: React.FC = () => {
           rows={3}
           style={{ width: "100%", marginBottom: "10px", padding: "5px" }}
         />
+        <label style={{ display: "block", fontSize: "0.8em", marginBottom: "10px" }}>
+          <input type="checkbox" checked={autoApply} onChange={(e) => setAutoApply(e.target.checked)} disabled={loading} />
+          {" "}Escribir en Excel cada fila en cuanto llegue (sin revisión)
+        </label>
         <button className="primary-btn" onClick={handleSmartEditBulk} disabled={loading || !chatCommand} style={{ width: "100%" }}>
           {loading ? "Analizando lote..." : "Ejecutar IA en Selección"}
         </button>
@@ -3,7 +3,11 @@ from google.api_core import exceptions as google_exceptions
 import json
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
+from cache_service import CacheSQLite, generar_clave, normalizar_texto
+from router_modelos import RouterModelos
 
 load_dotenv()
 
@@ -21,9 +25,55 @@ MODELOS_DISPONIBLES = [
     'gemini-flash-latest',
 ]
 
+# Costo relativo aproximado de cada modelo (1 = el más barato)
+COSTO_MODELOS = {
+    'gemini-2.5-pro': 4,
+    'gemini-2.5-flash': 2,
+    'gemini-2.0-flash': 1,
+    'gemini-flash-latest': 2,
+}
+
+# Qué modelos usa cada tarea y cómo se ordenan los que están sanos:
+# 'orden' = preferencia fija, 'costo' = el más barato primero, 'latencia' = el más rápido primero
+TAREAS_MODELOS = {
+    "general": {"modelos": MODELOS_DISPONIBLES, "criterio": "orden"},
+    "optimizar": {"modelos": MODELOS_DISPONIBLES, "criterio": os.getenv("ROUTER_CRITERIO_OPTIMIZAR", "orden")},
+    "fila": {"modelos": MODELOS_DISPONIBLES, "criterio": os.getenv("ROUTER_CRITERIO_FILA", "costo")},
+    "lote": {
+        "modelos": ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-flash-latest', 'gemini-2.5-pro'],
+        "criterio": os.getenv("ROUTER_CRITERIO_LOTE", "latencia")
+    },
+}
+
+router = RouterModelos(MODELOS_DISPONIBLES, COSTO_MODELOS, TAREAS_MODELOS)
+
 MAX_REINTENTOS = 3
 REINTENTO_BASE_DELAY = 2
 
+# /api/status no genera contenido salvo que no haya tráfico; entonces sondea como mucho una vez cada N minutos (0 = nunca)
+ESTADO_SONDA_MINUTOS = float(os.getenv("ESTADO_SONDA_MINUTOS", "10"))
+_ultima_sonda = None
+_lock_sonda = threading.Lock()
+
+# Lotes masivos: se dividen en chunks por presupuesto de tokens y se procesan en paralelo
+LOTE_MAX_TOKENS_CHUNK = int(os.getenv("LOTE_MAX_TOKENS_CHUNK", "6000"))
+LOTE_MAX_FILAS_CHUNK = int(os.getenv("LOTE_MAX_FILAS_CHUNK", "25"))
+LOTE_MAX_PARALELO = int(os.getenv("LOTE_MAX_PARALELO", "4"))
+LOTE_REINTENTOS_CHUNK = int(os.getenv("LOTE_REINTENTOS_CHUNK", "2"))
+
+# Versión de cada plantilla de prompt: cambiarla invalida la caché de esa tarea
+VERSION_PROMPT_OPTIMIZAR = "optimizar-v1"
+VERSION_PROMPT_FILA = "fila-v1"
+VERSION_PROMPT_LOTE = "lote-v1"
+
+# Caché de respuestas de Gemini (evita repetir llamadas cuando se re-ejecuta una selección)
+cache_respuestas = CacheSQLite(
+    "gemini_respuestas",
+    ttl_segundos=float(os.getenv("CACHE_GEMINI_TTL_HORAS", "72")) * 3600,
+    max_entradas=int(os.getenv("CACHE_GEMINI_MAX_ENTRADAS", "20000")),
+    max_bytes=int(os.getenv("CACHE_GEMINI_MAX_MB", "200")) * 1024 * 1024
+)
+
 def crear_modelo(modelo_nombre: str):
     return genai.GenerativeModel(modelo_nombre)
 
@@ -42,11 +92,15 @@ def limpiar_json_response(texto: str) -> str:
         texto = texto[:-len(marker_close)]
     return texto.strip()
 
-def generar_con_reintentos(prompt: str, modelo_nombre: str = None) -> dict:
-    if modelo_nombre is None:
-        modelo_nombre = MODELOS_DISPONIBLES[0]
-    
-    modelos_a_probar = MODELOS_DISPONIBLES[MODELOS_DISPONIBLES.index(modelo_nombre):] if modelo_nombre in MODELOS_DISPONIBLES else MODELOS_DISPONIBLES
+def generar_con_reintentos(prompt: str, modelo_nombre: str = None, tarea: str = "general") -> dict:
+    if modelo_nombre is not None:
+        modelos_a_probar = [modelo_nombre]
+    else:
+        # El router ya descarta los modelos con cuota agotada o en enfriamiento
+        modelos_a_probar = router.candidatos(tarea)
+
+    if not modelos_a_probar:
+        raise Exception("Error de cuota: todos los modelos están en enfriamiento, consulta /api/modelos/estado")
     
     ultimo_error = None
     
@@ -54,9 +108,11 @@ def generar_con_reintentos(prompt: str, modelo_nombre: str = None) -> dict:
         model = crear_modelo(modelo_actual)
         
         for intento in range(MAX_REINTENTOS):
+            inicio = time.monotonic()
             try:
                 print(f"Intentando con modelo: {modelo_actual} (intento {intento + 1}/{MAX_REINTENTOS})")
                 response = model.generate_content(prompt)
+                router.registrar_exito(modelo_actual, time.monotonic() - inicio)
                 print(f"Exito con modelo: {modelo_actual}")
                 return {
                     'modelo_usado': modelo_actual,
@@ -65,24 +121,20 @@ def generar_con_reintentos(prompt: str, modelo_nombre: str = None) -> dict:
                 
             except google_exceptions.ResourceExhausted as e:
                 print(f"Cuota agotada para {modelo_actual}")
+                router.registrar_fallo(modelo_actual, 'CUOTA_AGOTADA', str(e))
                 ultimo_error = {
                     'tipo': 'CUOTA_AGOTADA',
                     'mensaje': 'Has exceeded your current quota.',
                     'modelo': modelo_actual,
-                    'siguiente_accion': 'Cambiando de modelo...' if len(modelos_a_probar) > 1 else 'No hay mas modelos disponibles'
+                    'siguiente_accion': 'Cambiando de modelo...'
                 }
-                
-                if len(modelos_a_probar) > 1:
-                    break
-                else:
-                    if intento < MAX_REINTENTOS - 1:
-                        time.sleep(5)
-                        continue
-                    else:
-                        raise Exception("Cuota agotada y sin modelos alternativos disponibles")
+                # El router lo deja en enfriamiento: no tiene sentido reintentar este modelo
+                break
                         
             except google_exceptions.RetryError as e:
                 print(f"Error de conexion (intento {intento + 1})")
+                router.registrar_fallo(modelo_actual, 'CONEXION', str(e))
+                ultimo_error = {'tipo': 'CONEXION', 'mensaje': str(e)[:200], 'modelo': modelo_actual}
                 if intento < MAX_REINTENTOS - 1:
                     delay = REINTENTO_BASE_DELAY * (2 ** intento)
                     print(f"Esperando {delay} segundos...")
@@ -91,11 +143,24 @@ def generar_con_reintentos(prompt: str, modelo_nombre: str = None) -> dict:
                     
             except Exception as e:
                 print(f"Error inesperado: {str(e)[:200]}")
+                router.registrar_fallo(modelo_actual, 'ERROR', str(e))
                 raise Exception(f"Error al procesar solicitud: {str(e)}")
     
+    if ultimo_error and ultimo_error['tipo'] == 'CONEXION':
+        raise Exception(f"Error de conexion: {ultimo_error}")
     raise Exception(f"Error de cuota: {ultimo_error}")
 
-def optimize_listing(titulo: str, descripcion: str, categoria: str) -> dict:
+def optimize_listing(titulo: str, descripcion: str, categoria: str, usar_cache: bool = True) -> dict:
+    clave = generar_clave(
+        router.modelo_base("optimizar"), VERSION_PROMPT_OPTIMIZAR,
+        normalizar_texto(titulo), normalizar_texto(descripcion), normalizar_texto(categoria)
+    )
+    if usar_cache:
+        en_cache = cache_respuestas.obtener(clave)
+        if en_cache is not None:
+            print(f"Cache HIT (optimizar): {titulo[:60]}")
+            return en_cache
+
     prompt = f"""
     Eres un experto en SEO y posicionamiento en Mercado Libre. 
     Tu objetivo es optimizar publicaciones para aumentar la conversion.
@@ -118,7 +183,7 @@ def optimize_listing(titulo: str, descripcion: str, categoria: str) -> dict:
     """
     
     try:
-        resultado = generar_con_reintentos(prompt)
+        resultado = generar_con_reintentos(prompt, tarea="optimizar")
         raw_text = limpiar_json_response(resultado['response'].text)
         
         print(f"\n=== RESPUESTA DE GEMINI ===")
@@ -127,6 +192,7 @@ def optimize_listing(titulo: str, descripcion: str, categoria: str) -> dict:
         
         respuesta_json = json.loads(raw_text)
         respuesta_json['_modelo_usado'] = resultado.get('modelo_usado', 'unknown')
+        cache_respuestas.guardar(clave, respuesta_json)
         return respuesta_json
         
     except Exception as e:
@@ -137,7 +203,20 @@ def optimize_listing(titulo: str, descripcion: str, categoria: str) -> dict:
             "solucion": "Espera hasta manana para el reset de cuota, o usa una nueva API key"
         }
 
-def procesar_fila_inteligente(datos_fila: dict, comando_usuario: str) -> dict:
+def normalizar_datos_fila(datos_fila: dict) -> dict:
+    return {normalizar_texto(k): normalizar_texto(v) for k, v in datos_fila.items()}
+
+def procesar_fila_inteligente(datos_fila: dict, comando_usuario: str, usar_cache: bool = True) -> dict:
+    clave = generar_clave(
+        router.modelo_base("fila"), VERSION_PROMPT_FILA,
+        normalizar_datos_fila(datos_fila), normalizar_texto(comando_usuario)
+    )
+    if usar_cache:
+        en_cache = cache_respuestas.obtener(clave)
+        if en_cache is not None:
+            print("Cache HIT (fila)")
+            return en_cache
+
     prompt = f"""
     Eres un experto en e-commerce y Mercado Libre.
     Datos del producto en JSON: {json.dumps(datos_fila, ensure_ascii=False)}
@@ -147,7 +226,7 @@ def procesar_fila_inteligente(datos_fila: dict, comando_usuario: str) -> dict:
     """
     
     try:
-        resultado = generar_con_reintentos(prompt)
+        resultado = generar_con_reintentos(prompt, tarea="fila")
         raw_text = limpiar_json_response(resultado['response'].text)
         
         print(f"\n=== RESPUESTA DE GEMINI ===")
@@ -156,12 +235,37 @@ def procesar_fila_inteligente(datos_fila: dict, comando_usuario: str) -> dict:
         
         respuesta_json = json.loads(raw_text)
         respuesta_json['_modelo_usado'] = resultado.get('modelo_usado', 'unknown')
+        cache_respuestas.guardar(clave, respuesta_json)
         return respuesta_json
         
     except Exception as e:
         return {"error": "Error de API de Gemini", "details": str(e)}
 
-def procesar_lote_inteligente(filas, comando_usuario):
+def estimar_tokens(texto: str) -> int:
+    # Aproximación suficiente para repartir lotes: ~4 caracteres por token
+    return len(texto) // 4 + 1
+
+def dividir_en_chunks(filas: list) -> list:
+    """Reparte las filas en chunks que respetan el presupuesto de tokens y el máximo de filas"""
+    chunks = []
+    actual = []
+    tokens_actual = 0
+
+    for fila in filas:
+        tokens_fila = estimar_tokens(json.dumps(fila, ensure_ascii=False))
+        if actual and (tokens_actual + tokens_fila > LOTE_MAX_TOKENS_CHUNK or len(actual) >= LOTE_MAX_FILAS_CHUNK):
+            chunks.append(actual)
+            actual = []
+            tokens_actual = 0
+        actual.append(fila)
+        tokens_actual += tokens_fila
+
+    if actual:
+        chunks.append(actual)
+    return chunks
+
+def procesar_chunk_lote(filas: list, comando_usuario: str) -> list:
+    """Envía un chunk a Gemini y devuelve la lista de resultados. Lanza excepción si la respuesta no sirve."""
     prompt = f"""
     Procesa este lote de {len(filas)} productos para Mercado Libre.
     Instrucción: "{comando_usuario}"
@@ -173,50 +277,207 @@ def procesar_lote_inteligente(filas, comando_usuario):
     3. No inventes columnas, solo llena las que el usuario pida o falten.
     4. NO digas "Hola" ni expliques nada. Solo devuelve el código.
     """
+    # Usamos el sistema de reintentos y modelos automáticos
+    resultado = generar_con_reintentos(prompt, tarea="lote")
+    texto = limpiar_json_response(resultado['response'].text)
+
+    # FILTRO INTELIGENTE EXTRA: Buscar solo lo que está entre corchetes [ ]
+    inicio = texto.find('[')
+    fin = texto.rfind(']') + 1
+    if inicio != -1 and fin != 0:
+        texto = texto[inicio:fin]
+
+    respuesta = json.loads(texto)
+    if not isinstance(respuesta, list):
+        raise ValueError("La IA no devolvió un arreglo JSON")
+
+    ids_validos = {f["id_fila"] for f in filas}
+    return [
+        r for r in respuesta
+        if isinstance(r, dict) and r.get("id_fila") in ids_validos and isinstance(r.get("datos_actualizados"), dict)
+    ]
+
+def iterar_lote_inteligente(filas: list, comando_usuario: str, usar_cache: bool = True, cancelar: threading.Event = None):
+    """
+    Procesa el lote en chunks paralelos: nunca hay más de LOTE_MAX_PARALELO enviados a Gemini a la vez.
+    Va entregando cada chunk en cuanto termina: {"chunk", "total_chunks", "resultados", "errores"}.
+    Las filas que ya están en caché salen primero en un chunk propio y no se envían a Gemini.
+    Solo se reintentan los chunks que fallaron, con espera creciente y solo si el router tiene algún modelo sano.
+    Si se marca cancelar (o se cierra el generador) no se envían más chunks.
+    """
+    # La clave por fila no incluye id_fila: la misma fila en otra selección también acierta
+    claves = {
+        f["id_fila"]: generar_clave(
+            router.modelo_base("lote"), VERSION_PROMPT_LOTE,
+            normalizar_datos_fila(f["datos"]), normalizar_texto(comando_usuario)
+        )
+        for f in filas
+    }
+
+    desde_cache = []
+    filas_pendientes = filas
+    if usar_cache:
+        filas_pendientes = []
+        for f in filas:
+            en_cache = cache_respuestas.obtener(claves[f["id_fila"]])
+            if en_cache is not None:
+                desde_cache.append({"id_fila": f["id_fila"], "datos_actualizados": en_cache})
+            else:
+                filas_pendientes.append(f)
+
+    chunks = dividir_en_chunks(filas_pendientes)
+    total_chunks = len(chunks) + (1 if desde_cache else 0)
+
+    if desde_cache:
+        print(f"Cache HIT (lote): {len(desde_cache)} de {len(filas)} filas")
+        yield {
+            "chunk": len(chunks),
+            "total_chunks": total_chunks,
+            "resultados": desde_cache,
+            "errores": []
+        }
+
+    if not chunks:
+        return
+
+    def _cancelado():
+        return cancelar is not None and cancelar.is_set()
+
+    def _error_chunk(i, chunk, mensaje):
+        return {
+            "chunk": i,
+            "total_chunks": total_chunks,
+            "resultados": [],
+            "errores": [{"id_fila": f["id_fila"], "mensaje": mensaje} for f in chunk]
+        }
+
+    # (momento desde el que se puede enviar, índice, chunk, intento)
+    pendientes = [(0.0, i, chunk, 0) for i, chunk in enumerate(chunks)]
+    en_curso = {}
+    pool = ThreadPoolExecutor(max_workers=min(LOTE_MAX_PARALELO, len(chunks)))
     try:
-        # AQUÍ ESTÁ LA MAGIA: Usamos TU sistema de reintentos y modelos automáticos
-        resultado = generar_con_reintentos(prompt)
-        
-        # Usamos TU función de limpieza de backticks
-        texto = limpiar_json_response(resultado['response'].text)
-        
-        # FILTRO INTELIGENTE EXTRA: Buscar solo lo que está entre corchetes [ ]
-        inicio = texto.find('[')
-        fin = texto.rfind(']') + 1
-        
-        if inicio != -1 and fin != 0:
-            texto_limpio = texto[inicio:fin]
-        else:
-            texto_limpio = texto # Si no hay corchetes, intentamos con el texto normal
-            
-        return {"resultados": json.loads(texto_limpio)}
-        
-    except Exception as e:
+        while pendientes or en_curso:
+            if _cancelado():
+                return
+
+            # Se envían chunks solo hasta llenar los huecos libres
+            ahora = time.monotonic()
+            pendientes.sort(key=lambda p: p[0])
+            while pendientes and len(en_curso) < LOTE_MAX_PARALELO and pendientes[0][0] <= ahora:
+                _, i, chunk, intento = pendientes.pop(0)
+                en_curso[pool.submit(procesar_chunk_lote, chunk, comando_usuario)] = (i, chunk, intento)
+
+            if not en_curso:
+                # Solo quedan reintentos esperando su turno
+                espera = pendientes[0][0] - ahora
+                if cancelar is not None:
+                    cancelar.wait(espera)
+                else:
+                    time.sleep(espera)
+                continue
+
+            # Espera corta para revisar cancelar aunque los chunks en curso tarden
+            listos, _ = wait(en_curso, timeout=0.5, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                i, chunk, intento = en_curso.pop(futuro)
+                try:
+                    resultados = futuro.result()
+                except Exception as e:
+                    print(f"Chunk {i + 1}/{len(chunks)} falló (intento {intento + 1}): {str(e)[:200]}")
+                    if intento < LOTE_REINTENTOS_CHUNK and router.candidatos("lote"):
+                        espera = REINTENTO_BASE_DELAY * (2 ** intento)
+                        pendientes.append((time.monotonic() + espera, i, chunk, intento + 1))
+                    else:
+                        yield _error_chunk(i, chunk, str(e))
+                    continue
+
+                for r in resultados:
+                    cache_respuestas.guardar(claves[r["id_fila"]], r["datos_actualizados"])
+
+                ids_resueltos = {r["id_fila"] for r in resultados}
+                yield {
+                    "chunk": i,
+                    "total_chunks": total_chunks,
+                    "resultados": resultados,
+                    "errores": [
+                        {"id_fila": f["id_fila"], "mensaje": "La IA no devolvió esta fila"}
+                        for f in chunk if f["id_fila"] not in ids_resueltos
+                    ]
+                }
+    finally:
+        # Al cancelar o cerrar el generador: los chunks sin empezar se descartan y no se espera a los que corren
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def procesar_lote_inteligente(filas, comando_usuario, usar_cache: bool = True):
+    resultados_por_fila = {}
+    errores = []
+
+    for parcial in iterar_lote_inteligente(filas, comando_usuario, usar_cache):
+        # Unimos por id_fila (si la IA repite una fila, se combinan sus campos)
+        for r in parcial["resultados"]:
+            previo = resultados_por_fila.setdefault(r["id_fila"], {"id_fila": r["id_fila"], "datos_actualizados": {}})
+            previo["datos_actualizados"].update(r["datos_actualizados"])
+        errores.extend(parcial["errores"])
+
+    if errores and not resultados_por_fila:
         print("\n=== ERROR LEYENDO A GEMINI (LOTE MASIVO) ===")
-        print(f"Detalle: {str(e)}")
+        print(f"Detalle: {errores[0]['mensaje']}")
         print("============================================\n")
-        
-        return {"error": f"La IA falló o la cuota se agotó: {str(e)}"}
+        return {"error": f"La IA falló o la cuota se agotó: {errores[0]['mensaje']}", "errores": errores}
 
-def verificar_estado_api() -> dict:
+    return {
+        "resultados": [resultados_por_fila[k] for k in sorted(resultados_por_fila)],
+        "errores": errores
+    }
+
+def _sondear_api() -> dict:
+    """Sonda activa: una generación mínima con el modelo más barato que esté sano"""
+    candidatos = router.candidatos("fila")
+    if not candidatos:
+        return {"estado": "CUOTA_AGOTADA" if router.todos_sin_cuota() else "ERROR", "momento": time.time()}
     try:
-        model = crear_modelo(MODELOS_DISPONIBLES[0])
-        model.generate_content("Hello")
-        return {
-            "estado": "OK",
-            "mensaje": "API funcionando correctamente",
-            "modelo_principal": MODELOS_DISPONIBLES[0]
-        }
-    except google_exceptions.ResourceExhausted:
-        return {
-            "estado": "CUOTA_AGOTADA",
-            "mensaje": "Has exceeded your daily quota.",
-            "modelo_principal": MODELOS_DISPONIBLES[0],
-            "modelos_alternativos": MODELOS_DISPONIBLES[1:]
-        }
+        generar_con_reintentos("ping", modelo_nombre=candidatos[0])
+        return {"estado": "OK", "momento": time.time()}
     except Exception as e:
-        return {
-            "estado": "ERROR",
-            "mensaje": str(e),
-            "modelo_principal": MODELOS_DISPONIBLES[0]
-        }
+        estado = "CUOTA_AGOTADA" if "cuota" in str(e).lower() else "ERROR"
+        return {"estado": estado, "mensaje": str(e)[:300], "momento": time.time()}
+
+def verificar_estado_api() -> dict:
+    """
+    Estado pasivo: se calcula con el resultado de las llamadas reales que registra el router.
+    Solo si no hubo tráfico reciente se lanza una sonda activa, como mucho una cada ESTADO_SONDA_MINUTOS.
+    """
+    global _ultima_sonda
+
+    resumen = router.resumen_reciente()
+    estado_router = router.estado()
+    candidatos = router.candidatos("general")
+    modelo_principal = candidatos[0] if candidatos else MODELOS_DISPONIBLES[0]
+
+    if router.todos_sin_cuota():
+        estado, origen = "CUOTA_AGOTADA", "trafico"
+    elif resumen["llamadas"] > 0:
+        # Si en la ventana no hubo ningún éxito y lo último fue un fallo, la API no está respondiendo
+        estado = "OK" if resumen["exitos"] > 0 or resumen["ultimo_resultado_ok"] else "ERROR"
+        origen = "trafico"
+    elif ESTADO_SONDA_MINUTOS > 0:
+        with _lock_sonda:
+            if _ultima_sonda is None or time.time() - _ultima_sonda["momento"] > ESTADO_SONDA_MINUTOS * 60:
+                _ultima_sonda = _sondear_api()
+            sonda = _ultima_sonda
+        estado, origen = sonda["estado"], "sonda"
+    else:
+        estado, origen = "OK", "sin_datos"
+
+    respuesta = {
+        "estado": estado,
+        "origen": origen,
+        "mensaje": "API funcionando correctamente" if estado == "OK" else "La API no está respondiendo bien",
+        "modelo_principal": modelo_principal,
+        "modelos_alternativos": candidatos[1:],
+        "llamadas_recientes": resumen,
+        "modelos": estado_router["modelos"]
+    }
+    if estado == "CUOTA_AGOTADA":
+        respuesta["mensaje"] = "Has exceeded your daily quota."
+    return respuesta
@@ -1,8 +1,66 @@
 from ddgs import DDGS
-import time
-import random
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cache_service import CacheSQLite
+from executor_service import VueloUnico, LimitadorTasa
 
-def buscar_imagen(termino_busqueda: str) -> list:
+MAX_IMAGENES = 4
+ENFRIAMIENTO_403_SEG = 10
+
+# Ritmo global de consultas a DuckDuckGo (token bucket en lugar de pausas aleatorias)
+limitador_ddg = LimitadorTasa(
+    tasa_por_seg=float(os.getenv("DDG_CONSULTAS_POR_SEG", "1.0")),
+    capacidad=int(os.getenv("DDG_RAFAGA", "3"))
+)
+
+# Las estrategias de una búsqueda corren en paralelo en este pool
+_pool_estrategias = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DDG_ESTRATEGIAS_PARALELAS", "4")),
+    thread_name_prefix="ddg"
+)
+
+# Fábrica del cliente de búsqueda: se puede reemplazar por un backend falso con el mismo método images()
+crear_cliente_ddgs = DDGS
+_clientes = threading.local()
+
+# Caché persistente de búsquedas: término normalizado -> lista de URLs candidatas
+cache_busquedas = CacheSQLite(
+    "busquedas_imagenes",
+    ttl_segundos=float(os.getenv("CACHE_BUSQUEDA_TTL_HORAS", "168")) * 3600,
+    max_entradas=int(os.getenv("CACHE_BUSQUEDA_MAX_ENTRADAS", "50000"))
+)
+
+# Búsquedas idénticas simultáneas comparten una sola consulta a la red
+_vuelo_busquedas = VueloUnico()
+
+def normalizar_termino(termino_busqueda: str) -> str:
+    texto = termino_busqueda.replace('"', '').replace("'", "").replace("(", "").replace(")", "").replace("[", "").replace("]", "").replace("-", " ")
+    return " ".join(texto.lower().split())
+
+def buscar_imagen(termino_busqueda: str, usar_cache: bool = True) -> list:
+    """
+    Devuelve hasta 4 URLs de imágenes para el término.
+    Primero mira la caché; si no está, una sola búsqueda en red por término aunque lleguen varias a la vez.
+    """
+    clave = normalizar_termino(termino_busqueda)
+    if not clave:
+        return []
+
+    if usar_cache:
+        en_cache = cache_busquedas.obtener(clave)
+        if en_cache:
+            print(f"⚡ Caché de búsqueda: {clave}")
+            return en_cache
+
+    links = _vuelo_busquedas.ejecutar(clave, _buscar_en_red, termino_busqueda)
+
+    # Solo guardamos búsquedas con resultados para que un fallo temporal se pueda reintentar
+    if links:
+        cache_busquedas.guardar(clave, links)
+    return links
+
+def _buscar_en_red(termino_busqueda: str) -> list:
     """
     Buscador Híbrido: Combina la potencia de DuckDuckGo con filtros de 
     Google para obtener imágenes de catálogos específicos.
@@ -19,59 +77,91 @@ def buscar_imagen(termino_busqueda: str) -> list:
     texto_base = termino_busqueda.replace('"', '').replace("'", "").replace("(", "").replace(")", "").replace("[", "").replace("]", "").replace("-", " ")
     palabras = texto_base.split()
     
-    links_encontrados = []
-    
     # === ESTRATEGIA DE BÚSQUEDA HÍBRIDA ===
     # El primer intento usa los sitios sugeridos. 
     # El segundo simula una búsqueda de 'Producto + Catálogo' que es donde Google brilla.
+    # Todas corren a la vez; la prioridad es su posición en esta lista.
     intentos = [
         f"{' '.join(palabras)} {sitios_sugeridos}",           # 1. Específico en fuentes sugeridas
         f"{' '.join(palabras[:6])} product gallery",           # 2. Búsqueda de galería profesional
         " ".join(palabras),                                   # 3. Búsqueda abierta
         " ".join(palabras[:4])                                # 4. Búsqueda simplificada
     ]
-    
+    # Sin consultas vacías ni repetidas (con pocas palabras la 3 y la 4 coinciden)
+    consultas = []
     for query in intentos:
-        if not query or len(query) < 3:
-            continue
-        
-        print(f"🔍 Buscando en red: {query}")
-        
-        try:
-            # Pausa aleatoria para parecer un humano usando Google/DDG
-            time.sleep(random.uniform(1.0, 2.5)) 
-            
-            with DDGS() as ddgs:
-                # Solicitamos resultados globales
-                resultados = ddgs.images(
-                    query,
-                    region="wt-wt", 
-                    safesearch="off",
-                    max_results=20 # Aumentamos el buffer para filtrar calidad
-                )
-                
-                if resultados:
-                    for r in resultados:
-                        url = r.get("image")
-                        if url and url.startswith("http"):
-                            # Filtro de extensiones para asegurar que Google nos da archivos reales
-                            if any(ext in url.lower() for ext in [".jpg", ".jpeg", ".png", ".webp"]):
-                                links_encontrados.append(url)
-                        
-                        if len(links_encontrados) >= 4:
-                            break
-            
-            if links_encontrados:
-                print(f"✅ ¡Éxito! Encontradas {len(links_encontrados)} imágenes.")
-                return links_encontrados 
-            else:
-                print(f"⚠️ Sin resultados para: {query}. Reintentando nivel...")
-                
-        except Exception as e:
-            print(f"❌ Error en búsqueda: {e}")
-            if "403" in str(e):
-                print("🛑 Bloqueo detectado. Esperando enfriamiento...")
-                time.sleep(10)
+        if query and len(query) >= 3 and query not in consultas:
+            consultas.append(query)
+
+    futuros = {_pool_estrategias.submit(_ejecutar_estrategia, query): prioridad for prioridad, query in enumerate(consultas)}
+    resultados_por_prioridad = {}
+
+    for futuro in as_completed(futuros):
+        resultados_por_prioridad[futuros[futuro]] = futuro.result()
+
+        # Si las estrategias de mayor prioridad ya terminaron y juntan suficientes imágenes,
+        # respondemos sin esperar a las de menor prioridad
+        links = _combinar_por_prioridad(resultados_por_prioridad, len(consultas), solo_consecutivas=True)
+        if len(links) >= MAX_IMAGENES:
+            for f in futuros:
+                f.cancel()
+            print(f"✅ ¡Éxito! Encontradas {len(links)} imágenes.")
+            return links
+
+    links = _combinar_por_prioridad(resultados_por_prioridad, len(consultas), solo_consecutivas=False)
+    if links:
+        print(f"✅ ¡Éxito! Encontradas {len(links)} imágenes.")
+    else:
+        print(f"⚠️ Sin resultados para: {termino_busqueda}")
+    return links
+
+def _combinar_por_prioridad(resultados_por_prioridad: dict, total: int, solo_consecutivas: bool) -> list:
+    """Une los resultados en orden de prioridad sin repetir URLs (hasta MAX_IMAGENES)"""
+    links = []
+    for prioridad in range(total):
+        if prioridad not in resultados_por_prioridad:
+            if solo_consecutivas:
+                break
             continue
+        for url in resultados_por_prioridad[prioridad]:
+            if url not in links:
+                links.append(url)
+            if len(links) >= MAX_IMAGENES:
+                return links
+    return links
+
+def _cliente_ddgs():
+    """Un cliente DDGS por hilo del pool, reutilizado entre búsquedas"""
+    if not hasattr(_clientes, "ddgs"):
+        _clientes.ddgs = crear_cliente_ddgs()
+    return _clientes.ddgs
+
+def _ejecutar_estrategia(query: str) -> list:
+    print(f"🔍 Buscando en red: {query}")
+    limitador_ddg.adquirir()
+
+    try:
+        # Solicitamos resultados globales
+        resultados = _cliente_ddgs().images(
+            query,
+            region="wt-wt", 
+            safesearch="off",
+            max_results=20 # Aumentamos el buffer para filtrar calidad
+        )
+    except Exception as e:
+        print(f"❌ Error en búsqueda: {e}")
+        if "403" in str(e):
+            print("🛑 Bloqueo detectado. Pausando todas las búsquedas...")
+            limitador_ddg.penalizar(ENFRIAMIENTO_403_SEG)
+        return []
 
-    return []
\ No newline at end of file
+    links = []
+    for r in resultados or []:
+        url = r.get("image")
+        if url and url.startswith("http"):
+            # Filtro de extensiones para asegurar que nos dan archivos reales
+            if any(ext in url.lower() for ext in [".jpg", ".jpeg", ".png", ".webp"]):
+                links.append(url)
+        if len(links) >= MAX_IMAGENES:
+            break
+    return links
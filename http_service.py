@@ -0,0 +1,191 @@
+import os
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración de las descargas salientes (todo se puede ajustar desde el .env)
+HTTP_TIMEOUT_CONEXION = float(os.getenv("HTTP_TIMEOUT_CONEXION", "3.05"))
+HTTP_TIMEOUT_LECTURA = float(os.getenv("HTTP_TIMEOUT_LECTURA", "10"))
+HTTP_MAX_CONEXIONES_POR_HOST = int(os.getenv("HTTP_MAX_CONEXIONES_POR_HOST", "8"))
+HTTP_MAX_HOSTS = int(os.getenv("HTTP_MAX_HOSTS", "32"))
+HTTP_REINTENTOS = int(os.getenv("HTTP_REINTENTOS", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_MAX_BYTES = int(float(os.getenv("HTTP_MAX_MB", "15")) * 1024 * 1024)
+TAMANO_BLOQUE = 64 * 1024
+# Hasta cuántos bytes se reintenta validar la cabecera bloque a bloque (después se valida al final)
+MAX_BYTES_VALIDACION = 1024 * 1024
+
+# Varias tiendas rechazan el User-Agent por defecto de requests
+CABECERAS_BASE = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+}
+
+
+class TamanoExcedido(Exception):
+    pass
+
+
+def crear_sesion() -> requests.Session:
+    """
+    Sesión con keep-alive y un pool de conexiones por host.
+    pool_block=True hace que HTTP_MAX_CONEXIONES_POR_HOST sea un límite real (los hilos esperan turno).
+    """
+    reintentos = Retry(
+        total=HTTP_REINTENTOS,
+        connect=HTTP_REINTENTOS,
+        read=HTTP_REINTENTOS,
+        status=HTTP_REINTENTOS,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        backoff_factor=HTTP_BACKOFF,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adaptador = HTTPAdapter(
+        pool_connections=HTTP_MAX_HOSTS,
+        pool_maxsize=HTTP_MAX_CONEXIONES_POR_HOST,
+        pool_block=True,
+        max_retries=reintentos
+    )
+
+    sesion = requests.Session()
+    sesion.headers.update(CABECERAS_BASE)
+    sesion.mount("http://", adaptador)
+    sesion.mount("https://", adaptador)
+    return sesion
+
+
+# Sesión compartida por todo el servicio de imágenes
+sesion = crear_sesion()
+
+_lock_stats = threading.Lock()
+_stats_por_host = {}
+
+
+def _registrar(host: str, bytes_leidos: int, error: bool):
+    with _lock_stats:
+        stats = _stats_por_host.setdefault(host, {"peticiones": 0, "errores": 0, "bytes": 0})
+        stats["peticiones"] += 1
+        stats["bytes"] += bytes_leidos
+        if error:
+            stats["errores"] += 1
+
+
+def descargar(url: str, max_bytes: int = HTTP_MAX_BYTES, validar_inicio=None) -> bytes:
+    """
+    GET con timeouts separados (conexión, lectura), reintentos con backoff
+    y tope de tamaño: se corta en cuanto la respuesta supera max_bytes.
+
+    validar_inicio(cabeceras, datos, completo) -> bool se llama con los primeros bloques
+    hasta que devuelve True; si lanza una excepción se aborta la descarga sin bajar el resto.
+    Con completo=True (ya no hay más datos) debe validar o lanzar.
+    """
+    return _descargar(url, max_bytes, validar_inicio)["contenido"]
+
+
+def descargar_condicional(url: str, etag=None, last_modified=None, max_bytes: int = HTTP_MAX_BYTES, validar_inicio=None) -> dict:
+    """
+    Igual que descargar(), pero manda If-None-Match / If-Modified-Since.
+    Devuelve {"no_modificado", "contenido", "etag", "last_modified"}; con 304 contenido es None.
+    """
+    cabeceras = {}
+    if etag:
+        cabeceras["If-None-Match"] = etag
+    if last_modified:
+        cabeceras["If-Modified-Since"] = last_modified
+    return _descargar(url, max_bytes, validar_inicio, cabeceras)
+
+
+def _descargar(url: str, max_bytes: int, validar_inicio, cabeceras=None) -> dict:
+    host = urlsplit(url).hostname or ""
+    leidos = 0
+    try:
+        with sesion.get(url, stream=True, headers=cabeceras, timeout=(HTTP_TIMEOUT_CONEXION, HTTP_TIMEOUT_LECTURA)) as response:
+            if response.status_code == 304:
+                _registrar(host, 0, error=False)
+                return {
+                    "no_modificado": True,
+                    "contenido": None,
+                    "etag": response.headers.get("ETag") or (cabeceras or {}).get("If-None-Match"),
+                    "last_modified": response.headers.get("Last-Modified") or (cabeceras or {}).get("If-Modified-Since")
+                }
+
+            response.raise_for_status()
+
+            declarado = response.headers.get("Content-Length")
+            if declarado and declarado.isdigit() and int(declarado) > max_bytes:
+                raise TamanoExcedido(f"La respuesta pesa {int(declarado)} bytes (máximo {max_bytes})")
+
+            partes = []
+            validado = validar_inicio is None
+            for bloque in response.iter_content(TAMANO_BLOQUE):
+                leidos += len(bloque)
+                if leidos > max_bytes:
+                    raise TamanoExcedido(f"La respuesta supera el máximo de {max_bytes} bytes")
+                partes.append(bloque)
+
+                if not validado and leidos <= MAX_BYTES_VALIDACION:
+                    validado = validar_inicio(response.headers, b"".join(partes), False)
+
+            if not validado:
+                validar_inicio(response.headers, b"".join(partes), True)
+
+            resultado = {
+                "no_modificado": False,
+                "contenido": b"".join(partes),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }
+
+        _registrar(host, leidos, error=False)
+        return resultado
+
+    except Exception:
+        _registrar(host, leidos, error=True)
+        raise
+
+
+def estadisticas() -> dict:
+    """
+    Peticiones, bytes y reutilización de conexiones por host.
+    conexiones_nuevas/reutilizadas salen de los pools vivos de urllib3
+    (si un host sale del pool por LRU, sus contadores de conexión se reinician).
+    """
+    conexiones = {}
+    for adaptador in set(sesion.adapters.values()):
+        pools = adaptador.poolmanager.pools
+        for clave in pools.keys():
+            pool = pools.get(clave)
+            if pool is None:
+                continue
+            datos = conexiones.setdefault(pool.host, {"conexiones_nuevas": 0, "peticiones_pool": 0})
+            datos["conexiones_nuevas"] += pool.num_connections
+            datos["peticiones_pool"] += pool.num_requests
+
+    with _lock_stats:
+        hosts = {h: dict(s) for h, s in _stats_por_host.items()}
+
+    for host, datos in conexiones.items():
+        stats = hosts.setdefault(host, {"peticiones": 0, "errores": 0, "bytes": 0})
+        stats["conexiones_nuevas"] = datos["conexiones_nuevas"]
+        stats["conexiones_reutilizadas"] = max(datos["peticiones_pool"] - datos["conexiones_nuevas"], 0)
+
+    total_pool = sum(d["peticiones_pool"] for d in conexiones.values())
+    total_nuevas = sum(d["conexiones_nuevas"] for d in conexiones.values())
+    return {
+        "hosts": hosts,
+        "tasa_reutilizacion": round(1 - total_nuevas / total_pool, 3) if total_pool else None,
+        "config": {
+            "timeout_conexion": HTTP_TIMEOUT_CONEXION,
+            "timeout_lectura": HTTP_TIMEOUT_LECTURA,
+            "max_conexiones_por_host": HTTP_MAX_CONEXIONES_POR_HOST,
+            "reintentos": HTTP_REINTENTOS,
+            "max_bytes": HTTP_MAX_BYTES
+        }
+    }
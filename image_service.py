@@ -1,64 +1,294 @@
 import os
-import requests
+import hashlib
+import json
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from io import BytesIO
 from PIL import Image
+import http_service
+import render_imagenes
+from manifest_service import ManifestImagenes
+from executor_service import VueloUnico
 
 # Carpeta principal donde se guardarán las fotos
-BASE_IMG_DIR = "C:/MercadoLibre_Imagenes" 
+BASE_IMG_DIR = "C:/MercadoLibre_Imagenes"
 
-def procesar_imagen_estandar(url_imagen: str, sku: str, categoria: str, nombre_hoja: str) -> dict:
+# Lotes: descargas simultáneas (red) y procesos para el trabajo de PIL (CPU)
+IMAGENES_DESCARGAS_PARALELAS = int(os.getenv("IMAGENES_DESCARGAS_PARALELAS", "16"))
+IMAGENES_PROCESOS = int(os.getenv("IMAGENES_PROCESOS", str(os.cpu_count() or 2)))
+
+# Límites para rechazar archivos absurdos antes de bajarlos completos
+IMAGEN_MAX_BYTES = int(float(os.getenv("IMAGEN_MAX_MB", "15")) * 1024 * 1024)
+IMAGEN_MAX_LADO = int(os.getenv("IMAGEN_MAX_LADO", "12000"))
+IMAGEN_MAX_PIXELES = int(os.getenv("IMAGEN_MAX_PIXELES", "60000000"))
+
+# Manifest de imágenes procesadas: evita re-descargar y re-renderizar lo que no cambió
+# Si la URL se verificó hace menos de estas horas y el JPG sigue en disco, ni siquiera se consulta la red
+MANIFEST_REVALIDAR_HORAS = float(os.getenv("MANIFEST_REVALIDAR_HORAS", "24"))
+# Cambiar esta versión cuando cambie el código del render, para no reutilizar archivos viejos
+VERSION_RENDER = "render-v2"
+manifest = ManifestImagenes()
+_vuelo_render = VueloUnico()
+
+# Perfiles de salida: todos se generan desde una sola decodificación de la imagen original
+# resample: "calidad" (LANCZOS) o "rapido" (BILINEAR)
+PERFILES_RENDER = {
+    "ml": {
+        "lienzo": 500, "producto": 450, "formato": "JPEG", "sufijo": "", "extension": "jpg",
+        "resample": "calidad", "opciones": {"quality": 95}
+    },
+    "miniatura": {
+        "lienzo": 150, "producto": 140, "formato": "JPEG", "sufijo": "_thumb", "extension": "jpg",
+        "resample": "rapido", "opciones": {"quality": 85, "optimize": True}
+    },
+    "webp": {
+        "lienzo": 500, "producto": 450, "formato": "WEBP", "sufijo": "", "extension": "webp",
+        "resample": "calidad", "opciones": {"quality": 85, "method": 4}
+    },
+}
+PERFILES_POR_DEFECTO = [p.strip() for p in os.getenv("IMAGEN_PERFILES", "ml").split(",") if p.strip()]
+
+_pool_procesos = None
+_lock_pool = threading.Lock()
+
+
+def limpiar_nombre(texto):
+    # Limpiamos los nombres de caracteres que Windows no permite en carpetas (\ / : * ? " < > |)
+    return "".join(c for c in texto if c.isalnum() or c in " -_").strip()
+
+
+def construir_ruta(sku: str, categoria: str, nombre_hoja: str) -> str:
+    """Estructura: C:/MercadoLibre_Imagenes / NombreDeLaHoja / Categoria / SKU.jpg (crea las carpetas)"""
+    ruta_carpeta = os.path.join(BASE_IMG_DIR, limpiar_nombre(nombre_hoja), limpiar_nombre(categoria))
+    os.makedirs(ruta_carpeta, exist_ok=True)
+    return os.path.join(ruta_carpeta, f"{limpiar_nombre(sku)}.jpg")
+
+
+def validar_perfiles(perfiles) -> list:
+    perfiles = list(perfiles or PERFILES_POR_DEFECTO)
+    desconocidos = [p for p in perfiles if p not in PERFILES_RENDER]
+    if desconocidos:
+        raise ValueError(f"Perfiles de imagen desconocidos: {desconocidos}. Disponibles: {list(PERFILES_RENDER)}")
+    return perfiles
+
+
+def construir_rutas_perfiles(ruta_base: str, perfiles: list) -> dict:
+    """perfil -> ruta final. 'ml' conserva SKU.jpg; el resto usa su sufijo y extensión"""
+    raiz, _ = os.path.splitext(ruta_base)
+    return {p: f"{raiz}{PERFILES_RENDER[p]['sufijo']}.{PERFILES_RENDER[p]['extension']}" for p in perfiles}
+
+
+def clave_render(hash_contenido: str, perfil: str) -> str:
+    """Cambia si cambia el contenido, la configuración del perfil o la versión del render"""
+    firma = hashlib.sha1(json.dumps(PERFILES_RENDER[perfil], sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return f"{hash_contenido}:{perfil}:{firma}:{VERSION_RENDER}"
+
+
+def validar_cabecera_imagen(cabeceras, datos: bytes, completo: bool) -> bool:
     """
-    Descarga, redimensiona a 500x500 con fondo blanco y guarda la imagen
-    en una estructura de carpetas: BASE / NOMBRE_HOJA / CATEGORIA / SKU.jpg
+    Revisa el inicio de la descarga: tipo de contenido y dimensiones (PIL solo lee la cabecera).
+    Devuelve False si todavía no alcanzan los bytes para decidir.
     """
+    tipo = cabeceras.get("Content-Type", "").split(";")[0].strip().lower()
+    if tipo.startswith("text/") or tipo in ("application/json", "application/xml"):
+        raise ValueError(f"La URL no devolvió una imagen (Content-Type: {tipo})")
+
+    try:
+        with Image.open(BytesIO(datos)) as img:
+            ancho, alto = img.size
+    except Exception:
+        if completo:
+            raise ValueError("El archivo descargado no es una imagen válida")
+        return False
+
+    if ancho > IMAGEN_MAX_LADO or alto > IMAGEN_MAX_LADO or ancho * alto > IMAGEN_MAX_PIXELES:
+        raise ValueError(f"Dimensiones fuera de rango: {ancho}x{alto}")
+    return True
+
+
+def descargar_imagen(url_imagen: str) -> bytes:
+    # Sesión compartida: keep-alive, límite por host, reintentos y tope de tamaño.
+    # La cabecera se valida en cuanto llega, sin esperar el archivo completo.
+    return http_service.descargar(url_imagen, max_bytes=IMAGEN_MAX_BYTES, validar_inicio=validar_cabecera_imagen)
+
+
+def renderizar_perfiles(contenido: bytes, salidas: dict) -> dict:
+    """Decodifica la imagen una sola vez y genera cada perfil pedido ({perfil: ruta})"""
+    return render_imagenes.renderizar_perfiles(contenido, salidas, _config_perfiles(salidas))
+
+
+def _config_perfiles(salidas: dict) -> dict:
+    return {p: PERFILES_RENDER[p] for p in salidas}
+
+
+def renderizar_estandar(contenido: bytes, ruta_archivo: str) -> str:
+    """Render clásico de Mercado Libre: 500x500 fondo blanco, JPEG calidad 95"""
+    return renderizar_perfiles(contenido, {"ml": ruta_archivo})["ml"]
+
+
+def _enlazar_o_copiar(origen: str, destino: str):
+    """Hard link si el sistema lo permite (no ocupa espacio extra); si no, copia"""
+    ruta_temporal = destino + ".tmp"
+    if os.path.exists(ruta_temporal):
+        os.remove(ruta_temporal)
     try:
-        # 1. Descargar la imagen
-        response = requests.get(url_imagen, timeout=10)
-        response.raise_for_status()
-        
-        # 2. Procesamiento de imagen con PIL
-        img_original = Image.open(BytesIO(response.content)).convert("RGBA")
+        os.link(origen, ruta_temporal)
+    except OSError:
+        shutil.copyfile(origen, ruta_temporal)
+    os.replace(ruta_temporal, destino)
+
+
+def obtener_imagen(url_imagen: str, ruta_base: str, perfiles: list = None, renderizar=renderizar_perfiles) -> dict:
+    """
+    Deja en disco cada perfil pedido de url_imagen haciendo el mínimo trabajo posible.
+    Devuelve {perfil: {"ruta", "accion"}} donde accion es:
+    - "sin_cambios": el archivo ya tiene este mismo render (por hash) y la fuente no cambió
+    - "enlazada": otro SKU ya tenía el mismo render; se enlaza o copia
+    - "renderizada": se generó de nuevo (todos los perfiles faltantes salen de una sola decodificación)
+    renderizar(contenido, {perfil: ruta}) permite mandar el trabajo de PIL a otro proceso.
+    """
+    perfiles = validar_perfiles(perfiles)
+    rutas = construir_rutas_perfiles(ruta_base, perfiles)
+    fuente = manifest.fuente(url_imagen)
 
-        # Crear lienzo blanco de 500x500
-        lienzo_blanco = Image.new("RGBA", (500, 500), (255, 255, 255, 255))
+    def al_dia(perfil, hash_contenido):
+        ruta = rutas[perfil]
+        return manifest.clave_salida(ruta) == clave_render(hash_contenido, perfil) and os.path.exists(ruta)
 
-        # Redimensionar producto a 450x450 (mantiene proporciones y deja margen)
-        img_original.thumbnail((450, 450), Image.Resampling.LANCZOS)
+    def resultado(acciones):
+        return {p: {"ruta": rutas[p], "accion": acciones[p]} for p in perfiles}
 
-        # Calcular el centro para pegar la imagen
-        x = (500 - img_original.width) // 2
-        y = (500 - img_original.height) // 2
+    # 1. Fuente verificada hace poco y archivos intactos: cero red, cero PIL
+    if fuente and time.time() - fuente["verificado"] < MANIFEST_REVALIDAR_HORAS * 3600:
+        if all(al_dia(p, fuente["hash_contenido"]) for p in perfiles):
+            return resultado({p: "sin_cambios" for p in perfiles})
 
-        # Pegar la imagen en el lienzo blanco
-        lienzo_blanco.paste(img_original, (x, y), img_original)
+    # 2. Descarga condicional (ETag / Last-Modified)
+    descarga = http_service.descargar_condicional(
+        url_imagen,
+        etag=fuente["etag"] if fuente else None,
+        last_modified=fuente["last_modified"] if fuente else None,
+        max_bytes=IMAGEN_MAX_BYTES,
+        validar_inicio=validar_cabecera_imagen
+    )
 
-        # Convertir a RGB (necesario para guardar como JPEG)
-        imagen_final = lienzo_blanco.convert("RGB")
+    contenido = descarga["contenido"]
+    if descarga["no_modificado"]:
+        hash_contenido = fuente["hash_contenido"]
+        manifest.marcar_verificada(url_imagen)
+    else:
+        hash_contenido = hashlib.sha256(contenido).hexdigest()
+        manifest.guardar_fuente(url_imagen, descarga["etag"], descarga["last_modified"], hash_contenido)
 
-        # 3. Gestión de Carpetas Dinámicas
-        # Limpiamos los nombres de caracteres que Windows no permite en carpetas (\ / : * ? " < > |)
-        def limpiar_nombre(texto):
-            return "".join(c for c in texto if c.isalnum() or c in " -_").strip()
+    # 3. Perfiles que ya tienen el render correcto
+    acciones = {p: "sin_cambios" for p in perfiles if al_dia(p, hash_contenido)}
+    faltantes = [p for p in perfiles if p not in acciones]
+    if not faltantes:
+        return resultado(acciones)
 
-        hoja_limpia = limpiar_nombre(nombre_hoja)
-        categoria_limpia = limpiar_nombre(categoria)
-        sku_limpio = limpiar_nombre(sku)
+    def renderizar_una_vez():
+        # 4. Mismo contenido ya renderizado para otro SKU / hoja: se reutiliza
+        origenes = {}
+        por_renderizar = {}
+        for p in faltantes:
+            otra_ruta = manifest.buscar_salida(clave_render(hash_contenido, p), excluir_ruta=rutas[p])
+            if otra_ruta:
+                origenes[p] = otra_ruta
+            else:
+                por_renderizar[p] = rutas[p]
 
-        # Estructura: C:/MercadoLibre_Imagenes / NombreDeLaHoja / Categoria
-        ruta_carpeta = os.path.join(BASE_IMG_DIR, hoja_limpia, categoria_limpia)
-        
-        # Crear la ruta si no existe (incluyendo carpetas padres)
-        os.makedirs(ruta_carpeta, exist_ok=True)
+        # 5. Lo que falta se renderiza (si fue 304 pero no queda ningún render en disco, se baja completa)
+        if por_renderizar:
+            datos = contenido if contenido is not None else descargar_imagen(url_imagen)
+            renderizar(datos, por_renderizar)
+            for p, ruta in por_renderizar.items():
+                manifest.guardar_salida(ruta, clave_render(hash_contenido, p), url_imagen)
+                origenes[p] = ruta
+        return origenes
 
-        # Ruta final del archivo
-        ruta_archivo = os.path.join(ruta_carpeta, f"{sku_limpio}.jpg")
-        
-        # 4. Guardar imagen
-        imagen_final.save(ruta_archivo, "JPEG", quality=95)
+    # Si el mismo contenido llega a la vez para varios SKUs del lote, solo uno lo renderiza
+    clave_vuelo = f"{hash_contenido}:{','.join(sorted(faltantes))}"
+    origenes = _vuelo_render.ejecutar(clave_vuelo, renderizar_una_vez)
+
+    for p in faltantes:
+        if origenes[p] == rutas[p]:
+            acciones[p] = "renderizada"
+        else:
+            _enlazar_o_copiar(origenes[p], rutas[p])
+            manifest.guardar_salida(rutas[p], clave_render(hash_contenido, p), url_imagen)
+            acciones[p] = "enlazada"
+    return resultado(acciones)
+
+
+def procesar_imagen_estandar(url_imagen: str, sku: str, categoria: str, nombre_hoja: str, perfiles: list = None) -> dict:
+    """
+    Descarga, redimensiona a 500x500 con fondo blanco y guarda la imagen
+    en una estructura de carpetas: BASE / NOMBRE_HOJA / CATEGORIA / SKU.jpg
+    (más las variantes de los perfiles pedidos: miniatura, webp...)
+    """
+    try:
+        salidas = obtener_imagen(url_imagen, construir_ruta(sku, categoria, nombre_hoja), perfiles)
+        ruta_principal = next(iter(salidas.values()))["ruta"]
 
-        print(f"✅ Imagen guardada en: {ruta_archivo}")
-        return {"estado": "OK", "ruta": ruta_archivo}
+        acciones = ", ".join(f"{perfil}: {salida['accion']}" for perfil, salida in salidas.items())
+        print(f"✅ Imagen guardada en: {ruta_principal} ({acciones})")
+        return {"estado": "OK", "ruta": ruta_principal, "salidas": salidas}
 
     except Exception as e:
         print(f"❌ Error procesando imagen: {str(e)}")
-        return {"estado": "ERROR", "mensaje": str(e)}
\ No newline at end of file
+        return {"estado": "ERROR", "mensaje": str(e)}
+
+
+# ==========================================
+# LOTES DE IMÁGENES (muchos SKUs en paralelo)
+# ==========================================
+
+def _obtener_pool_procesos() -> ProcessPoolExecutor:
+    global _pool_procesos
+    with _lock_pool:
+        if _pool_procesos is None:
+            _pool_procesos = ProcessPoolExecutor(max_workers=IMAGENES_PROCESOS)
+        return _pool_procesos
+
+
+def _renderizar_en_proceso(contenido: bytes, salidas: dict) -> dict:
+    # Al proceso solo viajan los bytes, las rutas y la configuración de los perfiles;
+    # render_imagenes no importa este servicio (ni el manifest, ni la sesión HTTP).
+    # Con spawn el proceso también ejecuta el script principal: arrancar con servidor.py, no con main.py
+    return _obtener_pool_procesos().submit(
+        render_imagenes.renderizar_perfiles, contenido, salidas, _config_perfiles(salidas)
+    ).result()
+
+
+def _procesar_item_lote(item: dict) -> dict:
+    """Descarga en este hilo y, si hace falta renderizar, manda el trabajo de PIL a un proceso del pool"""
+    try:
+        ruta = construir_ruta(item["sku"], item["categoria"], item["nombre_hoja"])
+        salidas = obtener_imagen(item["url_imagen"], ruta, item.get("perfiles"), renderizar=_renderizar_en_proceso)
+        return {"sku": item["sku"], "estado": "OK", "ruta": next(iter(salidas.values()))["ruta"], "salidas": salidas}
+    except Exception as e:
+        return {"sku": item["sku"], "estado": "ERROR", "mensaje": str(e)}
+
+
+def procesar_lote_imagenes(items: list, al_terminar_item=None, cancelado=None) -> list:
+    """
+    Procesa una lista de {url_imagen, sku, categoria, nombre_hoja, perfiles (opcional)}.
+    Devuelve un resultado por item en el mismo orden; al_terminar_item(indice, resultado) informa el avance.
+    Si cancelado() devuelve True se descartan los items que todavía no empezaron (quedan en None).
+    """
+    resultados = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=min(IMAGENES_DESCARGAS_PARALELAS, max(len(items), 1))) as pool:
+        futuros = {pool.submit(_procesar_item_lote, item): i for i, item in enumerate(items)}
+        for futuro in as_completed(futuros):
+            if futuro.cancelled():
+                continue
+            i = futuros[futuro]
+            resultados[i] = futuro.result()
+            if al_terminar_item:
+                al_terminar_item(i, resultados[i])
+            if cancelado and cancelado():
+                for pendiente in futuros:
+                    pendiente.cancel()
+    return resultados
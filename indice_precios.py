@@ -0,0 +1,178 @@
+import math
+import os
+import pickle
+import sys
+from array import array
+
+VERSION_INDICE = 2
+
+
+class IndicePrecios:
+    """
+    Catálogo consolidado de los proveedores guardado por columnas:
+    - skus: lista de SKUs (internados) y un dict SKU -> posición para buscar en O(1)
+    - precios: array('d') con NaN si el SKU no tiene precio numérico
+    - hojas: array('H') con el id de la hoja de origen (los nombres de hoja se guardan una sola vez)
+    - nombres: un nombre por SKU ("" si no tiene) y un dict nombre -> posición para la vinculación
+    Reemplaza a mapa_precios / mapa_nombres / lista_nombres_master (tres dicts y una tupla por producto).
+    lecturas guarda (opcional) lo leído de cada hoja con su huella, para la corrida incremental.
+    """
+
+    def __init__(self):
+        self._posicion = {}
+        self.skus = []
+        self.precios = array("d")
+        self.hojas = array("H")
+        self.nombres = []
+        self.nombres_hoja = []
+        self._id_hoja = {}
+        self._por_nombre = {}
+        self._con_precio = 0
+        self.lecturas = {}
+        self.metadatos = {}
+
+    def _id(self, nombre_hoja: str) -> int:
+        id_hoja = self._id_hoja.get(nombre_hoja)
+        if id_hoja is None:
+            id_hoja = self._id_hoja[nombre_hoja] = len(self.nombres_hoja)
+            self.nombres_hoja.append(nombre_hoja)
+        return id_hoja
+
+    def agregar_hoja(self, nombre_hoja: str, skus: list, precios: array, nombres: list):
+        """
+        Fusiona una hoja leída (columnas paralelas). Si un SKU ya estaba, gana esta hoja:
+        el precio solo se pisa si es numérico y el nombre solo si no está vacío.
+        """
+        id_hoja = self._id(nombre_hoja)
+        posicion = self._posicion
+        lista_skus, lista_precios, lista_hojas, lista_nombres = self.skus, self.precios, self.hojas, self.nombres
+        por_nombre = self._por_nombre
+
+        for sku, precio, nombre in zip(skus, precios, nombres):
+            pos = posicion.get(sku)
+            if pos is None:
+                pos = len(lista_skus)
+                sku = sys.intern(sku)
+                posicion[sku] = pos
+                lista_skus.append(sku)
+                lista_precios.append(math.nan)
+                lista_hojas.append(0)
+                lista_nombres.append("")
+            if nombre:
+                lista_nombres[pos] = nombre
+                por_nombre[nombre] = pos
+            if not math.isnan(precio):
+                if math.isnan(lista_precios[pos]):
+                    self._con_precio += 1
+                lista_precios[pos] = precio
+                lista_hojas[pos] = id_hoja
+
+    # --- Consultas por SKU ---
+
+    def __len__(self) -> int:
+        """Cantidad de productos con precio (lo que antes era len(mapa_precios))"""
+        return self._con_precio
+
+    def __contains__(self, sku) -> bool:
+        pos = self._posicion.get(sku)
+        return pos is not None and not math.isnan(self.precios[pos])
+
+    def get(self, sku, defecto=None):
+        """(precio, hoja) como en el viejo mapa_precios, o defecto si el SKU no tiene precio"""
+        pos = self._posicion.get(sku)
+        if pos is None:
+            return defecto
+        precio = self.precios[pos]
+        if math.isnan(precio):
+            return defecto
+        return precio, self.nombres_hoja[self.hojas[pos]]
+
+    def __getitem__(self, sku):
+        resultado = self.get(sku)
+        if resultado is None:
+            raise KeyError(sku)
+        return resultado
+
+    def precio(self, sku):
+        resultado = self.get(sku)
+        return resultado[0] if resultado else None
+
+    def hoja(self, sku):
+        resultado = self.get(sku)
+        return resultado[1] if resultado else None
+
+    def nombre(self, sku) -> str:
+        pos = self._posicion.get(sku)
+        return self.nombres[pos] if pos is not None else ""
+
+    def productos(self):
+        """Recorre (sku, precio, hoja, nombre) de los SKUs con precio, en orden de aparición"""
+        nombres_hoja = self.nombres_hoja
+        for sku, precio, id_hoja, nombre in zip(self.skus, self.precios, self.hojas, self.nombres):
+            if not math.isnan(precio):
+                yield sku, precio, nombres_hoja[id_hoja], nombre
+
+    def a_dict(self) -> dict:
+        """SKU -> (precio, hoja), el formato anterior (para comparar o exportar)"""
+        return {sku: (precio, hoja) for sku, precio, hoja, _ in self.productos()}
+
+    # --- Consultas por nombre ---
+
+    def nombres_catalogo(self) -> list:
+        """Nombres distintos de los proveedores (lo que antes eran las claves de lista_nombres_master)"""
+        return list(self._por_nombre)
+
+    def sku_por_nombre(self, nombre: str):
+        pos = self._por_nombre.get(nombre)
+        return self.skus[pos] if pos is not None else None
+
+    # --- Disco ---
+
+    def guardar(self, ruta: str):
+        """Escribe el índice con pickle (los arrays van como bytes); escritura atómica con un .tmp"""
+        datos = {
+            "version": VERSION_INDICE,
+            "skus": self.skus,
+            "precios": self.precios.tobytes(),
+            "hojas": self.hojas.tobytes(),
+            "nombres": self.nombres,
+            "nombres_hoja": self.nombres_hoja,
+            "por_nombre": (list(self._por_nombre), array("i", self._por_nombre.values()).tobytes()),
+            "lecturas": self.lecturas,
+            "metadatos": self.metadatos
+        }
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(carpeta, exist_ok=True)
+        tmp = f"{ruta}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(datos, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta: str):
+        """Lee un índice guardado con guardar(); None si no existe, está dañado o es de otra versión"""
+        try:
+            with open(ruta, "rb") as f:
+                datos = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Catálogo guardado ilegible ({e}); se vuelve a consolidar")
+            return None
+        if not isinstance(datos, dict) or datos.get("version") != VERSION_INDICE:
+            return None
+
+        indice = cls()
+        indice.skus = [sys.intern(s) for s in datos["skus"]]
+        indice._posicion = {sku: pos for pos, sku in enumerate(indice.skus)}
+        indice.precios.frombytes(datos["precios"])
+        indice.hojas.frombytes(datos["hojas"])
+        indice.nombres = datos["nombres"]
+        indice.nombres_hoja = datos["nombres_hoja"]
+        indice._id_hoja = {nombre: i for i, nombre in enumerate(indice.nombres_hoja)}
+        nombres, posiciones = datos["por_nombre"]
+        indice._por_nombre = dict(zip(nombres, array("i", posiciones)))
+        indice._con_precio = sum(1 for p in indice.precios if not math.isnan(p))
+        indice.lecturas = datos["lecturas"]
+        indice.metadatos = datos["metadatos"]
+        return indice
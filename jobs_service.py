@@ -0,0 +1,358 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from cache_service import CACHE_DIR
+import gemini_service
+import image_service
+from google_search_service import buscar_imagen
+
+load_dotenv()
+
+# Cuántos trabajos de cada cola corren a la vez (configurable desde el .env)
+# Cada trabajo ya paraleliza por dentro (chunks de Gemini, descargas de imágenes), por eso son pocos
+CONCURRENCIA_COLAS = {
+    "gemini": int(os.getenv("TRABAJOS_GEMINI_CONCURRENCIA", "2")),
+    "imagenes": int(os.getenv("TRABAJOS_IMAGENES_CONCURRENCIA", "2")),
+    "busqueda": int(os.getenv("TRABAJOS_BUSQUEDA_CONCURRENCIA", "1")),
+}
+# Los trabajos terminados se borran de la base pasado este tiempo
+TRABAJOS_RETENCION_HORAS = float(os.getenv("TRABAJOS_RETENCION_HORAS", "72"))
+
+EN_COLA = "EN_COLA"
+EN_PROCESO = "EN_PROCESO"
+COMPLETADO = "COMPLETADO"
+CANCELADO = "CANCELADO"
+ERROR = "ERROR"
+ESTADOS_FINALES = (COMPLETADO, CANCELADO, ERROR)
+
+
+class ContextoTrabajo:
+    """Lo que recibe cada función de trabajo para informar avance y resultados"""
+
+    def __init__(self, cola: "ColaTrabajos", id_trabajo: str):
+        self._cola = cola
+        self.id_trabajo = id_trabajo
+        # Se marca al pedir la cancelación: sirve para esperar sin consultar cancelado() en un bucle
+        self.evento_cancelar = threading.Event()
+
+    def cancelado(self) -> bool:
+        return self.id_trabajo in self._cola._cancelados
+
+    def resultados_ok(self) -> set:
+        """Índices que ya terminaron bien (al reanudar tras un reinicio se pueden saltar)"""
+        return self._cola._indices_ok(self.id_trabajo)
+
+    def guardar_resultado(self, indice: int, dato: dict, ok: bool = True):
+        self._cola._guardar_resultado(self.id_trabajo, indice, dato, ok)
+
+
+class ColaTrabajos:
+    """
+    Trabajos largos (lotes de Gemini, imágenes, búsquedas) que se lanzan y se consultan por id.
+    - El estado y los resultados parciales viven en SQLite: sobreviven a un reinicio del servidor.
+    - Al arrancar, los trabajos que quedaron EN_COLA / EN_PROCESO se vuelven a encolar y
+      se saltan los items que ya habían terminado bien.
+    - Cada tipo de trabajo corre en la cola (pool de hilos) que le corresponde.
+    """
+
+    def __init__(self, nombre: str = "trabajos"):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.ruta = os.path.join(CACHE_DIR, f"{nombre}.sqlite")
+        self._tipos = {}
+        self._pools = {}
+        self._cancelados = set()
+        self._en_proceso = {}  # id -> ContextoTrabajo de los trabajos que están corriendo
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                parametros TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                mensaje TEXT,
+                cancelar INTEGER NOT NULL DEFAULT 0,
+                creado REAL NOT NULL,
+                iniciado REAL,
+                terminado REAL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS resultados_trabajo (
+                id_trabajo TEXT NOT NULL,
+                indice INTEGER NOT NULL,
+                ok INTEGER NOT NULL,
+                dato TEXT NOT NULL,
+                PRIMARY KEY (id_trabajo, indice)
+            )
+        """)
+        self._conn.commit()
+
+    # --- Registro de tipos ---
+
+    def registrar_tipo(self, tipo: str, cola: str, funcion, contar_total):
+        """
+        funcion(parametros, contexto) hace el trabajo y va llamando a contexto.guardar_resultado().
+        contar_total(parametros) -> int es el total de items para calcular el progreso.
+        """
+        if cola not in CONCURRENCIA_COLAS:
+            raise ValueError(f"Cola desconocida: {cola}")
+        self._tipos[tipo] = {"cola": cola, "funcion": funcion, "contar_total": contar_total}
+
+    def _pool(self, cola: str) -> ThreadPoolExecutor:
+        with self._lock:
+            if cola not in self._pools:
+                self._pools[cola] = ThreadPoolExecutor(
+                    max_workers=CONCURRENCIA_COLAS[cola],
+                    thread_name_prefix=f"trabajos-{cola}"
+                )
+            return self._pools[cola]
+
+    # --- API pública ---
+
+    def enviar(self, tipo: str, parametros: dict) -> str:
+        if tipo not in self._tipos:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}. Disponibles: {list(self._tipos)}")
+
+        id_trabajo = uuid.uuid4().hex
+        total = self._tipos[tipo]["contar_total"](parametros)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO trabajos (id, tipo, estado, parametros, total, creado) VALUES (?, ?, ?, ?, ?, ?)",
+                (id_trabajo, tipo, EN_COLA, json.dumps(parametros, ensure_ascii=False), total, time.time())
+            )
+            self._conn.commit()
+
+        self._pool(self._tipos[tipo]["cola"]).submit(self._ejecutar, id_trabajo)
+        return id_trabajo
+
+    def consultar(self, id_trabajo: str):
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT id, tipo, estado, total, mensaje, creado, iniciado, terminado FROM trabajos WHERE id = ?",
+                (id_trabajo,)
+            ).fetchone()
+            if fila is None:
+                return None
+            hechos, errores = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(ok = 0), 0) FROM resultados_trabajo WHERE id_trabajo = ?", (id_trabajo,)
+            ).fetchone()
+
+        total = fila[3]
+        return {
+            "id_trabajo": fila[0],
+            "tipo": fila[1],
+            "estado": fila[2],
+            "total": total,
+            "completados": hechos,
+            "errores": errores,
+            "progreso": round(hechos / total, 3) if total else 1.0,
+            "mensaje": fila[4],
+            "creado": fila[5],
+            "iniciado": fila[6],
+            "terminado": fila[7]
+        }
+
+    def resultados(self, id_trabajo: str, desde: int = 0, limite: int = 500) -> list:
+        """Resultados guardados hasta ahora (también mientras el trabajo sigue en proceso), por índice"""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT indice, ok, dato FROM resultados_trabajo WHERE id_trabajo = ? AND indice >= ? ORDER BY indice LIMIT ?",
+                (id_trabajo, desde, limite)
+            ).fetchall()
+        return [{"indice": i, "ok": bool(ok), **json.loads(dato)} for i, ok, dato in filas]
+
+    def listar(self, estado: str = None, limite: int = 50) -> list:
+        consulta = "SELECT id FROM trabajos"
+        argumentos = []
+        if estado:
+            consulta += " WHERE estado = ?"
+            argumentos.append(estado)
+        consulta += " ORDER BY creado DESC LIMIT ?"
+        argumentos.append(limite)
+
+        with self._lock:
+            ids = [f[0] for f in self._conn.execute(consulta, argumentos).fetchall()]
+        return [self.consultar(i) for i in ids]
+
+    def cancelar(self, id_trabajo: str):
+        """Un trabajo en cola se cancela al instante; uno en proceso se detiene en su próximo item"""
+        trabajo = self.consultar(id_trabajo)
+        if trabajo is None or trabajo["estado"] in ESTADOS_FINALES:
+            return trabajo
+
+        self._cancelados.add(id_trabajo)
+        contexto = self._en_proceso.get(id_trabajo)
+        if contexto is not None:
+            contexto.evento_cancelar.set()
+        with self._lock:
+            self._conn.execute("UPDATE trabajos SET cancelar = 1 WHERE id = ?", (id_trabajo,))
+            self._conn.commit()
+        if trabajo["estado"] == EN_COLA:
+            self._actualizar(id_trabajo, CANCELADO, terminado=time.time(), solo_si=EN_COLA)
+        return self.consultar(id_trabajo)
+
+    def reanudar_pendientes(self):
+        """Al arrancar: vuelve a encolar lo que quedó a medias y borra los trabajos viejos"""
+        limite = time.time() - TRABAJOS_RETENCION_HORAS * 3600
+        with self._lock:
+            viejos = [f[0] for f in self._conn.execute(
+                f"SELECT id FROM trabajos WHERE estado IN ({','.join('?' * len(ESTADOS_FINALES))}) AND terminado < ?",
+                (*ESTADOS_FINALES, limite)
+            ).fetchall()]
+            for id_trabajo in viejos:
+                self._conn.execute("DELETE FROM resultados_trabajo WHERE id_trabajo = ?", (id_trabajo,))
+                self._conn.execute("DELETE FROM trabajos WHERE id = ?", (id_trabajo,))
+
+            # Los que pidieron cancelarse antes del reinicio no se reanudan
+            self._conn.execute(
+                "UPDATE trabajos SET estado = ?, terminado = ? WHERE estado IN (?, ?) AND cancelar = 1",
+                (CANCELADO, time.time(), EN_COLA, EN_PROCESO)
+            )
+            pendientes = self._conn.execute(
+                "SELECT id, tipo FROM trabajos WHERE estado IN (?, ?) ORDER BY creado", (EN_COLA, EN_PROCESO)
+            ).fetchall()
+            self._conn.execute("UPDATE trabajos SET estado = ? WHERE estado = ?", (EN_COLA, EN_PROCESO))
+            self._conn.commit()
+
+        for id_trabajo, tipo in pendientes:
+            if tipo not in self._tipos:
+                self._actualizar(id_trabajo, ERROR, mensaje=f"Tipo de trabajo desconocido: {tipo}", terminado=time.time())
+                continue
+            self._pool(self._tipos[tipo]["cola"]).submit(self._ejecutar, id_trabajo)
+
+        if pendientes:
+            print(f"Trabajos reanudados: {len(pendientes)}")
+
+    def cerrar(self):
+        """Los trabajos en proceso quedan EN_PROCESO en la base y se reanudan en el próximo arranque"""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Internos ---
+
+    def _actualizar(self, id_trabajo: str, estado: str, mensaje=None, iniciado=None, terminado=None, solo_si=None):
+        consulta = "UPDATE trabajos SET estado = ?, mensaje = COALESCE(?, mensaje), iniciado = COALESCE(?, iniciado), terminado = COALESCE(?, terminado) WHERE id = ?"
+        argumentos = [estado, mensaje, iniciado, terminado, id_trabajo]
+        if solo_si:
+            consulta += " AND estado = ?"
+            argumentos.append(solo_si)
+        with self._lock:
+            cambios = self._conn.execute(consulta, argumentos).rowcount
+            self._conn.commit()
+        return cambios > 0
+
+    def _indices_ok(self, id_trabajo: str) -> set:
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT indice FROM resultados_trabajo WHERE id_trabajo = ? AND ok = 1", (id_trabajo,)
+            ).fetchall()
+        return {f[0] for f in filas}
+
+    def _guardar_resultado(self, id_trabajo: str, indice: int, dato: dict, ok: bool):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resultados_trabajo (id_trabajo, indice, ok, dato) VALUES (?, ?, ?, ?)",
+                (id_trabajo, indice, int(ok), json.dumps(dato, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def _ejecutar(self, id_trabajo: str):
+        with self._lock:
+            fila = self._conn.execute("SELECT tipo, parametros FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+        if fila is None:
+            return
+
+        # Si se canceló mientras esperaba en la cola, no se arranca
+        if not self._actualizar(id_trabajo, EN_PROCESO, iniciado=time.time(), solo_si=EN_COLA):
+            self._cancelados.discard(id_trabajo)
+            return
+
+        tipo, parametros = fila[0], json.loads(fila[1])
+        contexto = ContextoTrabajo(self, id_trabajo)
+        self._en_proceso[id_trabajo] = contexto
+        if contexto.cancelado():
+            contexto.evento_cancelar.set()
+        try:
+            self._tipos[tipo]["funcion"](parametros, contexto)
+            estado_final = CANCELADO if contexto.cancelado() else COMPLETADO
+            self._actualizar(id_trabajo, estado_final, terminado=time.time())
+        except Exception as e:
+            print(f"❌ Error en trabajo {tipo} ({id_trabajo}): {e}")
+            self._actualizar(id_trabajo, ERROR, mensaje=str(e), terminado=time.time())
+        finally:
+            self._en_proceso.pop(id_trabajo, None)
+            self._cancelados.discard(id_trabajo)
+
+
+# ==========================================
+# TIPOS DE TRABAJO
+# ==========================================
+
+def _trabajo_lote_inteligente(parametros: dict, contexto: ContextoTrabajo):
+    """parametros: {"filas": [{"id_fila", "datos"}], "comando_usuario", "usar_cache"}; índice = id_fila"""
+    hechas = contexto.resultados_ok()
+    filas = [f for f in parametros["filas"] if f["id_fila"] not in hechas]
+    if not filas:
+        return
+
+    # Con el evento, cancelar el trabajo deja de enviar chunks a Gemini sin esperar a que termine el lote
+    lote = gemini_service.iterar_lote_inteligente(
+        filas, parametros["comando_usuario"], parametros.get("usar_cache", True), contexto.evento_cancelar
+    )
+    try:
+        for parcial in lote:
+            for r in parcial["resultados"]:
+                contexto.guardar_resultado(r["id_fila"], r)
+            for e in parcial["errores"]:
+                contexto.guardar_resultado(e["id_fila"], e, ok=False)
+            if contexto.cancelado():
+                break
+    finally:
+        lote.close()
+
+
+def _trabajo_lote_imagenes(parametros: dict, contexto: ContextoTrabajo):
+    """parametros: {"items": [{url_imagen, sku, categoria, nombre_hoja, perfiles}]}; índice = posición del item"""
+    hechos = contexto.resultados_ok()
+    pendientes = [i for i in range(len(parametros["items"])) if i not in hechos]
+    if not pendientes:
+        return
+
+    def al_terminar_item(j, resultado):
+        contexto.guardar_resultado(pendientes[j], resultado, ok=resultado["estado"] == "OK")
+
+    image_service.procesar_lote_imagenes(
+        [parametros["items"][i] for i in pendientes], al_terminar_item, cancelado=contexto.cancelado
+    )
+
+
+def _trabajo_busqueda_imagenes(parametros: dict, contexto: ContextoTrabajo):
+    """parametros: {"terminos": [str], "usar_cache"}; índice = posición del término"""
+    hechos = contexto.resultados_ok()
+    for i, termino in enumerate(parametros["terminos"]):
+        if contexto.cancelado():
+            break
+        if i in hechos:
+            continue
+        try:
+            opciones = buscar_imagen(termino, parametros.get("usar_cache", True))
+            contexto.guardar_resultado(i, {"termino": termino, "opciones": opciones}, ok=bool(opciones))
+        except Exception as e:
+            contexto.guardar_resultado(i, {"termino": termino, "mensaje": str(e)}, ok=False)
+
+
+cola_trabajos = ColaTrabajos()
+cola_trabajos.registrar_tipo("lote_inteligente", "gemini", _trabajo_lote_inteligente, lambda p: len(p["filas"]))
+cola_trabajos.registrar_tipo("lote_imagenes", "imagenes", _trabajo_lote_imagenes, lambda p: len(p["items"]))
+cola_trabajos.registrar_tipo("busqueda_imagenes", "busqueda", _trabajo_busqueda_imagenes, lambda p: len(p["terminos"]))
@@ -1,14 +1,25 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional, Dict, Any
 import os
-import uvicorn
+import json
+import asyncio
+import threading
+import anyio
 
 # Importaciones de tus servicios
 import gemini_service
 from google_search_service import buscar_imagen
 # Nombre correcto de tu función en image_service.py
-from image_service import procesar_imagen_estandar
+from image_service import procesar_imagen_estandar, validar_perfiles, PERFILES_RENDER
+# Trabajos largos persistentes (lotes de Gemini, imágenes y búsquedas)
+from jobs_service import cola_trabajos
+import detector_encabezados
+import http_service
+# Pools de hilos para sacar el trabajo bloqueante del event loop
+from executor_service import ejecutar_en_pool, cerrar_pools
 
 # Importamos los modelos base
 from models import ListingRequest, ListingResponse, SmartBatchRequest, SmartBatchResponse
@@ -21,12 +32,25 @@ class ImageRequest(BaseModel):
     titulo: str
     categoria: str
     nombre_hoja: str  # <--- NUEVO: Para identificar la pestaña de Excel
+    usar_cache: bool = True  # False al pedir "Reintentar" para forzar una búsqueda nueva
 
 class SeleccionImagenRequest(BaseModel):
     url_imagen: str
     sku: str
     categoria: str
     nombre_hoja: str  # <--- NUEVO: Para crear la carpeta raíz con el nombre de la hoja
+    perfiles: Optional[List[str]] = None  # ej. ["ml", "miniatura", "webp"]; None = IMAGEN_PERFILES del .env
+
+class LoteImagenesRequest(BaseModel):
+    items: List[SeleccionImagenRequest]
+
+class TrabajoRequest(BaseModel):
+    tipo: str  # "lote_inteligente", "lote_imagenes" o "busqueda_imagenes"
+    parametros: Dict[str, Any]
+
+class EncabezadosRequest(BaseModel):
+    filas: List[List[Any]]  # primeras filas de la hoja tal como vienen de Excel (se miran hasta 30)
+    roles: Optional[List[str]] = None  # ej. ["sku", "titulo"]; None = sku, precio y titulo
 
 
 # ========================================================
@@ -43,13 +67,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_event():
+    # Retoma los trabajos que quedaron a medias si el servidor se cerró
+    cola_trabajos.reanudar_pendientes()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    cola_trabajos.cerrar()
+    cerrar_pools()
+
 # === 1. RUTA CLÁSICA (Optimizar Título/Desc) ===
 @app.post("/api/optimize", response_model=ListingResponse)
 async def optimize_endpoint(request: ListingRequest):
-    result = gemini_service.optimize_listing(
+    result = await ejecutar_en_pool(
+        "gemini",
+        gemini_service.optimize_listing,
         request.titulo_actual, 
         request.descripcion_actual, 
-        request.categoria
+        request.categoria,
+        request.usar_cache
     )
     
     if "error" in result:
@@ -63,18 +100,82 @@ async def optimize_endpoint(request: ListingRequest):
 async def smart_edit_bulk_endpoint(request: SmartBatchRequest):
     filas_dict = [{"id_fila": f.id_fila, "datos": f.datos} for f in request.filas]
     
-    result = gemini_service.procesar_lote_inteligente(filas_dict, request.comando_usuario)
+    result = await ejecutar_en_pool("gemini", gemini_service.procesar_lote_inteligente, filas_dict, request.comando_usuario, request.usar_cache)
     
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
         
-    return SmartBatchResponse(resultados=result["resultados"])
+    # Éxito parcial: devolvemos lo que sí se procesó junto con los errores por fila
+    return SmartBatchResponse(resultados=result["resultados"], errores=result["errores"])
+
+
+# === 2b. RUTA MASIVA EN STREAMING (NDJSON) ===
+@app.post("/api/smart-edit-bulk/stream")
+async def smart_edit_bulk_stream_endpoint(request: SmartBatchRequest):
+    """
+    Igual que /api/smart-edit-bulk pero emite una línea JSON por evento en cuanto
+    cada chunk termina: "resultado", "error_fila", "progreso" y al final "resumen".
+    """
+    filas_dict = [{"id_fila": f.id_fila, "datos": f.datos} for f in request.filas]
+
+    async def generar_eventos():
+        cancelar = threading.Event()
+        lote = gemini_service.iterar_lote_inteligente(filas_dict, request.comando_usuario, request.usar_cache, cancelar)
+        siguiente = None
+        total_filas = len(filas_dict)
+        chunks_completados = 0
+        total_resultados = 0
+        total_errores = 0
+
+        try:
+            while True:
+                # Cada next() bloquea hasta que termina un chunk, así que va al pool de Gemini.
+                # shield: si el cliente se va, el next() en curso se sigue pudiendo esperar en el finally
+                siguiente = asyncio.ensure_future(ejecutar_en_pool("gemini", next, lote, None))
+                parcial = await asyncio.shield(siguiente)
+                siguiente = None
+                if parcial is None:
+                    break
 
+                chunks_completados += 1
+                for r in parcial["resultados"]:
+                    total_resultados += 1
+                    yield json.dumps({"tipo": "resultado", **r}, ensure_ascii=False) + "\n"
+                for e in parcial["errores"]:
+                    total_errores += 1
+                    yield json.dumps({"tipo": "error_fila", **e}, ensure_ascii=False) + "\n"
 
-# === 3. RUTA DE ESTADO DE API (Verificar cuota) ===
+                yield json.dumps({
+                    "tipo": "progreso",
+                    "chunks_completados": chunks_completados,
+                    "total_chunks": parcial["total_chunks"],
+                    "filas_procesadas": total_resultados + total_errores,
+                    "total_filas": total_filas
+                }) + "\n"
+        finally:
+            # Si el cliente se desconecta: no se envían más chunks, se espera el next() en curso
+            # (cerrar el generador mientras corre en otro hilo falla) y recién entonces se cierra.
+            # El CancelScope evita que la cancelación de la desconexión corte estas esperas.
+            cancelar.set()
+            with anyio.CancelScope(shield=True):
+                if siguiente is not None:
+                    await asyncio.wait([siguiente])
+                await ejecutar_en_pool("gemini", lote.close)
+
+        yield json.dumps({
+            "tipo": "resumen",
+            "total_filas": total_filas,
+            "resultados": total_resultados,
+            "errores": total_errores
+        }) + "\n"
+
+    return StreamingResponse(generar_eventos(), media_type="application/x-ndjson")
+
+
+# === 3. RUTA DE ESTADO DE API (Verificar cuota sin gastarla) ===
 @app.get("/api/status")
 async def status_endpoint():
-    estado = gemini_service.verificar_estado_api()
+    estado = await ejecutar_en_pool("gemini", gemini_service.verificar_estado_api)
     
     if estado["estado"] == "CUOTA_AGOTADA":
         raise HTTPException(
@@ -92,17 +193,38 @@ async def status_endpoint():
     return {
         "estado": "OK",
         "mensaje": "API funcionando correctamente",
-        "modelo": estado["modelo_principal"]
+        "modelo": estado["modelo_principal"],
+        "origen": estado["origen"],  # "trafico", "sonda" o "sin_datos"
+        "llamadas_recientes": estado["llamadas_recientes"],
+        "modelos": estado["modelos"]
     }
 
 
+# === 3a. ESTADO DEL ROUTER DE MODELOS ===
+@app.get("/api/modelos/estado")
+async def modelos_estado_endpoint():
+    """Salud, latencia y enfriamiento de cada modelo, y el orden que usa cada tarea"""
+    return gemini_service.router.estado()
+
+
+# === 3b. ESTADÍSTICAS DE CACHÉ ===
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    return await ejecutar_en_pool("gemini", gemini_service.cache_respuestas.estadisticas)
+
+@app.delete("/api/cache")
+async def cache_clear_endpoint():
+    await ejecutar_en_pool("gemini", gemini_service.cache_respuestas.limpiar)
+    return {"mensaje": "Caché de respuestas vaciada"}
+
+
 # === 4. RUTAS DE IMÁGENES (DuckDuckGo - 4 Opciones) ===
 @app.post("/api/fetch-images")
 async def fetch_images_options(request: ImageRequest):
     """Paso 1: Busca opciones y se las muestra al usuario en Excel"""
     # Usamos título y SKU para la búsqueda robusta
     termino = f"{request.titulo} {request.sku}"
-    opciones_urls = buscar_imagen(termino)
+    opciones_urls = await ejecutar_en_pool("busqueda", buscar_imagen, termino, request.usar_cache)
     
     if not opciones_urls:
         raise HTTPException(status_code=404, detail="No se encontraron imágenes para este producto.")
@@ -112,17 +234,25 @@ async def fetch_images_options(request: ImageRequest):
 @app.post("/api/download-selected-image")
 async def download_selected(request: SeleccionImagenRequest):
     """Paso 2: Descarga la imagen elegida y la guarda en BASE/HOJA/CATEGORIA/SKU.jpg"""
+    try:
+        validar_perfiles(request.perfiles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # CORRECCIÓN AQUÍ: Se cambió 'nombre_ho_ja' por 'nombre_hoja'
-        resultado = procesar_imagen_estandar(
+        resultado = await ejecutar_en_pool(
+            "imagenes",
+            procesar_imagen_estandar,
             request.url_imagen, 
             request.sku, 
             request.categoria,
-            request.nombre_hoja # <--- El atributo correcto es nombre_hoja
+            request.nombre_hoja, # <--- El atributo correcto es nombre_hoja
+            request.perfiles
         )
         
         if resultado["estado"] == "OK":
-            return {"mensaje": "Imagen procesada y guardada con éxito", "ruta": resultado["ruta"]}
+            return {"mensaje": "Imagen procesada y guardada con éxito", "ruta": resultado["ruta"], "salidas": resultado["salidas"]}
         else:
             raise HTTPException(status_code=500, detail=resultado["mensaje"])
             
@@ -132,14 +262,95 @@ async def download_selected(request: SeleccionImagenRequest):
         raise HTTPException(status_code=500, detail=f"Error al procesar la imagen elegida: {str(e)}")
 
 
+# === 5. LOTE DE IMÁGENES (muchos SKUs en una sola llamada) ===
+@app.post("/api/download-images-bulk")
+async def download_images_bulk(request: LoteImagenesRequest):
+    """Lanza la descarga y el procesamiento en segundo plano; devuelve un id para consultar el avance"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="El lote no tiene imágenes.")
+
+    try:
+        for item in request.items:
+            validar_perfiles(item.perfiles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items = [item.dict() for item in request.items]
+    id_trabajo = cola_trabajos.enviar("lote_imagenes", {"items": items})
+    return {"id_trabajo": id_trabajo, "total": len(items)}
+
+@app.get("/api/download-images-bulk/{id_trabajo}")
+async def download_images_bulk_status(id_trabajo: str):
+    """Estado del lote: completados, errores y resultado de cada SKU terminado"""
+    trabajo = cola_trabajos.consultar(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return {**trabajo, "items": cola_trabajos.resultados(id_trabajo, limite=trabajo["total"])}
+
+
+# === 6. TRABAJOS EN SEGUNDO PLANO (sobreviven a recargar el Add-in y a reiniciar el servidor) ===
+@app.post("/api/trabajos")
+async def crear_trabajo(request: TrabajoRequest):
+    """Encola un trabajo largo y devuelve su id al instante"""
+    try:
+        id_trabajo = cola_trabajos.enviar(request.tipo, request.parametros)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Trabajo inválido: {e}")
+    return cola_trabajos.consultar(id_trabajo)
+
+@app.get("/api/trabajos")
+async def listar_trabajos(estado: Optional[str] = None, limite: int = 50):
+    return {"trabajos": cola_trabajos.listar(estado, limite)}
+
+@app.get("/api/trabajos/{id_trabajo}")
+async def estado_trabajo(id_trabajo: str):
+    """Estado y progreso (completados / errores / total)"""
+    trabajo = cola_trabajos.consultar(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return trabajo
+
+@app.get("/api/trabajos/{id_trabajo}/resultados")
+async def resultados_trabajo(id_trabajo: str, desde: int = 0, limite: int = 500):
+    """Resultados ya terminados, paginados por índice (se pueden leer mientras el trabajo sigue)"""
+    trabajo = cola_trabajos.consultar(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return {**trabajo, "resultados": cola_trabajos.resultados(id_trabajo, desde, limite)}
+
+@app.post("/api/trabajos/{id_trabajo}/cancelar")
+async def cancelar_trabajo(id_trabajo: str):
+    trabajo = cola_trabajos.cancelar(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return trabajo
+
+
+@app.get("/api/http/stats")
+async def http_stats_endpoint():
+    """Peticiones, bytes y reutilización de conexiones por host de las descargas de imágenes"""
+    return http_service.estadisticas()
+
+
+@app.post("/api/encabezados/detectar")
+async def detectar_encabezados_endpoint(request: EncabezadosRequest):
+    """Fila de encabezados y columna de cada rol (la misma detección que usa la app de escritorio)"""
+    roles = request.roles or list(detector_encabezados.ROLES_POR_DEFECTO)
+    desconocidos = [r for r in roles if r not in detector_encabezados.ROLES]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Roles desconocidos: {', '.join(desconocidos)}")
+    return detector_encabezados.detectar_encabezado(request.filas, roles)
+
+
+@app.get("/api/imagenes/perfiles")
+async def perfiles_imagen_endpoint():
+    """Perfiles de salida disponibles (tamaño, formato, calidad) para las descargas de imágenes"""
+    return {"perfiles": PERFILES_RENDER, "por_defecto": validar_perfiles(None)}
+
+
 # === ARRANQUE DEL SERVIDOR ===
+# Preferir python servidor.py: con spawn (Windows) los procesos de render vuelven a ejecutar
+# el script principal, y este importa todos los servicios
 if __name__ == "__main__":
-    cert_path = r"C:\Users\Edgar\.office-addin-dev-certs\localhost.crt"
-    key_path = r"C:\Users\Edgar\.office-addin-dev-certs\localhost.key"
-
-    if os.path.exists(cert_path) and os.path.exists(key_path):
-        print("🔒 Iniciando servidor de FastAPI con HTTPS...")
-        uvicorn.run(app, host="0.0.0.0", port=8000, ssl_certfile=cert_path, ssl_keyfile=key_path)
-    else:
-        print("⚠️ Iniciando servidor con HTTP normal...")
-        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    from servidor import iniciar
+    iniciar(app)
@@ -0,0 +1,86 @@
+import os
+import sqlite3
+import threading
+import time
+from cache_service import CACHE_DIR
+
+
+class ManifestImagenes:
+    """
+    Registro local de imágenes ya procesadas:
+    - fuentes: URL -> ETag / Last-Modified / hash del contenido descargado
+    - salidas: ruta del JPG -> clave de render (hash del contenido + versión del render)
+    Permite saltar descargas sin cambios y reutilizar un render idéntico en otro SKU.
+    """
+
+    def __init__(self, nombre: str = "manifest_imagenes"):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.ruta = os.path.join(CACHE_DIR, f"{nombre}.sqlite")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fuentes (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                hash_contenido TEXT NOT NULL,
+                verificado REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS salidas (
+                ruta TEXT PRIMARY KEY,
+                clave_render TEXT NOT NULL,
+                url TEXT,
+                actualizado REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_clave ON salidas (clave_render)")
+        self._conn.commit()
+
+    def fuente(self, url: str):
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT etag, last_modified, hash_contenido, verificado FROM fuentes WHERE url = ?", (url,)
+            ).fetchone()
+        if fila is None:
+            return None
+        return {"etag": fila[0], "last_modified": fila[1], "hash_contenido": fila[2], "verificado": fila[3]}
+
+    def guardar_fuente(self, url: str, etag, last_modified, hash_contenido: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fuentes (url, etag, last_modified, hash_contenido, verificado) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, hash_contenido, time.time())
+            )
+            self._conn.commit()
+
+    def marcar_verificada(self, url: str):
+        with self._lock:
+            self._conn.execute("UPDATE fuentes SET verificado = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def clave_salida(self, ruta: str):
+        with self._lock:
+            fila = self._conn.execute("SELECT clave_render FROM salidas WHERE ruta = ?", (ruta,)).fetchone()
+        return fila[0] if fila else None
+
+    def buscar_salida(self, clave_render: str, excluir_ruta: str = None):
+        """Otra ruta que ya tenga este mismo render y siga existiendo en disco"""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT ruta FROM salidas WHERE clave_render = ? AND ruta != ?", (clave_render, excluir_ruta or "")
+            ).fetchall()
+        for (ruta,) in filas:
+            if os.path.exists(ruta):
+                return ruta
+        return None
+
+    def guardar_salida(self, ruta: str, clave_render: str, url: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO salidas (ruta, clave_render, url, actualizado) VALUES (?, ?, ?, ?)",
+                (ruta, clave_render, url, time.time())
+            )
+            self._conn.commit()
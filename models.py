@@ -13,6 +13,7 @@ class ListingRequest(BaseModel):
     titulo_actual: str
     descripcion_actual: str
     categoria: str = "General"
+    usar_cache: bool = True  # False para forzar una respuesta nueva de Gemini
 
 class ListingResponse(BaseModel):
     nuevo_titulo: str
@@ -27,10 +28,16 @@ class FilaBatch(BaseModel):
 class SmartBatchRequest(BaseModel):
     filas: List[FilaBatch]
     comando_usuario: str
+    usar_cache: bool = True
 
 class ResultadoBatch(BaseModel):
     id_fila: int
     datos_actualizados: Dict[str, Any]
 
+class ErrorFila(BaseModel):
+    id_fila: int
+    mensaje: str
+
 class SmartBatchResponse(BaseModel):
-    resultados: List[ResultadoBatch]
\ No newline at end of file
+    resultados: List[ResultadoBatch]
+    errores: List[ErrorFila] = []
\ No newline at end of file
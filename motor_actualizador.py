@@ -0,0 +1,628 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+import zipfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Border, Side, Alignment, NamedStyle
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.utils import get_column_letter
+from parche_xlsx import parchear_hoja, rangos_filas, huellas_hojas, EstructuraNoSoportada
+from buscador_similares import IndiceSimilitud
+from indice_precios import IndicePrecios
+from detector_encabezados import indices_columnas, ubicar_encabezado
+
+# Catálogo de la última corrida (para releer solo las hojas de proveedor que cambiaron)
+RUTA_CATALOGO = os.path.join(os.getenv("CACHE_DIR", "cache"), "catalogo_proveedores.pkl")
+
+
+def limpiar_sku_seguro(valor):
+    if valor is None: return None
+    s = str(valor).strip()
+    if s.startswith("'"): s = s[1:]
+    return s.strip().upper()
+
+
+def leer_filas_hoja(ws, columnas: dict):
+    """
+    Recorre la hoja UNA sola vez: busca el encabezado (en cualquier fila) y, con el mismo
+    iterador, sigue leyendo las filas de datos. Devuelve un generador de (sku, precio, nombre)
+    o None si no aparece el encabezado (precio es None si no es numérico).
+    """
+    sel_sku = columnas["sku"]
+    sel_price = columnas["price"]
+    sel_name = columnas["name"]
+
+    filas = ws.iter_rows(values_only=True)
+    # Sin límite de filas: hay listas de proveedores con logos y notas largas antes del encabezado
+    fila_encabezado, indices = ubicar_encabezado(filas, (sel_sku, sel_price), (sel_name,), max_filas=None)
+    if fila_encabezado == -1:
+        return None
+    idx_sku = indices[sel_sku]
+    idx_price = indices[sel_price]
+    idx_name = indices.get(sel_name, -1) if sel_name else -1
+
+    def datos():
+        for fila in filas:
+            try:
+                val_sku = fila[idx_sku]
+                val_price = fila[idx_price]
+                val_name = fila[idx_name] if idx_name != -1 else ""
+            except IndexError:
+                continue
+
+            sku_clean = limpiar_sku_seguro(val_sku)
+            if not sku_clean:
+                continue
+            try:
+                precio = float(val_price)
+            except (TypeError, ValueError):
+                precio = None
+            yield sku_clean, precio, str(val_name).strip() if val_name else ""
+
+    return datos()
+
+
+def leer_hoja_compacta(ws, nombre_hoja: str, columnas: dict):
+    """
+    Lee una hoja y la devuelve como columnas compactas (fáciles de pasar entre procesos):
+    (nombre_hoja, skus, precios array('d') con NaN si no es numérico, nombres con "" si no hay)
+    Devuelve None si la hoja no tiene el encabezado configurado.
+    """
+    filas = leer_filas_hoja(ws, columnas)
+    if filas is None:
+        return None
+
+    skus = []
+    precios = array("d")
+    nombres = []
+    for sku, precio, nombre in filas:
+        skus.append(sku)
+        precios.append(precio if precio is not None else math.nan)
+        nombres.append(nombre)
+    return nombre_hoja, skus, precios, nombres
+
+
+# Cada proceso del pool abre el libro una sola vez y lo reutiliza para todas las hojas que le toquen
+_wb_proceso = None
+
+
+def _iniciar_proceso(ruta_origen: str):
+    global _wb_proceso
+    _wb_proceso = openpyxl.load_workbook(ruta_origen, read_only=True, data_only=True)
+
+
+def _leer_hoja_en_proceso(nombre_hoja: str, columnas: dict):
+    return leer_hoja_compacta(_wb_proceso[nombre_hoja], nombre_hoja, columnas)
+
+
+def leer_hojas(ruta_origen: str, config_map: dict, al_avanzar=None, procesos: int = None) -> list:
+    """
+    Lee las hojas configuradas como columnas compactas, en el orden de config_map (None si no tiene encabezado).
+    Con varias hojas el parseo (CPU) se reparte en un pool de procesos.
+    al_avanzar(completadas - 1, total, nombre_hoja) se llama al terminar cada hoja.
+    """
+    hojas = list(config_map.items())
+    total_hojas = len(hojas)
+    if not hojas:
+        return []
+    procesos = min(procesos or os.cpu_count() or 1, total_hojas)
+
+    leidas = [None] * total_hojas
+    if procesos <= 1:
+        wb = openpyxl.load_workbook(ruta_origen, read_only=True, data_only=True)
+        try:
+            for i, (nombre_hoja, columnas) in enumerate(hojas):
+                leidas[i] = leer_hoja_compacta(wb[nombre_hoja], nombre_hoja, columnas)
+                if al_avanzar:
+                    al_avanzar(i, total_hojas, nombre_hoja)
+        finally:
+            wb.close()
+        return leidas
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso, initargs=(ruta_origen,)) as pool:
+        futuros = {pool.submit(_leer_hoja_en_proceso, nombre_hoja, columnas): i for i, (nombre_hoja, columnas) in enumerate(hojas)}
+        for completadas, futuro in enumerate(as_completed(futuros)):
+            i = futuros[futuro]
+            leidas[i] = futuro.result()
+            if al_avanzar:
+                al_avanzar(completadas, total_hojas, hojas[i][0])
+
+    return leidas
+
+
+def consolidar_origen(ruta_origen: str, config_map: dict, al_avanzar=None, procesos: int = None) -> IndicePrecios:
+    """
+    Junta todas las hojas configuradas del libro de proveedores en un IndicePrecios.
+    La fusión va siempre en el orden de config_map (no en el de llegada de los procesos),
+    así que si un SKU aparece en varias hojas gana la última.
+    """
+    consolidado = IndicePrecios()
+    for hoja in leer_hojas(ruta_origen, config_map, al_avanzar, procesos):
+        if hoja is not None:
+            consolidado.agregar_hoja(*hoja)
+    return consolidado
+
+
+def _detectar_encabezado_destino(estado: dict, numero_fila: int, valores: list):
+    """En las filas 1-19 se busca la que tiene la columna SKU elegida y PRICE (y el título, si está)"""
+    indices = indices_columnas(valores, (estado["sel_sku"], "PRICE", estado["sel_title"]))
+    if estado["sel_sku"] in indices and "PRICE" in indices:
+        estado["idx_sku"] = indices[estado["sel_sku"]] + 1
+        estado["idx_price"] = indices["PRICE"] + 1
+        if estado["sel_title"] in indices:
+            estado["idx_title"] = indices[estado["sel_title"]] + 1
+        estado["inicio"] = numero_fila + 1
+
+
+def actualizar_destino(ruta_destino: str, save_path: str, nombre_hoja: str, sel_sku_dest: str, sel_title_dest: str,
+                       mapa_precios: dict, al_avanzar=None) -> dict:
+    """
+    Escribe en save_path el archivo de Mercado Libre con los precios nuevos y las filas cambiadas en amarillo.
+    mapa_precios puede ser un IndicePrecios o un dict SKU -> (precio, hoja); solo se usa .get()
+    (una regla de formato condicional para todas, en vez de un relleno por celda).
+    Solo se reescriben las celdas de precio: la hoja se procesa en streaming dentro del .xlsx
+    y el resto del archivo se copia tal cual. Si el archivo trae algo que el parche no soporta,
+    se usa el camino clásico con openpyxl.
+    Las filas cuyo precio ya es el nuevo (al centavo) no se tocan ni se pintan.
+    Devuelve {"cambios" (filas con precio distinto), "coincidencias" (filas con SKU en el catálogo),
+    "skus_encontrados", "no_sku_list"}.
+    """
+    try:
+        return _actualizar_destino_streaming(ruta_destino, save_path, nombre_hoja, sel_sku_dest, sel_title_dest,
+                                             mapa_precios, al_avanzar)
+    except (EstructuraNoSoportada, zipfile.BadZipFile, UnicodeDecodeError) as e:
+        print(f"Parche en streaming no disponible ({e}); se usa openpyxl")
+        return _actualizar_destino_openpyxl(ruta_destino, save_path, nombre_hoja, sel_sku_dest, sel_title_dest,
+                                            mapa_precios, al_avanzar)
+
+
+def mismo_precio(actual, nuevo: float) -> bool:
+    """
+    El precio de la celda ya es el nuevo (se compara al centavo). Solo cuentan las celdas numéricas:
+    un texto "1500" o un vacío es distinto y se reescribe como número.
+    """
+    if not isinstance(actual, (int, float)) or isinstance(actual, bool):
+        return False
+    return round(actual, 2) == round(nuevo, 2)
+
+
+def _actualizar_destino_streaming(ruta_destino, save_path, nombre_hoja, sel_sku_dest, sel_title_dest, mapa_precios, al_avanzar):
+    estado = {"sel_sku": sel_sku_dest, "sel_title": sel_title_dest, "idx_sku": -1, "idx_price": -1, "idx_title": -1, "inicio": -1}
+    resultado = {"cambios": 0, "coincidencias": 0, "skus_encontrados": set(), "no_sku_list": []}
+
+    def procesar_fila(fila):
+        if estado["inicio"] == -1:
+            if fila.numero >= 20:
+                raise Exception("Error columnas destino.")
+            _detectar_encabezado_destino(estado, fila.numero, fila.valores())
+            return None
+        if fila.numero < estado["inicio"]:
+            return None
+
+        val_sku = limpiar_sku_seguro(fila.valor(estado["idx_sku"]))
+        if val_sku:
+            encontrado = mapa_precios.get(val_sku)
+            if encontrado is not None:
+                precio_nuevo = encontrado[0]
+                resultado["coincidencias"] += 1
+                resultado["skus_encontrados"].add(val_sku)
+                if mismo_precio(fila.valor(estado["idx_price"]), precio_nuevo):
+                    return None
+                resultado["cambios"] += 1
+                return {estado["idx_price"]: precio_nuevo}, True
+        elif estado["idx_title"] != -1:
+            titulo = fila.valor(estado["idx_title"])
+            t = str(titulo).strip() if titulo else ""
+            if t: resultado["no_sku_list"].append(t)
+        return None
+
+    def validar():
+        # La hoja terminó antes de encontrar el encabezado: no se reemplaza save_path
+        # (puede ser el mismo archivo de destino que eligió el usuario)
+        if estado["inicio"] == -1:
+            raise Exception("Error columnas destino.")
+
+    parchear_hoja(ruta_destino, save_path, nombre_hoja, procesar_fila, al_avanzar, validar=validar)
+    return resultado
+
+
+def _actualizar_destino_openpyxl(ruta_destino, save_path, nombre_hoja, sel_sku_dest, sel_title_dest, mapa_precios, al_avanzar):
+    """Camino clásico: carga el libro completo en memoria (solo como respaldo); save_path se escribe al final"""
+    wb_dest = openpyxl.load_workbook(ruta_destino)
+    ws_dest = wb_dest[nombre_hoja]
+
+    estado = {"sel_sku": sel_sku_dest, "sel_title": sel_title_dest, "idx_sku": -1, "idx_price": -1, "idx_title": -1, "inicio": -1}
+    for r in range(1, 20):
+        _detectar_encabezado_destino(estado, r, [cell.value for cell in ws_dest[r]])
+        if estado["inicio"] != -1:
+            break
+
+    if estado["inicio"] == -1: raise Exception("Error columnas destino.")
+
+    resultado = {"cambios": 0, "coincidencias": 0, "skus_encontrados": set(), "no_sku_list": []}
+    filas_cambiadas = []
+    total = ws_dest.max_row
+
+    # Se recorre la hoja fila por fila (sin ws.cell() por cada búsqueda) y los precios se escriben al final
+    for row, celdas in enumerate(ws_dest.iter_rows(min_row=estado["inicio"], max_row=total), start=estado["inicio"]):
+        if al_avanzar and row % 500 == 0:
+            al_avanzar(row, total)
+
+        c_sku = celdas[estado["idx_sku"] - 1] if len(celdas) >= estado["idx_sku"] else None
+        val_sku = limpiar_sku_seguro(c_sku.value if c_sku is not None else None)
+        if val_sku:
+            encontrado = mapa_precios.get(val_sku)
+            if encontrado is not None:
+                precio_nuevo = encontrado[0]
+                resultado["coincidencias"] += 1
+                resultado["skus_encontrados"].add(val_sku)
+                c_price = celdas[estado["idx_price"] - 1] if len(celdas) >= estado["idx_price"] else None
+                if not mismo_precio(c_price.value if c_price is not None else None, precio_nuevo):
+                    filas_cambiadas.append((row, precio_nuevo))
+                    resultado["cambios"] += 1
+        elif estado["idx_title"] != -1 and len(celdas) >= estado["idx_title"]:
+            c_title = celdas[estado["idx_title"] - 1]
+            t = str(c_title.value).strip() if c_title.value else ""
+            if t: resultado["no_sku_list"].append(t)
+
+    for row, precio_nuevo in filas_cambiadas:
+        ws_dest.cell(row=row, column=estado["idx_price"]).value = precio_nuevo
+
+    # Una sola regla de formato condicional pinta todas las filas cambiadas (no un estilo por celda)
+    if filas_cambiadas:
+        amarillo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+        rangos = rangos_filas([row for row, _ in filas_cambiadas], get_column_letter(ws_dest.max_column))
+        ws_dest.conditional_formatting.add(rangos, FormulaRule(formula=["TRUE"], fill=amarillo))
+
+    # Igual que el parche: se guarda en un .tmp y se reemplaza solo si salió bien
+    ruta_temporal = save_path + ".tmp"
+    try:
+        wb_dest.save(ruta_temporal)
+        os.replace(ruta_temporal, save_path)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+    return resultado
+
+
+def sugerir_vinculaciones(titulos_sin_sku: list, catalogo: IndicePrecios,
+                          sugerencias: int = 3, minimo: float = 0.4) -> list:
+    """
+    Para cada título de ML sin SKU busca los nombres del proveedor más parecidos.
+    Devuelve filas [TITULO ML, COINCIDENCIA, SKU SUGERIDO, SIMILITUD, HOJA ORIGEN, OTRAS SUGERENCIAS].
+    """
+    nombres = catalogo.nombres_catalogo()
+    if not titulos_sin_sku or not nombres:
+        return []
+
+    indice = IndiceSimilitud(nombres)
+
+    filas = []
+    for t in titulos_sin_sku:
+        resultados = indice.buscar(t, k=sugerencias, minimo=minimo)
+        if not resultados:
+            continue
+
+        best_idx, score = resultados[0]
+        best = nombres[best_idx]
+        sku_s = catalogo.sku_por_nombre(best)
+        hoja_org = catalogo.hoja(sku_s) or "-"
+        otras = " | ".join(f"{catalogo.sku_por_nombre(nombres[i])} ({int(p * 100)}%)" for i, p in resultados[1:])
+        filas.append([t, best, sku_s, f"{int(score * 100)}%", hoja_org, otras])
+    return filas
+
+
+# ==========================================
+# REPORTES
+# ==========================================
+
+ENCABEZADOS_FALTANTES = ["SKU", "NOMBRE PRODUCTO", "PRECIO LISTA", "HOJA ORIGEN"]
+ENCABEZADOS_VINCULACION = ["TITULO ML", "COINCIDENCIA", "SKU SUGERIDO", "SIMILITUD", "HOJA ORIGEN", "OTRAS SUGERENCIAS"]
+FORMATOS_REPORTE = ("xlsx", "csv", "parquet")
+FORMATO_PRECIO = '"$"#,##0.00'
+# Más filas de las que entran en una hoja de Excel: el reporte sale en CSV
+MAX_FILAS_EXCEL = 1048575
+
+
+def _registrar_estilos_reporte(wb):
+    """Estilos con nombre creados una sola vez por libro; cada celda solo los referencia"""
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                         top=Side(style='thin'), bottom=Side(style='thin'))
+    wb.add_named_style(NamedStyle(
+        name="reporte_encabezado",
+        fill=PatternFill(start_color="3498db", end_color="3498db", fill_type="solid"),
+        font=Font(bold=True, color="FFFFFF"),
+        alignment=Alignment(horizontal="center", vertical="center"),
+        border=thin_border
+    ))
+    wb.add_named_style(NamedStyle(name="reporte_dato", border=thin_border))
+    wb.add_named_style(NamedStyle(name="reporte_precio", border=thin_border, number_format=FORMATO_PRECIO))
+
+
+def anchos_columnas(encabezados: list, filas: list) -> list:
+    """Ancho de cada columna (texto más largo + 4, máximo 60) en una sola pasada por las filas"""
+    largos = [len(str(h)) for h in encabezados]
+    tope = 56
+    for fila in filas:
+        for i, valor in enumerate(fila):
+            if valor and largos[i] < tope:
+                largo = len(str(valor))
+                if largo > largos[i]: largos[i] = largo
+    return [min(largo + 4, 60) for largo in largos]
+
+
+def escribir_reporte_xlsx(ruta: str, titulo_hoja: str, encabezados: list, filas: list, columnas_precio=()):
+    """
+    Reporte en un libro write_only: las filas se escriben en streaming (sin armar la hoja en memoria)
+    y los anchos se calculan antes, porque en este modo las columnas van al principio del XML.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    _registrar_estilos_reporte(wb)
+    ws = wb.create_sheet(titulo_hoja)
+    for i, ancho in enumerate(anchos_columnas(encabezados, filas), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+
+    def celda(valor, estilo):
+        c = WriteOnlyCell(ws, value=valor)
+        c.style = estilo
+        return c
+
+    ws.append([celda(h, "reporte_encabezado") for h in encabezados])
+    estilos = ["reporte_precio" if i in columnas_precio else "reporte_dato" for i in range(len(encabezados))]
+    for fila in filas:
+        ws.append([celda(valor, estilo) for valor, estilo in zip(fila, estilos)])
+    wb.save(ruta)
+
+
+def escribir_reporte_csv(ruta: str, encabezados: list, filas: list):
+    # utf-8-sig para que Excel abra bien las tildes
+    with open(ruta, "w", newline="", encoding="utf-8-sig") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(encabezados)
+        escritor.writerows(filas)
+
+
+def escribir_reporte_parquet(ruta: str, encabezados: list, filas: list):
+    """Parquet (columnar y comprimido) para reportes muy grandes; pyarrow es opcional"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise Exception("Para reportes Parquet hay que instalar pyarrow (pip install pyarrow).")
+    columnas = list(zip(*filas)) if filas else [() for _ in encabezados]
+    pq.write_table(pa.table({h: list(c) for h, c in zip(encabezados, columnas)}), ruta)
+
+
+def escribir_reporte(ruta_sin_extension: str, titulo_hoja: str, encabezados: list, filas: list,
+                     formato: str = "xlsx", columnas_precio=()) -> str:
+    """Escribe un reporte en el formato pedido y devuelve la ruta final (con extensión)"""
+    if formato == "xlsx" and len(filas) > MAX_FILAS_EXCEL:
+        print(f"{len(filas)} filas no entran en una hoja de Excel; {titulo_hoja} se guarda en CSV")
+        formato = "csv"
+    ruta = f"{ruta_sin_extension}.{formato}"
+    if formato == "xlsx":
+        escribir_reporte_xlsx(ruta, titulo_hoja, encabezados, filas, columnas_precio)
+    elif formato == "csv":
+        escribir_reporte_csv(ruta, encabezados, filas)
+    else:
+        escribir_reporte_parquet(ruta, encabezados, filas)
+    return ruta
+
+
+def escribir_reportes(save_path: str, data_faltantes: list, data_ia: list, formato: str = "xlsx") -> dict:
+    """
+    Reporte_Faltantes y AYUDA_VINCULACION junto al archivo actualizado; devuelve las rutas escritas.
+    formato: "xlsx" (por defecto), "csv" o "parquet".
+    """
+    if formato not in FORMATOS_REPORTE:
+        raise ValueError(f"Formato de reporte no válido: {formato}. Opciones: {', '.join(FORMATOS_REPORTE)}")
+
+    carpeta = os.path.dirname(save_path)
+    rutas = {}
+    if data_faltantes:
+        rutas["faltantes"] = escribir_reporte(
+            os.path.join(carpeta, "Reporte_Faltantes"), "Faltantes", ENCABEZADOS_FALTANTES, data_faltantes,
+            formato, columnas_precio=(2,)
+        )
+    if data_ia:
+        rutas["vinculacion"] = escribir_reporte(
+            os.path.join(carpeta, "AYUDA_VINCULACION"), "Vinculacion", ENCABEZADOS_VINCULACION, data_ia, formato
+        )
+    return rutas
+
+
+# ==========================================
+# PROCESO COMPLETO (interfaz o línea de comandos)
+# ==========================================
+
+def cargar_o_consolidar(ruta_origen: str, config_map: dict, ruta_catalogo: str = None,
+                        al_avanzar=None, procesos: int = None):
+    """
+    Consolida reutilizando el catálogo de la corrida anterior (si ruta_catalogo existe):
+    cada hoja se guarda con su huella (CRC del XML dentro del .xlsx + columnas elegidas) y solo
+    se vuelven a leer las hojas nuevas o cuya huella cambió. Después se fusiona todo en el orden
+    de config_map, igual que consolidar_origen, y se guarda el catálogo para la próxima.
+    Devuelve (IndicePrecios, lista de hojas releídas).
+    """
+    if not ruta_catalogo:
+        return consolidar_origen(ruta_origen, config_map, al_avanzar, procesos), list(config_map)
+
+    huellas = {nombre: {"contenido": h, "columnas": config_map[nombre]}
+               for nombre, h in huellas_hojas(ruta_origen, list(config_map)).items()}
+    anterior = IndicePrecios.cargar(ruta_catalogo)
+    lecturas = anterior.lecturas if anterior is not None else {}
+    vigentes = {nombre: lecturas[nombre] for nombre in config_map
+                if nombre in lecturas and lecturas[nombre]["huella"] == huellas[nombre]}
+
+    if anterior is not None and list(lecturas) == list(config_map) and len(vigentes) == len(config_map):
+        return anterior, []
+
+    pendientes = {nombre: columnas for nombre, columnas in config_map.items() if nombre not in vigentes}
+    for nombre, hoja in zip(pendientes, leer_hojas(ruta_origen, pendientes, al_avanzar, procesos)):
+        vigentes[nombre] = {"huella": huellas[nombre], "hoja": hoja}
+
+    catalogo = IndicePrecios()
+    for nombre in config_map:
+        catalogo.lecturas[nombre] = vigentes[nombre]
+        if vigentes[nombre]["hoja"] is not None:
+            catalogo.agregar_hoja(*vigentes[nombre]["hoja"])
+    catalogo.guardar(ruta_catalogo)
+    return catalogo, list(pendientes)
+
+
+def ejecutar_actualizacion(ruta_origen: str, config_map: dict, ruta_destino: str, hoja_destino: str,
+                           sel_sku_dest: str, sel_title_dest: str, save_path: str,
+                           al_progreso=None, al_log=None, procesos: int = None, ruta_catalogo: str = None) -> dict:
+    """
+    Consolida el libro de proveedores, actualiza el archivo de Mercado Libre y prepara los datos de los reportes.
+    config_map: {hoja: {"sku", "price", "name"}} (lo mismo que arma ConfigHojaDialog).
+    al_progreso(porcentaje 0-100, texto) y al_log(mensaje) son opcionales.
+    ruta_catalogo: catálogo de la corrida anterior para releer solo las hojas que cambiaron (ver cargar_o_consolidar).
+    Devuelve cambios (filas con precio distinto), sin_cambio, unicos, total_hojas, hojas_releidas,
+    data_faltantes, data_ia y "tiempos" (segundos por fase).
+    """
+    progreso = al_progreso or (lambda porcentaje, texto: None)
+    log = al_log or (lambda mensaje: None)
+    tiempos = {}
+    inicio_fase = time.perf_counter()
+
+    def cerrar_fase(nombre):
+        nonlocal inicio_fase
+        ahora = time.perf_counter()
+        tiempos[nombre] = round(ahora - inicio_fase, 3)
+        inicio_fase = ahora
+
+    # 1. CONSOLIDAR (un solo parseo del libro de origen para todas las hojas)
+    total_hojas = len(config_map)
+    log(f"Consolidando {total_hojas} hojas...")
+    catalogo, releidas = cargar_o_consolidar(
+        ruta_origen, config_map, ruta_catalogo,
+        lambda i, total, nombre_hoja: progreso(((i+1)/total)*30, f"Leído: {nombre_hoja}"),
+        procesos
+    )
+    if len(releidas) < total_hojas:
+        progreso(30, "Catálogo actualizado")
+        log(f"Hojas sin cambios: {total_hojas - len(releidas)} / releídas: {len(releidas)}.")
+    log(f"Datos consolidados: {len(catalogo)} productos.")
+    cerrar_fase("consolidacion")
+
+    # 2. DESTINO (ESCRITURA QUIRÚRGICA: solo se reescriben las filas que cambian)
+    log("Actualizando Mercado Libre...")
+    actualizacion = actualizar_destino(
+        ruta_destino, save_path, hoja_destino, sel_sku_dest, sel_title_dest, catalogo,
+        lambda fila, total: progreso(30 + min(fila / total, 1) * 40 if total else 30, f"Procesando {fila}...")
+    )
+    skus_ml_found = actualizacion["skus_encontrados"]
+    log(f"Precios distintos: {actualizacion['cambios']} / sin cambio: {actualizacion['coincidencias'] - actualizacion['cambios']}.")
+    progreso(75, "Preparando reportes...")
+    cerrar_fase("destino")
+
+    # 3. PREPARAR DATOS REPORTES
+    log("Preparando vista previa...")
+    data_faltantes = [[sku, nombre, precio, hoja] for sku, precio, hoja, nombre in catalogo.productos()
+                      if sku not in skus_ml_found]
+    cerrar_fase("faltantes")
+
+    # Índice de trigramas: no compara cada título contra todos los nombres
+    data_ia = []
+    if actualizacion["no_sku_list"] and catalogo.nombres_catalogo():
+        log("Ejecutando IA preliminar...")
+        data_ia = sugerir_vinculaciones(actualizacion["no_sku_list"], catalogo)
+    cerrar_fase("vinculacion")
+
+    return {
+        "cambios": actualizacion["cambios"],
+        "coincidencias": actualizacion["coincidencias"],
+        "sin_cambio": actualizacion["coincidencias"] - actualizacion["cambios"],
+        "unicos": len(skus_ml_found),
+        "total_hojas": total_hojas,
+        "productos_consolidados": len(catalogo),
+        "hojas_releidas": releidas,
+        "data_faltantes": data_faltantes,
+        "data_ia": data_ia,
+        "tiempos": tiempos
+    }
+
+
+def main(argv=None):
+    """
+    Actualización nocturna sin interfaz:
+        python motor_actualizador.py config.json [--sin-reportes] [--formato-reportes xlsx|csv|parquet] [--procesos N]
+    config.json:
+        {"origen": "proveedores.xlsx", "hojas": {"Hoja1": {"sku": "CODIGO", "price": "PRECIO", "name": "DESCRIPCION"}},
+         "destino": "publicaciones_ml.xlsx", "hoja_destino": "Publicaciones",
+         "sku_destino": "SELLER_SKU", "titulo_destino": "TITLE", "salida": "ML_Actualizado.xlsx",
+         "catalogo": "cache/catalogo_proveedores.pkl"}
+    "catalogo" es opcional (por defecto RUTA_CATALOGO): solo se releen las hojas de proveedor que cambiaron
+    desde la última corrida, y en el archivo de ML solo se tocan las filas cuyo precio es distinto.
+    El avance va a stderr; el resumen (con los tiempos por fase) sale como JSON por stdout.
+    """
+    parser = argparse.ArgumentParser(description="Actualizador de precios de Mercado Libre (sin interfaz)")
+    parser.add_argument("config", help="JSON con el mapeo de hojas y columnas")
+    parser.add_argument("--sin-reportes", action="store_true", help="No generar Reporte_Faltantes / AYUDA_VINCULACION")
+    parser.add_argument("--formato-reportes", choices=FORMATOS_REPORTE, default="xlsx",
+                        help="csv o parquet (requiere pyarrow) para reportes muy grandes")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos para consolidar (por defecto, uno por CPU)")
+    args = parser.parse_args(argv)
+
+    with open(args.config, encoding="utf-8") as f:
+        config = json.load(f)
+
+    def al_log(mensaje):
+        print(f"> {mensaje}", file=sys.stderr, flush=True)
+
+    ultimo = {"porcentaje": -10}
+
+    def al_progreso(porcentaje, texto):
+        if porcentaje - ultimo["porcentaje"] >= 5:
+            ultimo["porcentaje"] = porcentaje
+            print(f"[{porcentaje:5.1f}%] {texto}", file=sys.stderr, flush=True)
+
+    inicio = time.perf_counter()
+    try:
+        resultado = ejecutar_actualizacion(
+            config["origen"], config["hojas"], config["destino"], config["hoja_destino"],
+            config["sku_destino"], config.get("titulo_destino", ""), config["salida"],
+            al_progreso=al_progreso, al_log=al_log, procesos=args.procesos,
+            ruta_catalogo=config.get("catalogo", RUTA_CATALOGO)
+        )
+
+        reportes = {}
+        if not args.sin_reportes:
+            inicio_reportes = time.perf_counter()
+            reportes = escribir_reportes(config["salida"], resultado["data_faltantes"], resultado["data_ia"],
+                                         args.formato_reportes)
+            resultado["tiempos"]["reportes"] = round(time.perf_counter() - inicio_reportes, 3)
+    except Exception as e:
+        print(json.dumps({"estado": "ERROR", "mensaje": str(e)}, ensure_ascii=False))
+        return 1
+
+    resultado["tiempos"]["total"] = round(time.perf_counter() - inicio, 3)
+    print(json.dumps({
+        "estado": "OK",
+        "salida": config["salida"],
+        "reportes": reportes,
+        "cambios": resultado["cambios"],
+        "sin_cambio": resultado["sin_cambio"],
+        "unicos": resultado["unicos"],
+        "duplicados": resultado["coincidencias"] - resultado["unicos"],
+        "hojas": resultado["total_hojas"],
+        "productos_consolidados": resultado["productos_consolidados"],
+        "hojas_releidas": resultado["hojas_releidas"],
+        "faltantes": len(resultado["data_faltantes"]),
+        "sugerencias_vinculacion": len(resultado["data_ia"]),
+        "tiempos": resultado["tiempos"]
+    }, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,488 @@
+"""
+Actualización "quirúrgica" de una hoja dentro de un .xlsx sin cargar el libro en memoria.
+El XML de la hoja se lee y se escribe en streaming fila por fila: solo se reescriben las filas
+que cambian; el resto del archivo (otras hojas, imágenes, estilos no tocados) se copia tal cual.
+"""
+import codecs
+import html
+import os
+import posixpath
+import re
+import shutil
+import zipfile
+import xml.etree.ElementTree as ET
+
+TAMANO_BLOQUE = 1024 * 1024
+
+NS_PRINCIPAL = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL_DOC = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_REL_PAQ = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+RE_INICIO_FILA = re.compile(r"<(?:(\w+):)?row\b")
+RE_ATRIBUTO = re.compile(r'([\w:]+)="([^"]*)"')
+RE_REF_CELDA = re.compile(r"([A-Z]+)(\d+)")
+RE_DIMENSION = re.compile(r'<(?:\w+:)?dimension\s+ref="[A-Z]+\d+:([A-Z]+)(\d+)"')
+RE_FIN_DATOS = re.compile(r"</(?:\w+:)?sheetData>")
+RE_INICIO_DATOS = re.compile(r"<(?:\w+:)?sheetData\b")
+
+
+class EstructuraNoSoportada(Exception):
+    """El archivo tiene algo que el parche en streaming no sabe tocar sin riesgo (se usa openpyxl)"""
+    pass
+
+
+def letra_columna(col: int) -> str:
+    letras = ""
+    while col > 0:
+        col, resto = divmod(col - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def numero_columna(letras: str) -> int:
+    col = 0
+    for letra in letras:
+        col = col * 26 + ord(letra) - 64
+    return col
+
+
+def _atributos(etiqueta: str) -> dict:
+    return dict(RE_ATRIBUTO.findall(etiqueta))
+
+
+def _con_atributo(etiqueta: str, nombre: str, valor: str) -> str:
+    """Pone (o reemplaza) un atributo en una etiqueta de apertura"""
+    patron = re.compile(rf'(\s{re.escape(nombre)}=)"[^"]*"')
+    if patron.search(etiqueta):
+        return patron.sub(lambda m: f'{m.group(1)}"{valor}"', etiqueta, count=1)
+    cierre = 2 if etiqueta.endswith("/>") else 1
+    return f'{etiqueta[:-cierre]} {nombre}="{valor}"{etiqueta[-cierre:]}'
+
+
+# ==========================================
+# LECTURA DE CELDAS
+# ==========================================
+
+def leer_textos_compartidos(zin: zipfile.ZipFile) -> list:
+    """sharedStrings.xml -> lista de textos (iterparse: no arma el árbol completo)"""
+    if "xl/sharedStrings.xml" not in zin.namelist():
+        return []
+    textos = []
+    t_tag = f"{{{NS_PRINCIPAL}}}t"
+    si_tag = f"{{{NS_PRINCIPAL}}}si"
+    rph_tag = f"{{{NS_PRINCIPAL}}}rPh"
+    with zin.open("xl/sharedStrings.xml") as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == si_tag:
+                # El texto fonético (rPh) no es parte del valor
+                for rph in elem.findall(rph_tag):
+                    elem.remove(rph)
+                textos.append("".join(t.text or "" for t in elem.iter(t_tag)))
+                elem.clear()
+    return textos
+
+
+class FilaXml:
+    """Una fila del XML de la hoja; los valores se decodifican solo cuando se piden"""
+
+    def __init__(self, texto: str, numero: int, prefijo: str, compartidos: list):
+        self.texto = texto
+        self.numero = numero
+        self.prefijo = prefijo
+        self._compartidos = compartidos
+        self._celdas = None
+        self._celdas_con_ref = re.search(rf'<{prefijo}c\b[^>]*\sr="', texto) is not None
+        self._re_celda = re.compile(rf"<{prefijo}c\b([^>]*?)(?:/>|>(.*?)</{prefijo}c>)", re.S)
+        self._re_v = re.compile(rf"<{prefijo}v>(.*?)</{prefijo}v>", re.S)
+        self._re_t = re.compile(rf"<{prefijo}t(?:\s[^>]*)?>(.*?)</{prefijo}t>", re.S)
+
+    def celdas(self) -> list:
+        """[(inicio, fin, columna, atributos, interior)] en orden de aparición"""
+        if self._celdas is None:
+            self._celdas = []
+            col = 0
+            for m in self._re_celda.finditer(self.texto):
+                atributos = _atributos(m.group(1))
+                ref = RE_REF_CELDA.match(atributos.get("r", ""))
+                col = numero_columna(ref.group(1)) if ref else col + 1
+                self._celdas.append((m.start(), m.end(), col, atributos, m.group(2) or ""))
+        return self._celdas
+
+    def valor(self, col: int):
+        # Atajo: casi todas las celdas traen r="B12", así que se busca directo sin parsear la fila
+        if self._celdas is None:
+            pos = self.texto.find(f'r="{letra_columna(col)}{self.numero}"')
+            if pos != -1:
+                inicio = self.texto.rfind("<", 0, pos)
+                m = self._re_celda.match(self.texto, inicio)
+                if m:
+                    return self._decodificar(_atributos(m.group(1)), m.group(2) or "")
+            elif self._celdas_con_ref:
+                return None
+
+        for _, _, c, atributos, interior in self.celdas():
+            if c == col:
+                return self._decodificar(atributos, interior)
+        return None
+
+    def ultima_columna(self) -> int:
+        """Columna de la última celda (van ordenadas); si trae r="..." no se parsea la fila entera"""
+        if self._celdas is None and self._celdas_con_ref:
+            inicio = self.texto.rfind(f"<{self.prefijo}c")
+            m = self._re_celda.match(self.texto, inicio) if inicio != -1 else None
+            ref = RE_REF_CELDA.match(_atributos(m.group(1)).get("r", "")) if m else None
+            if ref:
+                return numero_columna(ref.group(1))
+        celdas = self.celdas()
+        return celdas[-1][2] if celdas else 0
+
+    def valores(self) -> list:
+        celdas = self.celdas()
+        if not celdas:
+            return []
+        valores = [None] * max(c for _, _, c, _, _ in celdas)
+        for _, _, c, atributos, interior in celdas:
+            valores[c - 1] = self._decodificar(atributos, interior)
+        return valores
+
+    def _decodificar(self, atributos: dict, interior: str):
+        """Mismo criterio que openpyxl para los tipos que importan aquí (texto, número, booleano)"""
+        tipo = atributos.get("t", "n")
+        if tipo == "inlineStr":
+            return html.unescape("".join(self._re_t.findall(interior)))
+
+        m = self._re_v.search(interior)
+        if m is None:
+            return None
+        crudo = m.group(1)
+        if tipo == "s":
+            return self._compartidos[int(crudo)]
+        if tipo in ("str", "e"):
+            return html.unescape(crudo)
+        if tipo == "b":
+            return crudo == "1"
+        if any(c in crudo for c in ".eE"):
+            return float(crudo)
+        return int(crudo)
+
+    def reescribir(self, cambios: dict) -> str:
+        """cambios: columna -> número nuevo. Solo se tocan esas celdas (conservan su estilo)"""
+        p = self.prefijo
+        partes = []
+        pendientes = dict(cambios)
+
+        fin_apertura = self.texto.index(">") + 1
+        partes.append(self.texto[:fin_apertura])
+        anterior = fin_apertura
+
+        def celda_nueva(col, atributos, valor):
+            estilo = f' s="{atributos["s"]}"' if "s" in atributos else ""
+            return f'<{p}c r="{letra_columna(col)}{self.numero}"{estilo}><{p}v>{repr(float(valor))}</{p}v></{p}c>'
+
+        for inicio, fin, col, atributos, interior in self.celdas():
+            # Celdas nuevas que van antes de esta (la fila debe quedar ordenada por columna)
+            for c in sorted(k for k in pendientes if k < col):
+                partes.append(self.texto[anterior:inicio])
+                anterior = inicio
+                partes.append(celda_nueva(c, {}, pendientes.pop(c)))
+
+            if col in pendientes:
+                if f"<{p}f" in interior and 'ref="' in interior:
+                    # Pisar la celda maestra de una fórmula compartida rompería las que dependen de ella
+                    raise EstructuraNoSoportada(f"Fórmula compartida en {letra_columna(col)}{self.numero}")
+                partes.append(self.texto[anterior:inicio])
+                partes.append(celda_nueva(col, atributos, pendientes.pop(col)))
+                anterior = fin
+
+        if not pendientes:
+            partes.append(self.texto[anterior:])
+            return "".join(partes)
+
+        cierre = f"</{p}row>"
+        if self.texto.endswith("/>"):
+            # <row r="5"/> sin celdas: se abre y se cierra para poder agregarlas
+            partes[0] = partes[0][:-2] + ">"
+        else:
+            partes.append(self.texto[anterior:-len(cierre)])
+        for c in sorted(pendientes):
+            partes.append(celda_nueva(c, {}, pendientes[c]))
+        partes.append(cierre)
+        return "".join(partes)
+
+
+# ==========================================
+# ESTILOS
+# ==========================================
+
+# Elementos que en el XML de la hoja van después de <conditionalFormatting> (orden del esquema)
+SIGUIENTES_A_FORMATO = (
+    "dataValidations", "hyperlinks", "printOptions", "pageMargins", "pageSetup", "headerFooter",
+    "rowBreaks", "colBreaks", "customProperties", "cellWatches", "ignoredErrors", "smartTags",
+    "drawing", "legacyDrawing", "legacyDrawingHF", "drawingHF", "picture", "oleObjects",
+    "controls", "webPublishItems", "tableParts", "extLst"
+)
+
+
+def agregar_dxf_relleno(xml_estilos: str, color_argb: str):
+    """Agrega a styles.xml un formato diferencial (dxf) con relleno sólido; devuelve (xml, id del dxf)"""
+    dxf = f'<dxf><fill><patternFill patternType="solid"><bgColor rgb="{color_argb}"/></patternFill></fill></dxf>'
+
+    vacio = re.search(r"<dxfs\b[^>]*/>", xml_estilos)
+    if vacio:
+        return xml_estilos[:vacio.start()] + f'<dxfs count="1">{dxf}</dxfs>' + xml_estilos[vacio.end():], 0
+
+    bloque = re.search(r"(<dxfs\b[^>]*>)(.*?)(</dxfs>)", xml_estilos, re.S)
+    if bloque:
+        id_dxf = len(re.findall(r"<dxf[\s>]", bloque.group(2)))
+        nuevo = _con_atributo(bloque.group(1), "count", str(id_dxf + 1)) + bloque.group(2) + dxf + bloque.group(3)
+        return xml_estilos[:bloque.start()] + nuevo + xml_estilos[bloque.end():], id_dxf
+
+    # Sin <dxfs>: va después de cellStyles y antes de tableStyles / colors / extLst
+    siguiente = re.search(r"<(?:tableStyles|colors|extLst)\b|</styleSheet>", xml_estilos)
+    if siguiente is None:
+        raise EstructuraNoSoportada("styles.xml sin cierre de styleSheet")
+    return xml_estilos[:siguiente.start()] + f'<dxfs count="1">{dxf}</dxfs>' + xml_estilos[siguiente.start():], 0
+
+
+def rangos_filas(filas: list, ultima_columna: str) -> str:
+    """[3, 4, 5, 9] -> 'A3:CB5 A9:CB9' (filas consecutivas en un solo rango)"""
+    rangos = []
+    inicio = anterior = None
+    for fila in sorted(filas):
+        if anterior is not None and fila == anterior + 1:
+            anterior = fila
+            continue
+        if inicio is not None:
+            rangos.append(f"A{inicio}:{ultima_columna}{anterior}")
+        inicio = anterior = fila
+    if inicio is not None:
+        rangos.append(f"A{inicio}:{ultima_columna}{anterior}")
+    return " ".join(rangos)
+
+
+def insertar_formato_condicional(cola: str, prefijo: str, sqref: str, id_dxf: int) -> str:
+    """
+    Una sola regla de formato condicional (siempre verdadera) pinta todas las filas de sqref.
+    cola es el XML de la hoja desde </sheetData> hasta el final.
+    """
+    p = prefijo
+    prioridad = max((int(x) for x in re.findall(r'priority="(\d+)"', cola)), default=0) + 1
+    formato = (f'<{p}conditionalFormatting sqref="{sqref}"><{p}cfRule type="expression" dxfId="{id_dxf}" priority="{prioridad}">'
+               f'<{p}formula>TRUE</{p}formula></{p}cfRule></{p}conditionalFormatting>')
+
+    siguiente = re.search(rf"<{p}(?:{'|'.join(SIGUIENTES_A_FORMATO)})\b|</{p}worksheet>", cola)
+    if siguiente is None:
+        raise EstructuraNoSoportada("Hoja sin cierre de worksheet")
+    return cola[:siguiente.start()] + formato + cola[siguiente.start():]
+
+
+# ==========================================
+# ZIP / PAQUETE
+# ==========================================
+
+def ruta_hoja(zin: zipfile.ZipFile, nombre_hoja: str) -> str:
+    """Nombre de la hoja -> miembro del zip (xl/worksheets/sheetN.xml)"""
+    libro = ET.fromstring(zin.read("xl/workbook.xml"))
+    rid = None
+    for hoja in libro.iter(f"{{{NS_PRINCIPAL}}}sheet"):
+        if hoja.get("name") == nombre_hoja:
+            rid = hoja.get(f"{{{NS_REL_DOC}}}id")
+            break
+    if rid is None:
+        raise KeyError(f"La hoja '{nombre_hoja}' no existe en el libro")
+
+    relaciones = ET.fromstring(zin.read("xl/_rels/workbook.xml.rels"))
+    for rel in relaciones.iter(f"{{{NS_REL_PAQ}}}Relationship"):
+        if rel.get("Id") == rid:
+            destino = rel.get("Target")
+            if destino.startswith("/"):
+                return destino[1:]
+            return posixpath.normpath(posixpath.join("xl", destino))
+    raise EstructuraNoSoportada(f"Relación {rid} no encontrada")
+
+
+def huellas_hojas(ruta: str, nombres_hoja: list) -> dict:
+    """
+    Huella barata de cada hoja: CRC y tamaño de su XML dentro del zip (sin descomprimir nada).
+    Incluye sharedStrings y styles porque de ellos dependen los textos y las fechas de la hoja.
+    Si el archivo no es un .xlsx legible, todas las hojas llevan la fecha y el tamaño del archivo.
+    """
+    try:
+        with zipfile.ZipFile(ruta) as zin:
+            comunes = []
+            for miembro in ("xl/sharedStrings.xml", "xl/styles.xml"):
+                info = zin.getinfo(miembro) if miembro in zin.namelist() else None
+                comunes.append(f"{info.CRC:08x}:{info.file_size}" if info else "-")
+            huellas = {}
+            for nombre in nombres_hoja:
+                info = zin.getinfo(ruta_hoja(zin, nombre))
+                huellas[nombre] = f"{info.CRC:08x}:{info.file_size}|" + "|".join(comunes)
+            return huellas
+    except (zipfile.BadZipFile, KeyError, EstructuraNoSoportada, ET.ParseError):
+        info = os.stat(ruta)
+        return {nombre: f"archivo:{info.st_mtime_ns}:{info.st_size}" for nombre in nombres_hoja}
+
+
+def _sin_calc_chain(nombre: str, xml: str) -> str:
+    """Excel reconstruye la cadena de cálculo; si queda apuntando a una fórmula pisada pide 'reparar'"""
+    if nombre == "[Content_Types].xml":
+        return re.sub(r'<Override\b[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', "", xml)
+    return re.sub(r'<Relationship\b[^>]*Target="[^"]*calcChain\.xml"[^>]*/>', "", xml)
+
+
+def _transformar_hoja(entrada, salida, compartidos: list, procesar_fila, al_avanzar, al_cerrar):
+    """
+    Copia el XML de la hoja bloque a bloque; cada <row> completo se entrega a procesar_fila(FilaXml),
+    que devuelve None (sin cambios) o {columna: número} para reescribirla.
+    Lo que viene después de las filas (desde </sheetData>) pasa por al_cerrar(cola, prefijo, ultima_columna).
+    ultima_columna sale de <dimension> (que va antes de <sheetData>, aunque caiga en otro bloque);
+    si la hoja no la trae, es la mayor columna vista en las filas.
+    """
+    decodificador = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    numero_anterior = 0
+    filas_leidas = 0
+    total_filas = 0
+    ultima_columna = None
+    buscar_dimension = True
+    columna_maxima = 0
+    prefijo = ""
+    fin_datos = None
+
+    while True:
+        bloque = entrada.read(TAMANO_BLOQUE)
+        buffer += decodificador.decode(bloque, final=not bloque)
+        if buscar_dimension:
+            m = RE_DIMENSION.search(buffer)
+            if m:
+                ultima_columna, total_filas = m.group(1), int(m.group(2))
+                buscar_dimension = False
+            elif RE_INICIO_DATOS.search(buffer) or not bloque:
+                # Ya empezaron las filas y no hubo <dimension>
+                buscar_dimension = False
+
+        incompleta = None
+        while fin_datos is None:
+            m = RE_INICIO_FILA.search(buffer, pos)
+            if m is None:
+                break
+            prefijo = f"{m.group(1)}:" if m.group(1) else ""
+            fin_apertura = buffer.find(">", m.end())
+            if fin_apertura != -1 and buffer[fin_apertura - 1] == "/":
+                fin_fila = fin_apertura + 1
+            else:
+                cierre = buffer.find(f"</{prefijo}row>", fin_apertura) if fin_apertura != -1 else -1
+                fin_fila = cierre + len(f"</{prefijo}row>") if cierre != -1 else -1
+            if fin_fila == -1:
+                # La fila sigue en el próximo bloque
+                incompleta = m.start()
+                break
+
+            salida.write(buffer[pos:m.start()].encode("utf-8"))
+            texto = buffer[m.start():fin_fila]
+            numero = int(_atributos(texto[:fin_apertura + 1 - m.start()]).get("r", numero_anterior + 1))
+            numero_anterior = numero
+
+            fila = FilaXml(texto, numero, prefijo, compartidos)
+            cambios = procesar_fila(fila)
+            if cambios:
+                texto = fila.reescribir(cambios)
+            if ultima_columna is None:
+                columna_maxima = max(columna_maxima, fila.ultima_columna(), *(cambios or (0,)))
+            salida.write(texto.encode("utf-8"))
+            pos = fin_fila
+
+            filas_leidas += 1
+            if al_avanzar and filas_leidas % 500 == 0:
+                al_avanzar(numero, total_filas)
+
+        # Terminadas las filas, el resto de la hoja (formatos, márgenes...) se junta entero para al_cerrar
+        if fin_datos is None and incompleta is None:
+            m = RE_FIN_DATOS.search(buffer, pos)
+            if m:
+                salida.write(buffer[pos:m.start()].encode("utf-8"))
+                buffer = buffer[m.start():]
+                pos = 0
+                fin_datos = True
+
+        if not bloque:
+            if fin_datos is None:
+                raise EstructuraNoSoportada("La hoja no tiene </sheetData>")
+            if ultima_columna is None:
+                ultima_columna = letra_columna(max(columna_maxima, 1))
+            salida.write(al_cerrar(buffer, prefijo, ultima_columna).encode("utf-8"))
+            return
+
+        if fin_datos is None:
+            # Se escribe lo ya procesado, guardando solo el final que puede traer una fila o etiqueta a medias
+            corte = incompleta if incompleta is not None else buffer.rfind("<", pos)
+            if corte > pos:
+                salida.write(buffer[pos:corte].encode("utf-8"))
+                pos = corte
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def parchear_hoja(ruta_origen: str, ruta_destino: str, nombre_hoja: str, procesar_fila, al_avanzar=None,
+                  color_argb: str = "FFFFFF00", validar=None):
+    """
+    Escribe en ruta_destino una copia de ruta_origen donde la hoja nombre_hoja pasa fila por fila
+    por procesar_fila(fila) -> None | (cambios {columna: número}, resaltar: bool).
+    Las filas resaltadas no se tocan celda por celda: se pintan todas con una única regla de
+    formato condicional sobre sus rangos. La memoria no depende del tamaño de la hoja
+    (salvo los textos compartidos, igual que openpyxl).
+    Todo se escribe en un .tmp junto a ruta_destino; validar() (opcional) se llama antes de
+    reemplazar y, si lanza una excepción, ruta_destino queda como estaba.
+    Lanza EstructuraNoSoportada si el archivo tiene algo que no conviene tocar así.
+    """
+    ruta_temporal = ruta_destino + ".tmp"
+    filas_resaltadas = []
+
+    def procesar(fila):
+        resultado = procesar_fila(fila)
+        if resultado is None:
+            return None
+        cambios, resaltar = resultado
+        if resaltar:
+            filas_resaltadas.append(fila.numero)
+        return cambios
+
+    def al_cerrar(cola, prefijo, ultima_columna):
+        if not filas_resaltadas:
+            return cola
+        return insertar_formato_condicional(cola, prefijo, rangos_filas(filas_resaltadas, ultima_columna), id_dxf)
+
+    try:
+        with zipfile.ZipFile(ruta_origen) as zin, zipfile.ZipFile(ruta_temporal, "w", zipfile.ZIP_DEFLATED) as zout:
+            miembro_hoja = ruta_hoja(zin, nombre_hoja)
+            compartidos = leer_textos_compartidos(zin)
+            if "xl/styles.xml" not in zin.namelist():
+                raise EstructuraNoSoportada("El libro no tiene styles.xml")
+            estilos, id_dxf = agregar_dxf_relleno(zin.read("xl/styles.xml").decode("utf-8"), color_argb)
+
+            for info in zin.infolist():
+                if info.filename == "xl/calcChain.xml":
+                    continue
+                nueva = zipfile.ZipInfo(info.filename, info.date_time)
+                nueva.compress_type = zipfile.ZIP_DEFLATED
+                nueva.external_attr = info.external_attr
+
+                if info.filename == miembro_hoja:
+                    with zin.open(info) as entrada, zout.open(nueva, "w", force_zip64=True) as salida:
+                        _transformar_hoja(entrada, salida, compartidos, procesar, al_avanzar, al_cerrar)
+                elif info.filename == "xl/styles.xml":
+                    zout.writestr(nueva, estilos)
+                elif info.filename in ("[Content_Types].xml", "xl/_rels/workbook.xml.rels"):
+                    zout.writestr(nueva, _sin_calc_chain(info.filename, zin.read(info).decode("utf-8")))
+                else:
+                    with zin.open(info) as entrada, zout.open(nueva, "w", force_zip64=info.file_size > 2**31) as salida:
+                        shutil.copyfileobj(entrada, salida, TAMANO_BLOQUE)
+
+        if validar:
+            validar()
+        os.replace(ruta_temporal, ruta_destino)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
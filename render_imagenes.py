@@ -0,0 +1,54 @@
+"""
+Render de las imágenes con PIL (lienzo blanco con el producto centrado).
+Es lo que ejecutan los procesos del pool de render: este módulo solo importa PIL,
+nada de servicios (HTTP, manifest, caché), y recibe todo por parámetro.
+Con spawn (Windows) cada proceso además vuelve a ejecutar el script principal:
+por eso el servidor se arranca con servidor.py, que no importa nada al cargarse.
+"""
+import os
+from io import BytesIO
+from PIL import Image
+
+
+def renderizar_perfiles(contenido: bytes, salidas: dict, perfiles: dict) -> dict:
+    """
+    Decodifica la imagen una sola vez y genera cada perfil pedido.
+    salidas: {perfil: ruta}; perfiles: {perfil: configuración} (lienzo, producto, formato, resample, opciones).
+    """
+    img_fuente = Image.open(BytesIO(contenido))
+    orden = sorted(salidas, key=lambda p: perfiles[p]["producto"], reverse=True)
+    lado_mayor = perfiles[orden[0]]["producto"]
+
+    # JPEG: se decodifica directamente a escala reducida (1/2, 1/4 u 1/8) sin bajar del perfil más grande,
+    # así una foto de 4000px no se descomprime a resolución completa
+    if img_fuente.format == "JPEG":
+        img_fuente.draft("RGB", (lado_mayor, lado_mayor))
+
+    # Solo pasamos por RGBA si la imagen realmente trae transparencia
+    con_alfa = img_fuente.mode in ("RGBA", "LA", "PA") or (img_fuente.mode == "P" and "transparency" in img_fuente.info)
+    img_base = img_fuente.convert("RGBA" if con_alfa else "RGB")
+
+    # Del perfil más grande al más chico: cada reducción parte de la anterior, no del original
+    for perfil in orden:
+        config = perfiles[perfil]
+        lienzo = config["lienzo"]
+        producto = config["producto"]
+        resample = Image.Resampling.BILINEAR if config["resample"] == "rapido" else Image.Resampling.LANCZOS
+
+        img_producto = img_base.copy()
+        img_producto.thumbnail((producto, producto), resample)
+        img_base = img_producto
+
+        # Lienzo blanco con el producto centrado (deja margen)
+        lienzo_blanco = Image.new("RGB", (lienzo, lienzo), (255, 255, 255))
+        x = (lienzo - img_producto.width) // 2
+        y = (lienzo - img_producto.height) // 2
+        lienzo_blanco.paste(img_producto, (x, y), img_producto if con_alfa else None)
+
+        # Se escribe en un temporal y se reemplaza: así nunca se pisa un archivo enlazado (hard link) con otro SKU
+        ruta_archivo = salidas[perfil]
+        ruta_temporal = ruta_archivo + ".tmp"
+        lienzo_blanco.save(ruta_temporal, config["formato"], **config["opciones"])
+        os.replace(ruta_temporal, ruta_archivo)
+
+    return salidas
@@ -0,0 +1,158 @@
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Enfriamiento (circuit breaker) de un modelo tras agotar cuota o fallar seguido
+COOLDOWN_CUOTA_SEG = float(os.getenv("ROUTER_COOLDOWN_CUOTA_SEG", "3600"))
+COOLDOWN_ERROR_SEG = float(os.getenv("ROUTER_COOLDOWN_ERROR_SEG", "60"))
+MAX_FALLOS_CONSECUTIVOS = int(os.getenv("ROUTER_MAX_FALLOS_CONSECUTIVOS", "3"))
+VENTANA_LATENCIAS = 50
+# Historial de llamadas reales que se usa para calcular la salud sin gastar cuota
+VENTANA_SALUD_SEG = float(os.getenv("ROUTER_VENTANA_SALUD_SEG", "600"))
+MAX_HISTORIAL = 1000
+
+
+class EstadoModelo:
+    def __init__(self, nombre: str, costo: int):
+        self.nombre = nombre
+        self.costo = costo
+        self.latencias = deque(maxlen=VENTANA_LATENCIAS)
+        self.exitos = 0
+        self.fallos = 0
+        self.fallos_consecutivos = 0
+        self.bloqueado_hasta = 0.0
+        self.motivo_bloqueo = None
+        self.ultimo_error = None
+
+    def disponible(self, ahora: float) -> bool:
+        return ahora >= self.bloqueado_hasta
+
+    def latencia_p50(self):
+        return statistics.median(self.latencias) if self.latencias else None
+
+    def latencia_p95(self):
+        if not self.latencias:
+            return None
+        ordenadas = sorted(self.latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(round(0.95 * (len(ordenadas) - 1))))]
+
+
+class RouterModelos:
+    """
+    Elige qué modelo de Gemini usar para cada tarea.
+    - Recuerda los modelos con cuota agotada o fallando y no los vuelve a probar hasta que pase su enfriamiento.
+    - Mide latencia y tasa de éxito por modelo.
+    - Cada tarea ordena sus candidatos sanos por 'orden' (preferencia fija), 'costo' o 'latencia'.
+    """
+
+    def __init__(self, modelos: list, costos: dict, tareas: dict):
+        self.tareas = tareas
+        self._estados = {m: EstadoModelo(m, costos.get(m, 1)) for m in modelos}
+        self._historial = deque(maxlen=MAX_HISTORIAL)  # (momento, modelo, exito, tipo_error)
+        self._lock = threading.Lock()
+
+    def modelo_base(self, tarea: str) -> str:
+        """Primer modelo configurado para la tarea (no depende de la salud, sirve para claves de caché)"""
+        return self._config_tarea(tarea)["modelos"][0]
+
+    def _config_tarea(self, tarea: str) -> dict:
+        return self.tareas.get(tarea, self.tareas["general"])
+
+    def candidatos(self, tarea: str) -> list:
+        """Modelos sanos para la tarea, del más conveniente al menos conveniente"""
+        config = self._config_tarea(tarea)
+        criterio = config.get("criterio", "orden")
+        ahora = time.time()
+
+        with self._lock:
+            sanos = [self._estados[m] for m in config["modelos"] if m in self._estados and self._estados[m].disponible(ahora)]
+
+            if criterio == "costo":
+                sanos.sort(key=lambda e: e.costo)
+            elif criterio == "latencia":
+                # Los modelos sin mediciones todavía se prueban en su orden original, después de los medidos
+                sanos.sort(key=lambda e: (e.latencia_p50() is None, e.latencia_p50() or 0))
+
+            return [e.nombre for e in sanos]
+
+    def registrar_exito(self, modelo: str, latencia: float):
+        with self._lock:
+            estado = self._estados.get(modelo)
+            if estado is None:
+                return
+            self._historial.append((time.time(), modelo, True, None))
+            estado.exitos += 1
+            estado.fallos_consecutivos = 0
+            estado.latencias.append(latencia)
+            estado.bloqueado_hasta = 0.0
+            estado.motivo_bloqueo = None
+
+    def registrar_fallo(self, modelo: str, tipo: str, mensaje: str):
+        """tipo: 'CUOTA_AGOTADA' bloquea de inmediato; cualquier otro bloquea tras varios fallos seguidos"""
+        with self._lock:
+            estado = self._estados.get(modelo)
+            if estado is None:
+                return
+            self._historial.append((time.time(), modelo, False, tipo))
+            estado.fallos += 1
+            estado.fallos_consecutivos += 1
+            estado.ultimo_error = {"tipo": tipo, "mensaje": mensaje[:300], "momento": time.time()}
+
+            if tipo == "CUOTA_AGOTADA":
+                estado.bloqueado_hasta = time.time() + COOLDOWN_CUOTA_SEG
+                estado.motivo_bloqueo = tipo
+            elif estado.fallos_consecutivos >= MAX_FALLOS_CONSECUTIVOS:
+                estado.bloqueado_hasta = time.time() + COOLDOWN_ERROR_SEG
+                estado.motivo_bloqueo = tipo
+
+    def estado(self) -> dict:
+        ahora = time.time()
+        with self._lock:
+            modelos = {}
+            for nombre, e in self._estados.items():
+                total = e.exitos + e.fallos
+                p50 = e.latencia_p50()
+                p95 = e.latencia_p95()
+                modelos[nombre] = {
+                    "disponible": e.disponible(ahora),
+                    "motivo_bloqueo": e.motivo_bloqueo if not e.disponible(ahora) else None,
+                    "segundos_para_reintentar": max(0, round(e.bloqueado_hasta - ahora)),
+                    "costo_relativo": e.costo,
+                    "exitos": e.exitos,
+                    "fallos": e.fallos,
+                    "tasa_exito": round(e.exitos / total, 3) if total else None,
+                    "latencia_p50_seg": round(p50, 2) if p50 is not None else None,
+                    "latencia_p95_seg": round(p95, 2) if p95 is not None else None,
+                    "ultimo_error": e.ultimo_error
+                }
+
+        return {
+            "modelos": modelos,
+            "tareas": {t: {"criterio": c.get("criterio", "orden"), "candidatos": self.candidatos(t)} for t, c in self.tareas.items()}
+        }
+
+    def resumen_reciente(self, ventana_seg: float = VENTANA_SALUD_SEG) -> dict:
+        """Cuenta éxitos y fallos de las llamadas reales dentro de la ventana"""
+        desde = time.time() - ventana_seg
+        with self._lock:
+            recientes = [h for h in self._historial if h[0] >= desde]
+
+        exitos = sum(1 for h in recientes if h[2])
+        return {
+            "ventana_seg": ventana_seg,
+            "llamadas": len(recientes),
+            "exitos": exitos,
+            "fallos": len(recientes) - exitos,
+            "ultimo_exito": max((h[0] for h in recientes if h[2]), default=None),
+            "ultimo_resultado_ok": recientes[-1][2] if recientes else None
+        }
+
+    def todos_sin_cuota(self) -> bool:
+        ahora = time.time()
+        with self._lock:
+            return all(not e.disponible(ahora) and e.motivo_bloqueo == "CUOTA_AGOTADA" for e in self._estados.values())
@@ -0,0 +1,25 @@
+"""
+Punto de entrada del servidor: python servidor.py
+En Windows los procesos del pool de render arrancan con spawn, que vuelve a ejecutar el script
+principal; este archivo no importa nada a nivel de módulo, así esos procesos solo cargan PIL
+(en cambio, arrancando con python main.py cada proceso importaría todos los servicios).
+"""
+
+
+def iniciar(app="main:app"):
+    import os
+    import uvicorn
+
+    cert_path = r"C:\Users\Edgar\.office-addin-dev-certs\localhost.crt"
+    key_path = r"C:\Users\Edgar\.office-addin-dev-certs\localhost.key"
+
+    if os.path.exists(cert_path) and os.path.exists(key_path):
+        print("🔒 Iniciando servidor de FastAPI con HTTPS...")
+        uvicorn.run(app, host="0.0.0.0", port=8000, ssl_certfile=cert_path, ssl_keyfile=key_path)
+    else:
+        print("⚠️ Iniciando servidor con HTTP normal...")
+        uvicorn.run(app, host="0.0.0.0", port=8000)
+
+
+if __name__ == "__main__":
+    iniciar()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Los servicios leen el .env al importarse: clave falsa y caché en una carpeta temporal
+os.environ.setdefault("GEMINI_API_KEY", "clave-de-prueba")
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="cache_tests_")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
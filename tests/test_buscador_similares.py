@@ -0,0 +1,46 @@
+import difflib
+
+import pytest
+
+import buscador_similares
+from buscador_similares import IndiceSimilitud
+
+CATALOGO_CHICO = ["Cable USB 1m", "Cable USB 2m", "Mouse Logitech"]
+
+
+def _mejor(indice, nombres, texto):
+    resultado = indice.buscar(texto, k=1)
+    return nombres[resultado[0][0]] if resultado else None
+
+
+@pytest.mark.parametrize("texto", ["Cable USB 1m negro", "cable usb 2 metros", "mouse logitec", "CABLE USB 2M"])
+def test_catalogo_chico_igual_que_difflib(texto):
+    indice = IndiceSimilitud(CATALOGO_CHICO)
+    esperado = difflib.get_close_matches(texto, CATALOGO_CHICO, n=1, cutoff=0.4)
+
+    assert esperado
+    assert _mejor(indice, CATALOGO_CHICO, texto) == esperado[0]
+
+
+def test_catalogo_parejo_encuentra_coincidencias():
+    # Todos comparten "antena ubiquiti": casi todos los trigramas son comunes
+    nombres = [f"Antena Ubiquiti Modelo {n}" for n in ("LiteBeam", "NanoStation", "PowerBeam", "AirGrid")]
+    indice = IndiceSimilitud(nombres)
+    assert _mejor(indice, nombres, "antena ubiquiti nanostation") == "Antena Ubiquiti Modelo NanoStation"
+    assert _mejor(indice, nombres, "Antena Ubiquiti") is not None
+
+
+def test_podar_comunes_no_cambia_los_puntajes(monkeypatch):
+    nombres = [f"Cable {tipo} {largo}m {color}" for tipo in ("USB", "HDMI", "UTP") for largo in (1, 2, 3, 5)
+               for color in ("negro", "blanco")]
+    consultas = ["cable hdmi 2 metros", "cable utp 5m blanco", "usb negro", "cable"]
+
+    con_poda = IndiceSimilitud(nombres)
+    monkeypatch.setattr(buscador_similares, "MAX_FRACCION_DOCUMENTOS", 1.0)
+    sin_poda = IndiceSimilitud(nombres)
+
+    for consulta in consultas:
+        a = con_poda.buscar(consulta, k=5, minimo=0.0)
+        b = sin_poda.buscar(consulta, k=5, minimo=0.0)
+        assert [doc for doc, _ in a] == [doc for doc, _ in b]
+        assert [round(p, 9) for _, p in a] == [round(p, 9) for _, p in b]
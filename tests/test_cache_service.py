@@ -0,0 +1,76 @@
+import itertools
+
+import pytest
+
+import cache_service
+from cache_service import CacheSQLite
+
+_nombres = itertools.count()
+
+
+@pytest.fixture
+def nueva_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_service, "CACHE_DIR", str(tmp_path))
+    return lambda **kw: CacheSQLite(f"prueba_{next(_nombres)}", **{"ttl_segundos": 3600, **kw})
+
+
+def _en_base(cache):
+    return cache._conn.execute("SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM cache").fetchone()
+
+
+def _reloj(monkeypatch, inicio=1000.0):
+    ahora = [inicio]
+    monkeypatch.setattr(cache_service.time, "time", lambda: ahora[0])
+    return ahora
+
+
+def test_lru_por_entradas_expulsa_las_menos_usadas(nueva_cache, monkeypatch):
+    ahora = _reloj(monkeypatch)
+    cache = nueva_cache(max_entradas=3)
+    for clave in "abc":
+        ahora[0] += 1
+        cache.guardar(clave, clave)
+    ahora[0] += 1
+    cache.obtener("a")
+    ahora[0] += 1
+    cache.guardar("d", "d")
+
+    assert cache.obtener("b") is None
+    assert [cache.obtener(c) for c in "acd"] == ["a", "c", "d"]
+    assert cache.expulsados == 1
+    assert (cache._entradas, cache._bytes) == _en_base(cache)
+
+
+def test_lru_por_bytes_y_reemplazo_de_clave(nueva_cache, monkeypatch):
+    ahora = _reloj(monkeypatch)
+    cache = nueva_cache(max_bytes=30)
+    for clave in ("a", "b", "a"):
+        ahora[0] += 1
+        cache.guardar(clave, "x" * 8)
+    assert (cache._entradas, cache._bytes) == (2, 20) == _en_base(cache)
+
+    ahora[0] += 1
+    cache.guardar("c", "y" * 18)
+
+    # Se va "b" (la menos usada) y alcanza; "a" se reemplazó, no cuenta dos veces
+    assert cache.obtener("b") is None and cache.obtener("a") == "x" * 8
+    assert (cache._entradas, cache._bytes) == (2, 30) == _en_base(cache)
+
+
+def test_vencidas_se_borran_al_guardar(nueva_cache, monkeypatch):
+    ahora = _reloj(monkeypatch)
+    cache = nueva_cache(ttl_segundos=10)
+    cache.guardar("vieja", 1)
+    ahora[0] += 11
+    cache.guardar("nueva", 2)
+
+    assert cache.expulsados == 1
+    assert _en_base(cache) == (1, 1) == (cache._entradas, cache._bytes)
+
+
+def test_contadores_se_cargan_de_la_base_existente(nueva_cache):
+    cache = nueva_cache()
+    cache.guardar("a", [1, 2])
+    otra = CacheSQLite(cache.nombre, ttl_segundos=3600)
+
+    assert (otra._entradas, otra._bytes) == _en_base(cache) == (1, 6)
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+import gemini_service
+import main
+from executor_service import TAMANOS_POOL
+
+DEMORA_GEMINI = 0.5
+
+
+class ModeloLento:
+    """Reemplaza a genai.GenerativeModel: generate_content bloquea el hilo como la llamada real"""
+
+    activos = 0
+    pico = 0
+    _lock = threading.Lock()
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def generate_content(self, prompt):
+        with ModeloLento._lock:
+            ModeloLento.activos += 1
+            ModeloLento.pico = max(ModeloLento.pico, ModeloLento.activos)
+        try:
+            time.sleep(DEMORA_GEMINI)
+        finally:
+            with ModeloLento._lock:
+                ModeloLento.activos -= 1
+        texto = json.dumps({"nuevo_titulo": "T", "nueva_descripcion": "D", "sugerencias_adicionales": "S"})
+        return type("Respuesta", (), {"text": texto})()
+
+
+@pytest.fixture
+def gemini_lento(monkeypatch):
+    monkeypatch.setattr(gemini_service, "crear_modelo", ModeloLento)
+    ModeloLento.activos = ModeloLento.pico = 0
+
+
+async def _optimizar_en_paralelo(n: int) -> tuple:
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://prueba") as cliente:
+        async def una(i):
+            return await cliente.post("/api/optimize", json={
+                "titulo_actual": f"Producto {i}", "descripcion_actual": "desc", "usar_cache": False
+            })
+
+        inicio = time.monotonic()
+        respuestas = await asyncio.gather(*(una(i) for i in range(n)))
+        return respuestas, time.monotonic() - inicio
+
+
+def test_optimize_concurrente_tarda_como_una_sola(gemini_lento):
+    n = min(6, TAMANOS_POOL["gemini"])
+    respuestas, duracion = asyncio.run(_optimizar_en_paralelo(n))
+
+    assert [r.status_code for r in respuestas] == [200] * n
+    assert ModeloLento.pico == n
+    # En serie serían n * 0.5 s; en el pool de Gemini todas esperan a la vez
+    assert duracion < DEMORA_GEMINI * 2
+
+
+def test_status_responde_mientras_gemini_esta_ocupado(gemini_lento):
+    async def escenario():
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://prueba") as cliente:
+            lenta = asyncio.ensure_future(cliente.post("/api/optimize", json={
+                "titulo_actual": "Producto lento", "descripcion_actual": "desc", "usar_cache": False
+            }))
+            await asyncio.sleep(0.05)
+            inicio = time.monotonic()
+            modelos = await cliente.get("/api/modelos/estado")
+            rapida = time.monotonic() - inicio
+            await lenta
+            return modelos.status_code, rapida
+
+    codigo, rapida = asyncio.run(escenario())
+    assert codigo == 200
+    # El event loop no queda bloqueado por la llamada a Gemini en curso
+    assert rapida < DEMORA_GEMINI / 2
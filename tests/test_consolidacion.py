@@ -0,0 +1,96 @@
+import openpyxl
+import pytest
+
+from benchmark_actualizador import COLUMNAS, consolidar_lectura_doble, generar_libro_origen
+from motor_actualizador import cargar_o_consolidar, consolidar_origen
+
+
+def _libro_con_casos_raros(ruta):
+    """SKUs con apóstrofe/espacios/minúsculas, precios en texto, filas cortas y una hoja sin encabezado"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Mayorista"
+    ws.append(["Lista de precios"])
+    ws.append([None, "CODIGO", "DESCRIPCION", "PRECIO"])
+    ws.append([None, "'abc-1", "Cable", 10])
+    ws.append([None, " ABC-2 ", "Router", "25.5"])
+    ws.append([None, "ABC-3", "Switch", "consultar"])
+    ws.append([None, None, "Sin código", 99])
+    ws.append([None, "ABC-4"])
+    ws.append([None, 12345, "Código numérico", 7.25])
+
+    ws = wb.create_sheet("Sin encabezado")
+    ws.append(["SKU", "VALOR"])
+    ws.append(["ABC-1", 1])
+
+    ws = wb.create_sheet("Minorista")
+    ws.append(["CODIGO", "PRECIO", "DESCRIPCION"])
+    ws.append(["ABC-1", 12.0, "Cable largo"])
+    ws.append(["ABC-3", 30, ""])
+    ws.append(["abc-2", "sin stock", "Router"])
+    wb.save(ruta)
+
+
+@pytest.fixture(scope="module")
+def libro_generado(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp("origen") / "origen.xlsx")
+    generar_libro_origen(ruta, hojas=4, filas_totales=2000)
+    return ruta, {f"Proveedor {h + 1}": COLUMNAS for h in range(4)}
+
+
+@pytest.mark.parametrize("procesos", [1, 2])
+def test_consolidado_igual_a_lectura_por_hoja(libro_generado, procesos):
+    ruta, config_map = libro_generado
+    esperado = consolidar_lectura_doble(ruta, config_map)["mapa_precios"]
+
+    catalogo = consolidar_origen(ruta, config_map, procesos=procesos)
+
+    assert catalogo.a_dict() == esperado
+    assert len(catalogo) == len(esperado)
+
+
+def test_casos_raros_igual_a_lectura_por_hoja(tmp_path):
+    ruta = str(tmp_path / "raros.xlsx")
+    _libro_con_casos_raros(ruta)
+    config_map = {nombre: COLUMNAS for nombre in ("Mayorista", "Sin encabezado", "Minorista")}
+
+    esperado = consolidar_lectura_doble(ruta, config_map)["mapa_precios"]
+    catalogo = consolidar_origen(ruta, config_map, procesos=1)
+
+    assert catalogo.a_dict() == esperado
+    # Gana la última hoja con precio numérico; un precio en texto no pisa al anterior
+    assert catalogo.get("ABC-1") == (12.0, "Minorista")
+    assert catalogo.get("ABC-2") == (25.5, "Mayorista")
+    assert catalogo.get("ABC-3") == (30.0, "Minorista")
+    assert "ABC-4" not in catalogo
+    assert catalogo.nombre("ABC-1") == "Cable largo"
+
+
+def test_incremental_igual_a_consolidar_todo(libro_generado, tmp_path):
+    ruta, config_map = libro_generado
+    ruta_catalogo = str(tmp_path / "catalogo.pkl")
+
+    primero, releidas = cargar_o_consolidar(ruta, config_map, ruta_catalogo, procesos=1)
+    segundo, releidas_otra_vez = cargar_o_consolidar(ruta, config_map, ruta_catalogo, procesos=1)
+
+    assert releidas == list(config_map)
+    assert releidas_otra_vez == []
+    assert primero.a_dict() == segundo.a_dict() == consolidar_lectura_doble(ruta, config_map)["mapa_precios"]
+
+
+def test_encabezado_despues_de_muchas_filas(tmp_path):
+    ruta = str(tmp_path / "nota_larga.xlsx")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Proveedor"
+    for i in range(40):
+        ws.append([f"Condiciones de venta, punto {i + 1}"])
+    ws.append(["CODIGO", "DESCRIPCION", "PRECIO"])
+    ws.append(["ABC-1", "Cable", 10])
+    wb.save(ruta)
+    config_map = {"Proveedor": COLUMNAS}
+
+    catalogo = consolidar_origen(ruta, config_map, procesos=1)
+
+    assert catalogo.a_dict() == consolidar_lectura_doble(ruta, config_map)["mapa_precios"]
+    assert catalogo.get("ABC-1") == (10.0, "Proveedor")
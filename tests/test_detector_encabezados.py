@@ -0,0 +1,41 @@
+import pytest
+
+import detector_encabezados
+from detector_encabezados import detectar_encabezado
+
+HOJA = [["Codigo", "Nota"], ["SELLER_SKU", "PRICE", "TITLE"], ["A", 1, "t"]]
+
+
+@pytest.fixture(autouse=True)
+def cache_vacia(monkeypatch):
+    monkeypatch.setattr(detector_encabezados, "_decisiones", type(detector_encabezados._decisiones)())
+
+
+def _sin_origen(resultado):
+    return {k: v for k, v in resultado.items() if k != "desde_cache"}
+
+
+def test_misma_entrada_mismo_resultado_con_y_sin_cache():
+    en_frio = detectar_encabezado(HOJA)
+    assert en_frio["fila"] == 1 and en_frio["puntaje"] == 9 and not en_frio["desde_cache"]
+
+    detector_encabezados._decisiones.clear()
+    # Antes se guardaba la decisión de una fila suelta y cualquier bloque que la tuviera la reutilizaba
+    detectar_encabezado([["Codigo", "Nota"]])
+    con_cache = detectar_encabezado(HOJA)
+
+    assert _sin_origen(con_cache) == _sin_origen(en_frio)
+
+
+def test_repetir_el_bloque_usa_la_cache():
+    primero = detectar_encabezado(HOJA)
+    segundo = detectar_encabezado(HOJA)
+
+    assert segundo["desde_cache"]
+    assert _sin_origen(segundo) == _sin_origen(primero)
+
+
+def test_celdas_no_hasheables_se_puntuan_sin_cache():
+    filas = [[["lista"], "x"], ["SKU", "PRECIO", "TITULO"]]
+    assert detectar_encabezado(filas)["fila"] == 1
+    assert not detectar_encabezado(filas)["desde_cache"]
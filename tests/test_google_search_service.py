@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+
+import google_search_service as gs
+from executor_service import LimitadorTasa
+
+
+class DDGSFalso:
+    """Mismo método images() que DDGS. responder(query) -> (demora en segundos, urls); registra cada llamada"""
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.llamadas = []
+        self.activas = 0
+        self.pico = 0
+        self._lock = threading.Lock()
+
+    def images(self, query, **kwargs):
+        with self._lock:
+            self.llamadas.append((time.monotonic(), query))
+            self.activas += 1
+            self.pico = max(self.pico, self.activas)
+        try:
+            demora, urls = self.responder(query)
+            time.sleep(demora)
+            return [{"image": url} for url in urls]
+        finally:
+            with self._lock:
+                self.activas -= 1
+
+
+@pytest.fixture
+def usar_falso(monkeypatch):
+    """Instala el DDGSFalso como cliente de todos los hilos y, por defecto, un limitador sin esperas"""
+    def instalar(responder, limitador=None):
+        falso = DDGSFalso(responder)
+        monkeypatch.setattr(gs, "crear_cliente_ddgs", lambda: falso)
+        monkeypatch.setattr(gs, "_clientes", threading.local())
+        monkeypatch.setattr(gs, "limitador_ddg", limitador or LimitadorTasa(tasa_por_seg=1000, capacidad=100))
+        return falso
+    return instalar
+
+
+def _urls(prefijo, n):
+    return [f"https://{prefijo}.com/{i}.jpg" for i in range(n)]
+
+
+def test_estrategias_en_paralelo(usar_falso):
+    falso = usar_falso(lambda query: (0.2, []))
+
+    inicio = time.monotonic()
+    links = gs.buscar_imagen("Taladro Percutor Inalambrico 20V Marca X", usar_cache=False)
+    duracion = time.monotonic() - inicio
+
+    assert links == []
+    assert len(falso.llamadas) == 4
+    assert falso.pico >= 2
+    # Cuatro consultas de 0.2 s en serie tardarían 0.8 s
+    assert duracion < 0.6
+
+
+def test_combina_en_orden_de_prioridad(usar_falso):
+    termino = "Taladro Percutor Inalambrico 20V Marca X"
+    abierta = termino
+    simplificada = "Taladro Percutor Inalambrico 20V"
+
+    def responder(query):
+        if query == abierta:
+            return 0.3, _urls("abierta", 2)
+        if query == simplificada:
+            return 0.05, _urls("simple", 3)
+        return 0.1, []
+
+    usar_falso(responder)
+    links = gs.buscar_imagen(termino, usar_cache=False)
+
+    # La simplificada termina primero, pero la abierta tiene más prioridad
+    assert links == _urls("abierta", 2) + _urls("simple", 2)
+
+
+def test_respuesta_temprana_con_suficientes_imagenes(usar_falso):
+    def responder(query):
+        # La de mayor prioridad (sitios sugeridos) ya trae 4 imágenes; las demás tardan mucho
+        if "site:" in query:
+            return 0.05, _urls("rapido", 4)
+        return 1.0, _urls("lento", 4)
+
+    usar_falso(responder)
+    inicio = time.monotonic()
+    links = gs.buscar_imagen("Monitor 24 pulgadas Full HD", usar_cache=False)
+    duracion = time.monotonic() - inicio
+
+    assert links == _urls("rapido", 4)
+    assert duracion < 0.5
+
+
+def test_descarta_urls_que_no_son_imagenes(usar_falso):
+    usar_falso(lambda query: (0, ["https://a.com/pagina.html", "ftp://a.com/x.jpg", "https://a.com/ok.PNG"]))
+    assert gs._ejecutar_estrategia("algo") == ["https://a.com/ok.PNG"]
+
+
+def test_limitador_marca_el_ritmo_de_las_estrategias(usar_falso):
+    falso = usar_falso(lambda query: (0, []), LimitadorTasa(tasa_por_seg=10, capacidad=1))
+
+    gs.buscar_imagen("Silla Ergonomica Oficina Negra Reclinable", usar_cache=False)
+
+    momentos = sorted(m for m, _ in falso.llamadas)
+    assert len(momentos) == 4
+    # Ráfaga de 1 y después 10 por segundo: ~0.1 s entre consultas aunque corran en paralelo
+    for anterior, siguiente in zip(momentos, momentos[1:]):
+        assert siguiente - anterior >= 0.08
+
+
+def test_limitador_rafaga_y_tasa():
+    limitador = LimitadorTasa(tasa_por_seg=20, capacidad=3)
+
+    inicio = time.monotonic()
+    for _ in range(3):
+        limitador.adquirir()
+    rafaga = time.monotonic() - inicio
+    for _ in range(4):
+        limitador.adquirir()
+    total = time.monotonic() - inicio
+
+    assert rafaga < 0.05
+    assert 0.18 <= total < 0.5
+
+
+def test_403_pausa_todas_las_busquedas(usar_falso, monkeypatch):
+    def responder(query):
+        raise Exception("403 Ratelimit")
+
+    limitador = LimitadorTasa(tasa_por_seg=1000, capacidad=100)
+    usar_falso(responder, limitador)
+    monkeypatch.setattr(gs, "ENFRIAMIENTO_403_SEG", 0.3)
+
+    assert gs._ejecutar_estrategia("algo") == []
+    inicio = time.monotonic()
+    limitador.adquirir()
+    assert time.monotonic() - inicio >= 0.25
@@ -0,0 +1,33 @@
+import openpyxl
+import pytest
+
+from motor_actualizador import actualizar_destino, mismo_precio
+
+
+@pytest.mark.parametrize("actual, igual", [
+    (1500, True), (1500.0, True), (1500.004, True), (1500.01, False),
+    ("1500", False), ("1500.00", False), (None, False), (True, False), ("", False),
+])
+def test_mismo_precio_solo_celdas_numericas(actual, igual):
+    assert mismo_precio(actual, 1500.0) is igual
+
+
+def test_precio_en_texto_se_reescribe_como_numero(tmp_path):
+    ruta = str(tmp_path / "ml.xlsx")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Publicaciones"
+    ws.append(["SELLER_SKU", "TITLE", "PRICE"])
+    ws.append(["SKU-1", "Texto", "1500"])
+    ws.append(["SKU-2", "Número", 1500])
+    wb.save(ruta)
+
+    salida = str(tmp_path / "salida.xlsx")
+    resultado = actualizar_destino(ruta, salida, "Publicaciones", "SELLER_SKU", "TITLE",
+                                   {"SKU-1": (1500.0, "P"), "SKU-2": (1500.0, "P")})
+
+    assert resultado["coincidencias"] == 2
+    assert resultado["cambios"] == 1
+    ws = openpyxl.load_workbook(salida)["Publicaciones"]
+    assert ws["C2"].value == 1500 and not isinstance(ws["C2"].value, str)
+    assert ws["C3"].value == 1500
@@ -0,0 +1,154 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+import openpyxl
+import pytest
+
+import parche_xlsx
+from parche_xlsx import parchear_hoja, rangos_filas, ruta_hoja
+
+HOJA = "Publicaciones"
+# Filas 4.. con estos SKUs tienen precio nuevo; columna 4 = PRICE
+NUEVOS = {"SKU-2": 20.5, "SKU-3": 30.0, "SKU-4": 40.25, "SKU-9": 90.0}
+
+
+def _libro_ml(ruta, filas=12, columnas_extra=30):
+    """Export de ML: título, encabezado en la fila 3, textos con tildes y muchas columnas"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = HOJA
+    ws.append(["Publicaciones de Mercado Libre — año 2026"])
+    ws.append([])
+    ws.append(["ITEM_ID", "SELLER_SKU", "TITLE", "PRICE"] + [f"ATRIBUTO_{i}" for i in range(columnas_extra)])
+    for f in range(filas):
+        ws.append([f"MLA{f}", f"SKU-{f}", f"Cañería {f} ñandú «ø»", float(f)] + [f"valor ñ {f}-{i}" for i in range(columnas_extra)])
+    wb.create_sheet("Otra").append(["no se toca"])
+    wb.save(ruta)
+
+
+def _procesar(fila):
+    if fila.numero < 4:
+        return None
+    nuevo = NUEVOS.get(fila.valor(2))
+    if nuevo is None:
+        return None
+    return {4: nuevo}, True
+
+
+def _xml_hoja(ruta, nombre=HOJA):
+    with zipfile.ZipFile(ruta) as z:
+        return z.read(ruta_hoja(z, nombre)).decode("utf-8")
+
+
+def _sin_dimension(origen, destino):
+    """Copia del libro sin <dimension> en la hoja (algunos generadores no la escriben)"""
+    with zipfile.ZipFile(origen) as zin, zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED) as zout:
+        miembro = ruta_hoja(zin, HOJA)
+        for info in zin.infolist():
+            datos = zin.read(info)
+            if info.filename == miembro:
+                datos = re.sub(rb"<dimension\b[^>]*/>", b"", datos)
+            zout.writestr(info, datos)
+
+
+@pytest.fixture
+def libro(tmp_path):
+    ruta = str(tmp_path / "ml.xlsx")
+    _libro_ml(ruta)
+    return ruta
+
+
+def test_salida_bien_formada(libro, tmp_path):
+    salida = str(tmp_path / "salida.xlsx")
+    parchear_hoja(libro, salida, HOJA, _procesar)
+
+    with zipfile.ZipFile(salida) as z:
+        assert z.testzip() is None
+        for nombre in z.namelist():
+            if nombre.endswith(".xml") or nombre.endswith(".rels"):
+                ET.fromstring(z.read(nombre))
+
+    wb = openpyxl.load_workbook(salida)
+    ws = wb[HOJA]
+    for fila in range(4, ws.max_row + 1):
+        sku = ws.cell(fila, 2).value
+        assert ws.cell(fila, 4).value == NUEVOS.get(sku, float(fila - 4))
+        assert ws.cell(fila, 3).value == f"Cañería {fila - 4} ñandú «ø»"
+    assert wb["Otra"]["A1"].value == "no se toca"
+    assert not any(f.endswith(".tmp") for f in map(str, tmp_path.iterdir()))
+
+
+def test_formato_condicional_en_rangos(libro, tmp_path):
+    salida = str(tmp_path / "salida.xlsx")
+    parchear_hoja(libro, salida, HOJA, _procesar, color_argb="FF00FF00")
+
+    ws = openpyxl.load_workbook(salida)[HOJA]
+    rangos = [str(rango.sqref) for rango in ws.conditional_formatting]
+    # SKU-2..4 son las filas 6-8 (consecutivas, un solo rango) y SKU-9 la 13; la hoja llega hasta AH
+    assert rangos == ["A6:AH8 A13:AH13"]
+    regla = next(iter(ws.conditional_formatting)).rules[0]
+    assert regla.formula == ["TRUE"]
+    assert regla.dxf.fill.bgColor.rgb == "FF00FF00"
+
+
+def test_rangos_filas():
+    assert rangos_filas([9, 3, 4, 5], "CB") == "A3:CB5 A9:CB9"
+    assert rangos_filas([7], "D") == "A7:D7"
+    assert rangos_filas([], "D") == ""
+
+
+def test_sin_filas_resaltadas_no_agrega_formato(libro, tmp_path):
+    salida = str(tmp_path / "salida.xlsx")
+    parchear_hoja(libro, salida, HOJA, lambda fila: None)
+    assert "conditionalFormatting" not in _xml_hoja(salida)
+
+
+@pytest.mark.parametrize("tamano", [1, 7, 64, 333, 4096])
+def test_bloques_que_cortan_filas(libro, tmp_path, monkeypatch, tamano):
+    referencia = str(tmp_path / "referencia.xlsx")
+    vistas_referencia = []
+    parchear_hoja(libro, referencia, HOJA, lambda fila: vistas_referencia.append(fila.numero) or _procesar(fila))
+
+    # Bloques chicos: las filas, las etiquetas y los caracteres UTF-8 de varios bytes quedan partidos
+    monkeypatch.setattr(parche_xlsx, "TAMANO_BLOQUE", tamano)
+    vistas = []
+    salida = str(tmp_path / f"salida_{tamano}.xlsx")
+    parchear_hoja(libro, salida, HOJA, lambda fila: vistas.append(fila.numero) or _procesar(fila))
+
+    assert vistas == vistas_referencia
+    assert len(vistas) == 14  # la fila 2 vacía no se escribe
+    assert _xml_hoja(salida) == _xml_hoja(referencia)
+
+
+@pytest.mark.parametrize("tamano", [16, parche_xlsx.TAMANO_BLOQUE])
+def test_dimension_fuera_del_primer_bloque(libro, tmp_path, monkeypatch, tamano):
+    monkeypatch.setattr(parche_xlsx, "TAMANO_BLOQUE", tamano)
+    salida = str(tmp_path / "salida.xlsx")
+    parchear_hoja(libro, salida, HOJA, _procesar)
+    assert 'sqref="A6:AH8 A13:AH13"' in _xml_hoja(salida)
+
+
+def test_sin_dimension_usa_la_mayor_columna(libro, tmp_path):
+    sin_dimension = str(tmp_path / "sin_dimension.xlsx")
+    _sin_dimension(libro, sin_dimension)
+    assert "<dimension" not in _xml_hoja(sin_dimension)
+
+    salida = str(tmp_path / "salida.xlsx")
+    parchear_hoja(sin_dimension, salida, HOJA, _procesar)
+    assert 'sqref="A6:AH8 A13:AH13"' in _xml_hoja(salida)
+
+
+def test_validar_fallido_no_toca_el_destino(libro, tmp_path):
+    with open(libro, "rb") as f:
+        original = f.read()
+
+    def validar():
+        raise ValueError("sin encabezado")
+
+    with pytest.raises(ValueError):
+        parchear_hoja(libro, libro, HOJA, _procesar, validar=validar)
+
+    with open(libro, "rb") as f:
+        assert f.read() == original
+    assert [p.name for p in tmp_path.iterdir()] == ["ml.xlsx"]
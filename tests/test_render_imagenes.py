@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+from io import BytesIO
+
+from PIL import Image
+
+import render_imagenes
+from image_service import PERFILES_RENDER
+
+
+def test_genera_cada_perfil(tmp_path):
+    fuente = BytesIO()
+    Image.new("RGBA", (900, 600), (200, 10, 10, 128)).save(fuente, "PNG")
+    salidas = {p: str(tmp_path / f"foto_{p}.{PERFILES_RENDER[p]['extension']}") for p in PERFILES_RENDER}
+
+    render_imagenes.renderizar_perfiles(fuente.getvalue(), salidas, PERFILES_RENDER)
+
+    for perfil, ruta in salidas.items():
+        with Image.open(ruta) as img:
+            assert img.size == (PERFILES_RENDER[perfil]["lienzo"],) * 2
+            assert img.format == PERFILES_RENDER[perfil]["formato"]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_el_modulo_del_proceso_no_carga_servicios():
+    codigo = ("import sys, render_imagenes; "
+              "print(','.join(m for m in ('image_service', 'http_service', 'manifest_service', 'cache_service') "
+              "if m in sys.modules))")
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(render_imagenes.__file__)))
+    assert salida.stdout.strip() == ""
+
+
+def test_con_spawn_el_script_de_arranque_no_carga_servicios():
+    # spawn ejecuta el script principal como __mp_main__ en cada proceso del pool
+    codigo = ("import runpy, sys; runpy.run_path('servidor.py', run_name='__mp_main__'); "
+              "print(','.join(m for m in ('main', 'image_service', 'http_service', 'gemini_service', 'uvicorn') "
+              "if m in sys.modules))")
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(render_imagenes.__file__)))
+    assert salida.stdout.strip() == ""